@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: moteur à threads (DownloadQueue) contre moteur asynchrone
+(AsyncDownloadQueue) sur de nombreux petits fichiers servis localement.
+
+Usage: python benchmarks/bench_engines.py [--files 500] [--size 16384]
+                                          [--concurrency 50]
+
+Affiche une ligne JSON par moteur.
+"""
+
+import argparse
+import functools
+import http.server
+import json
+import os
+import sys
+from tempfile import TemporaryDirectory
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download.async_engine import AsyncDownloadQueue  # noqa: E402
+from download.scheduler import COMPLETED, DownloadQueue  # noqa: E402
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory):
+    """Démarre un serveur HTTP local et retourne (serveur, url de base)"""
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run_engine(name, queue, urls, output_dir):
+    """Télécharge toutes les URL et retourne les mesures"""
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    jobs = queue.run(urls, output_dir)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    completed = sum(1 for job in jobs if job.status == COMPLETED)
+    total_bytes = sum(job.manager.downloaded_size for job in jobs)
+    return {
+        "engine": name,
+        "files": len(urls),
+        "completed": completed,
+        "seconds": round(elapsed, 3),
+        "files_per_second": round(len(urls) / elapsed, 1),
+        "mb_per_second": round(total_bytes / elapsed / (1024 * 1024), 2),
+        "cpu_seconds": round(cpu, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument(
+        "--size", type=int, default=16 * 1024, help="taille de chaque fichier en octets"
+    )
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with TemporaryDirectory() as source, TemporaryDirectory() as target:
+        payload = os.urandom(args.size)
+        for i in range(args.files):
+            with open(os.path.join(source, f"f{i}.bin"), "wb") as file:
+                file.write(payload)
+
+        server, base_url = serve(source)
+        urls = [f"{base_url}/f{i}.bin" for i in range(args.files)]
+        try:
+            engines = (
+                (
+                    "threads",
+                    lambda: DownloadQueue(
+                        max_concurrent=args.concurrency, max_per_host=args.concurrency
+                    ),
+                ),
+                ("async", lambda: AsyncDownloadQueue(max_concurrent=args.concurrency)),
+            )
+            for name, make_queue in engines:
+                output_dir = os.path.join(target, name)
+                os.makedirs(output_dir)
+                print(
+                    json.dumps(run_engine(name, make_queue(), urls, output_dir)),
+                    flush=True,
+                )
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
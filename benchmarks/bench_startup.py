@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark du démarrage: temps d'import et latence jusqu'à la première requête
+
+Chaque mesure part d'un interpréteur neuf (rien en cache dans sys.modules).
+Le bytecode du dépôt est compilé au préalable (__pycache__), comme dans
+une installation: c'est l'import qui est mesuré, pas la compilation.
+
+Imports (temps de l'import seul, et du processus complet):
+    package     import download
+    engine      from download import DownloadManager
+    cli         import download.cli
+    gui         import main (si tkinter est disponible)
+Téléchargement d'un petit fichier par la ligne de commande, contre le
+serveur local de benchmarks/server.py:
+    fetch-threads   python -m download URL
+    fetch-async     python -m download --engine async URL (si httpx est installé)
+first_request_ms: du lancement du processus à l'arrivée de sa première
+requête sur le serveur (import, session, résolution, connexion).
+
+Garde-fou: chaque cas d'import liste des modules qu'il ne doit pas
+charger (asyncio pour le moteur à threads, requests pour ``import
+download``, tkinter partout sauf gui...). Un module interdit rend le code de
+sortie 1, comme une régression signalée par --compare.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 10] [--size 64K] [--top 15]
+        [--output resultats.json] [--compare precedent.json] [--threshold 20]
+"""
+
+import argparse
+import compileall
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    httpx = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from download.ratelimit import parse_rate  # noqa: E402
+from server import BenchServer  # noqa: E402
+
+# Cas d'import: instruction mesurée et modules qu'elle ne doit pas charger
+IMPORT_CASES = {
+    "package": (
+        "import download",
+        ("requests", "asyncio", "sqlite3", "httpx", "tkinter"),
+    ),
+    "engine": (
+        "from download import DownloadManager",
+        ("asyncio", "httpx", "sqlite3", "tkinter"),
+    ),
+    "cli": (
+        "import download.cli",
+        (
+            "asyncio",
+            "httpx",
+            "lzma",
+            "sqlite3",
+            "tkinter",
+            "xml.etree.ElementTree",
+        ),
+    ),
+    "gui": ("import main", ("asyncio", "httpx", "subprocess")),
+}
+FETCH_ENGINES = ("threads", "async")
+
+# Code exécuté dans l'interpréteur mesuré
+CHILD_CODE = """
+import json, sys, time
+before = set(sys.modules)
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+# Seuls les modules chargés par l'instruction: site (.pth) en charge d'autres
+loaded = sorted(set(sys.modules) - before)
+result = {{"import_ms": round(elapsed * 1000, 2), "modules": loaded}}
+print(json.dumps(result))
+"""
+
+# --compare: écarts en dessous de ce nombre de ms ignorés (bruit de mesure)
+MIN_REGRESSION_MS = 5.0
+COMPARED_METRICS = ("import_ms", "process_ms", "first_request_ms")
+
+CASE_TIMEOUT = 120
+
+
+def compile_sources():
+    """Compile le bytecode du paquet et de l'interface (même sans .pyc automatiques)"""
+    compileall.compile_dir(os.path.join(ROOT_DIR, "download"), quiet=1)
+    compileall.compile_file(os.path.join(ROOT_DIR, "main.py"), quiet=1)
+
+
+def tkinter_available():
+    try:
+        import tkinter  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def run_import(name, statement, forbidden):
+    """Importe statement dans un nouvel interpréteur; retourne la mesure"""
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-c", CHILD_CODE.format(statement=statement)],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        timeout=CASE_TIMEOUT,
+    )
+    process_ms = (time.perf_counter() - started) * 1000
+    if process.returncode != 0:
+        stderr = process.stderr.strip().splitlines()
+        return {"case": name, "error": stderr[-1] if stderr else "échec"}
+    child = json.loads(process.stdout.strip().splitlines()[-1])
+    loaded = set(child["modules"])
+    return {
+        "case": name,
+        "import_ms": child["import_ms"],
+        "process_ms": round(process_ms, 2),
+        "modules": len(loaded),
+        "forbidden": sorted(module for module in forbidden if module in loaded),
+    }
+
+
+def run_fetch(engine, server, url, folder):
+    """Télécharge url par la ligne de commande; retourne la mesure"""
+    command = [
+        sys.executable,
+        "-m",
+        "download",
+        "-q",
+        "-o",
+        folder,
+        "--retries",
+        "0",
+        url,
+    ]
+    if engine == "async":
+        command[3:3] = ["--engine", "async"]
+    launched = time.time()
+    started = time.perf_counter()
+    process = subprocess.run(
+        command, cwd=ROOT_DIR, capture_output=True, text=True, timeout=CASE_TIMEOUT
+    )
+    process_ms = (time.perf_counter() - started) * 1000
+    if process.returncode != 0:
+        stderr = process.stderr.strip().splitlines()
+        return {"case": f"fetch-{engine}", "error": stderr[-1] if stderr else "échec"}
+    arrival = server.first_request(url[len(server.base_url) :])
+    return {
+        "case": f"fetch-{engine}",
+        "process_ms": round(process_ms, 2),
+        "first_request_ms": (
+            round((arrival - launched) * 1000, 2) if arrival is not None else None
+        ),
+    }
+
+
+def slowest_imports(statement, count):
+    """Les count modules les plus lents (cumul) selon python -X importtime"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        timeout=CASE_TIMEOUT,
+    )
+    rows = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        rows.append((int(cumulative), module.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def summarize(results):
+    """Médiane de chaque métrique par cas"""
+    groups = {}
+    for result in results:
+        if "error" not in result:
+            groups.setdefault(result["case"], []).append(result)
+    summary = []
+    for case, runs in groups.items():
+        row = {"case": case, "runs": len(runs)}
+        for metric in COMPARED_METRICS + ("modules",):
+            values = [run[metric] for run in runs if run.get(metric) is not None]
+            row[metric] = round(statistics.median(values), 2) if values else None
+        row["forbidden"] = sorted(
+            {module for run in runs for module in run.get("forbidden", ())}
+        )
+        summary.append(row)
+    return summary
+
+
+def compare(summary, previous, threshold):
+    """Affiche les ralentissements depuis un résumé précédent; retourne leur nombre"""
+    before = {row["case"]: row for row in previous}
+    regressions = 0
+    for row in summary:
+        old = before.get(row["case"])
+        if old is None:
+            continue
+        for metric in COMPARED_METRICS:
+            new_value, old_value = row.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            if change > threshold and new_value - old_value > MIN_REGRESSION_MS:
+                regressions += 1
+                print(
+                    f"⚠️ {row['case']}: {metric} {old_value} -> {new_value} "
+                    f"({change:+.1f}%)",
+                    file=sys.stderr,
+                )
+    return regressions
+
+
+def environment():
+    """Contexte des mesures, pour comparer des résultats comparables"""
+    try:
+        commit = (
+            subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=BENCH_DIR,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+            or None
+        )
+    except OSError:
+        commit = None
+    return {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec="seconds"
+        ),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="mesures par cas (défaut: 10)"
+    )
+    parser.add_argument(
+        "--size",
+        type=parse_rate,
+        default=64 * 1024,
+        help="taille du fichier téléchargé (suffixes K, M, G; défaut: 64K)",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=0,
+        metavar="N",
+        help="affiche aussi les N modules les plus lents de chaque cas d'import",
+    )
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    parser.add_argument(
+        "--compare",
+        metavar="FICHIER",
+        help="résultats précédents (--output) à comparer",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=20.0,
+        help="seuil de régression en %% (défaut: 20)",
+    )
+    args = parser.parse_args(argv)
+
+    import_cases = dict(IMPORT_CASES)
+    if not tkinter_available():
+        print("⚠️ tkinter absent: cas gui ignoré", file=sys.stderr)
+        del import_cases["gui"]
+    engines = list(FETCH_ENGINES)
+    if httpx is None:
+        print("⚠️ httpx absent: cas fetch-async ignoré", file=sys.stderr)
+        engines.remove("async")
+
+    compile_sources()
+    results = []
+    for repeat in range(args.repeat):
+        for name, (statement, forbidden) in import_cases.items():
+            result = run_import(name, statement, forbidden)
+            results.append(result)
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    server = BenchServer().start()
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            for repeat in range(args.repeat):
+                for engine in engines:
+                    # URL distincte par mesure: la première requête de chacune
+                    # est horodatée
+                    url = f"{server.base_url}/{engine}{repeat}-{args.size}.bin"
+                    result = run_fetch(engine, server, url, folder)
+                    results.append(result)
+                    print(json.dumps(result, ensure_ascii=False), flush=True)
+    finally:
+        server.stop()
+
+    if args.top:
+        for name, (statement, _) in import_cases.items():
+            print(f"# {name}: {statement}", file=sys.stderr)
+            for cumulative, module in slowest_imports(statement, args.top):
+                print(f"{cumulative / 1000:9.1f} ms  {module}", file=sys.stderr)
+
+    summary = summarize(results)
+    for row in summary:
+        print(json.dumps(dict(row, summary=True), ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(
+                {"environment": environment(), "results": results, "summary": summary},
+                file,
+                indent=2,
+                ensure_ascii=False,
+            )
+
+    status = 0
+    if any("error" in result for result in results):
+        status = 1
+    for row in summary:
+        if row["forbidden"]:
+            print(
+                f"❌ {row['case']}: modules chargés inutilement: "
+                f"{', '.join(row['forbidden'])}",
+                file=sys.stderr,
+            )
+            status = 1
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            previous = json.load(file)["summary"]
+        if compare(summary, previous, args.threshold):
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
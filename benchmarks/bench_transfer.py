@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark des transferts: débit, CPU par Go, pic de mémoire et TTFB
+
+Chaque cas (moteur x taille x concurrence x scénario) s'exécute dans un
+processus séparé, contre le serveur local de benchmarks/server.py: le pic
+de mémoire (RSS) et le temps CPU mesurés sont ceux du client seul.
+
+Moteurs:
+    single      flux unique repris en fin de fichier (download_with_resume)
+    segmented   plages parallèles (SegmentedDownloader, --segments)
+    async       asyncio + httpx (AsyncDownloadManager), si httpx est installé
+Scénarios:
+    plain       serveur local à pleine vitesse
+    throttled   débit limité par connexion et latence avant les en-têtes
+    faults      première requête de chaque fichier coupée à mi-segment
+                (reprise par Range)
+    errors      deux réponses 503 (Retry-After: 0) avant chaque fichier
+    chunked     Transfer-Encoding: chunked, taille inconnue
+
+Usage:
+    python benchmarks/bench_transfer.py [--sizes 1M,16M] [--concurrency 1,8]
+        [--engines single,segmented,async] [--scenarios plain,throttled,faults,chunked]
+        [--repeat 3] [--output resultats.json] [--compare precedent.json]
+
+Affiche une ligne JSON par mesure. --output écrit toutes les mesures, leurs
+médianes par cas et l'environnement (commit, Python, plateforme), pour
+suivre les performances dans le temps; --compare signale les régressions
+au-delà de --threshold % par rapport à un fichier précédent (code de
+sortie 1).
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    httpx = None
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - dépendance optionnelle ici
+    psutil = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from download.async_engine import AsyncDownloadQueue, create_client  # noqa: E402
+from download.ratelimit import parse_rate  # noqa: E402
+from download.retry import RetryPolicy  # noqa: E402
+from download.scheduler import COMPLETED, DownloadQueue  # noqa: E402
+from download.transport import create_session  # noqa: E402
+from server import BenchServer  # noqa: E402
+
+ENGINES = ("single", "segmented", "async")
+SCENARIOS = ("plain", "throttled", "faults", "errors", "chunked")
+DEFAULT_SCENARIOS = ("plain", "throttled", "faults", "chunked")
+
+# Scénario throttled: débit par connexion et délai avant les en-têtes
+THROTTLE_RATE = 8 * 1024 * 1024
+THROTTLE_LATENCY = 0.02
+
+# Backoff court: les pannes injectées mesurent la reprise, pas l'attente
+BENCH_RETRY_POLICY = RetryPolicy(backoff=0.05, max_backoff=0.5)
+
+CASE_TIMEOUT = 600
+
+# Métriques comparées par --compare, et le sens d'une amélioration
+COMPARED_METRICS = {
+    "mb_per_second": "higher",
+    "cpu_seconds_per_gb": "lower",
+    "peak_rss_mb": "lower",
+    "ttfb_ms": "lower",
+}
+
+
+def scenario_query(scenario, size, segments):
+    """Paramètres de requête du serveur pour un scénario"""
+    if scenario == "throttled":
+        return f"rate={THROTTLE_RATE}&latency={THROTTLE_LATENCY}"
+    if scenario == "faults":
+        # Assez tôt pour couper aussi une requête de segment
+        return f"faults=1&fail_after={size // (2 * segments)}"
+    if scenario == "errors":
+        return "faults=2&status=503"
+    if scenario == "chunked":
+        return "chunked=1"
+    return ""
+
+
+def case_key(case):
+    return (case["engine"], case["size"], case["concurrency"], case["scenario"])
+
+
+def case_key_dict(case):
+    return {
+        key: case[key]
+        for key in ("engine", "size", "concurrency", "scenario", "repeat")
+    }
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus, en Mo"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Ko sous Linux, octets sous macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        return getattr(psutil.Process().memory_info(), "peak_wset", 0) / (1024 * 1024)
+    return None
+
+
+def current_rss_mb():
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+class FirstByteClock:
+    """Délai entre le départ et les en-têtes de la première réponse GET de chaque URL"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first = {}
+
+    def record(self, method, url):
+        if method == "GET" and url not in self.first:
+            self.first[url] = time.perf_counter() - self.started
+
+    def requests_hook(self, response, *args, **kwargs):
+        self.record(response.request.method, response.request.url)
+
+    async def httpx_hook(self, response):
+        self.record(response.request.method, str(response.request.url))
+
+
+def run_threads(case, urls, folder, clock):
+    segments = case["segments"] if case["engine"] == "segmented" else 1
+    concurrency = case["concurrency"]
+    session = create_session(pool_size=concurrency * segments, pool_hosts=1)
+    session.hooks["response"].append(clock.requests_hook)
+    queue = DownloadQueue(
+        max_concurrent=concurrency,
+        max_per_host=concurrency,
+        session=session,
+        segments=segments,
+        retry_policy=BENCH_RETRY_POLICY,
+    )
+    return queue.run(urls, folder)
+
+
+def run_async(case, urls, folder, clock):
+    async def run():
+        client = create_client(case["concurrency"])
+        client.event_hooks["response"].append(clock.httpx_hook)
+        queue = AsyncDownloadQueue(
+            max_concurrent=case["concurrency"],
+            client=client,
+            retry_policy=BENCH_RETRY_POLICY,
+        )
+        queue.add_many(urls, folder)
+        try:
+            return await queue.run_async()
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+def run_case(case):
+    """Exécute un cas dans le processus courant et retourne ses mesures"""
+    urls = case["urls"]
+    result = case_key_dict(case)
+    rss_before = current_rss_mb()
+    with tempfile.TemporaryDirectory() as folder:
+        clock = FirstByteClock()
+        cpu_start = time.process_time()
+        run = run_async if case["engine"] == "async" else run_threads
+        jobs = run(case, urls, folder, clock)
+        elapsed = time.perf_counter() - clock.started
+        cpu = time.process_time() - cpu_start
+
+    total_bytes = sum(job.manager.downloaded_size for job in jobs)
+    first_bytes = sorted(clock.first.values())
+    errors = [str(job.error) for job in jobs if job.error is not None]
+    peak_rss = peak_rss_mb()
+    result.update(
+        files=len(urls),
+        completed=sum(1 for job in jobs if job.status == COMPLETED),
+        bytes=total_bytes,
+        seconds=round(elapsed, 4),
+        mb_per_second=(
+            round(total_bytes / elapsed / (1024 * 1024), 2) if elapsed > 0 else 0
+        ),
+        cpu_seconds=round(cpu, 4),
+        cpu_seconds_per_gb=(
+            round(cpu / (total_bytes / 1024**3), 3) if total_bytes else None
+        ),
+        peak_rss_mb=round(peak_rss, 1) if peak_rss is not None else None,
+        rss_growth_mb=(
+            round(peak_rss - rss_before, 1)
+            if None not in (peak_rss, rss_before)
+            else None
+        ),
+        ttfb_ms=(
+            round(statistics.median(first_bytes) * 1000, 2) if first_bytes else None
+        ),
+        ttfb_max_ms=round(first_bytes[-1] * 1000, 2) if first_bytes else None,
+        retries=sum(
+            job.manager.stats.retries for job in jobs if job.manager.stats is not None
+        ),
+        errors=errors[:3],
+    )
+    return result
+
+
+def spawn_case(case):
+    """Exécute un cas dans un processus séparé"""
+    try:
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-case", json.dumps(case)],
+            capture_output=True,
+            text=True,
+            timeout=CASE_TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        return dict(case_key_dict(case), error="délai dépassé")
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        stderr = process.stderr.strip().splitlines()
+        return dict(case_key_dict(case), error=stderr[-1] if stderr else "échec")
+    return json.loads(lines[-1])
+
+
+def summarize(results):
+    """Médiane de chaque métrique par cas (moteur, taille, concurrence, scénario)"""
+    groups = {}
+    for result in results:
+        if "error" not in result:
+            groups.setdefault(case_key(result), []).append(result)
+    summary = []
+    for key, runs in groups.items():
+        row = dict(
+            zip(("engine", "size", "concurrency", "scenario"), key), runs=len(runs)
+        )
+        for metric in (
+            "mb_per_second",
+            "cpu_seconds_per_gb",
+            "peak_rss_mb",
+            "ttfb_ms",
+            "seconds",
+            "retries",
+        ):
+            values = [run[metric] for run in runs if run.get(metric) is not None]
+            row[metric] = round(statistics.median(values), 3) if values else None
+        row["completed"] = all(run["completed"] == run["files"] for run in runs)
+        summary.append(row)
+    return summary
+
+
+def compare(summary, previous, threshold):
+    """Affiche l'évolution depuis un résumé précédent; retourne les régressions"""
+    before = {case_key(row): row for row in previous}
+    regressions = 0
+    for row in summary:
+        old = before.get(case_key(row))
+        if old is None:
+            continue
+        for metric, better in COMPARED_METRICS.items():
+            new_value, old_value = row.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            worse = change < -threshold if better == "higher" else change > threshold
+            if worse:
+                regressions += 1
+                name = "{} {} x{} {}".format(*case_key(row))
+                print(
+                    f"⚠️ {name}: {metric} {old_value} -> {new_value} ({change:+.1f}%)",
+                    file=sys.stderr,
+                )
+    return regressions
+
+
+def environment():
+    """Contexte des mesures, pour comparer des résultats comparables"""
+    try:
+        commit = (
+            subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=BENCH_DIR,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+            or None
+        )
+    except OSError:
+        commit = None
+    return {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec="seconds"
+        ),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def size_list(text):
+    try:
+        return [parse_rate(size) for size in text.split(",")]
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def choice_list(choices):
+    def parse(text):
+        values = text.split(",")
+        unknown = [value for value in values if value not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(
+                f"inconnu: {', '.join(unknown)} (choix: {', '.join(choices)})"
+            )
+        return values
+
+    return parse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes",
+        type=size_list,
+        default=[1024**2, 16 * 1024**2],
+        help="tailles de fichier (suffixes K, M, G; défaut: 1M,16M)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=lambda text: [int(n) for n in text.split(",")],
+        default=[1, 8],
+        help="téléchargements simultanés (défaut: 1,8)",
+    )
+    parser.add_argument("--engines", type=choice_list(ENGINES), default=list(ENGINES))
+    parser.add_argument(
+        "--scenarios", type=choice_list(SCENARIOS), default=list(DEFAULT_SCENARIOS)
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=4,
+        help="segments du moteur segmented (défaut: 4)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="mesures par cas (défaut: 3)"
+    )
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    parser.add_argument(
+        "--compare",
+        metavar="FICHIER",
+        help="résultats précédents (--output) à comparer",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="seuil de régression en %% (défaut: 10)",
+    )
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))), flush=True)
+        return 0
+
+    engines = args.engines
+    if "async" in engines and httpx is None:
+        print("⚠️ httpx absent: moteur async ignoré", file=sys.stderr)
+        engines = [engine for engine in engines if engine != "async"]
+
+    server = BenchServer().start()
+    results = []
+    try:
+        number = 0
+        for scenario in args.scenarios:
+            for engine in engines:
+                for size in args.sizes:
+                    for concurrency in args.concurrency:
+                        for repeat in range(args.repeat):
+                            number += 1
+                            query = scenario_query(scenario, size, args.segments)
+                            # URL distinctes par mesure: pannes injectées et
+                            # fichiers indépendants
+                            urls = [
+                                f"{server.base_url}/c{number}-{i}-{size}.bin"
+                                + (f"?{query}" if query else "")
+                                for i in range(concurrency)
+                            ]
+                            case = dict(
+                                engine=engine,
+                                size=size,
+                                concurrency=concurrency,
+                                scenario=scenario,
+                                repeat=repeat,
+                                segments=args.segments,
+                                urls=urls,
+                            )
+                            result = spawn_case(case)
+                            results.append(result)
+                            print(json.dumps(result, ensure_ascii=False), flush=True)
+    finally:
+        server.stop()
+
+    summary = summarize(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(
+                {"environment": environment(), "results": results, "summary": summary},
+                file,
+                indent=2,
+                ensure_ascii=False,
+            )
+
+    status = 0
+    if any(
+        "error" in result or result["completed"] != result["files"]
+        for result in results
+    ):
+        status = 1
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            previous = json.load(file)["summary"]
+        if compare(summary, previous, args.threshold):
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Serveur HTTP local pour les benchmarks
+
+Sert des fichiers générés en mémoire, de n'importe quelle taille, à
+l'adresse ``/<nom>-<taille>.bin`` (taille en octets). Le comportement de
+chaque URL se règle par paramètres de requête:
+
+    rate=N          débit maximal par connexion (octets/s)
+    latency=S       délai avant les en-têtes de réponse (secondes)
+    chunked=1       Transfer-Encoding: chunked, sans Content-Length (taille inconnue)
+    norange=1       ignore Range (réponses 200 complètes, pas d'Accept-Ranges)
+    faults=K        les K premiers GET de cette URL échouent:
+    fail_after=N        connexion coupée après N octets du corps
+    status=C            ou réponse d'erreur C (503...) avec Retry-After: 0
+
+Exemple: /f-16777216.bin?rate=2000000&faults=1&fail_after=1000000
+
+Le contenu est déterministe (bloc pseudo-aléatoire répété), identique
+d'une requête à l'autre: les reprises par Range restent cohérentes.
+L'arrivée de la première requête de chaque URL est horodatée
+(first_request(), horloge time.time()) pour mesurer le démarrage des clients.
+"""
+
+import collections
+import http.server
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+BLOCK_SIZE = 1024 * 1024
+WRITE_SIZE = 64 * 1024
+
+PATH_PATTERN = re.compile(r"^/[\w.-]*?-(\d+)\.bin$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+BLOCK = random.Random(0).getrandbits(BLOCK_SIZE * 8).to_bytes(BLOCK_SIZE, "little")
+
+
+def payload(offset, length):
+    """length octets du contenu à partir de offset"""
+    view = memoryview(BLOCK)
+    while length > 0:
+        start = offset % BLOCK_SIZE
+        size = min(length, BLOCK_SIZE - start)
+        yield view[start : start + size]
+        offset += size
+        length -= size
+
+
+class BenchHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # En-têtes et début du corps partent sans attendre d'ACK: TTFB non faussé
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        url = urlsplit(self.path)
+        match = PATH_PATTERN.match(url.path)
+        if match is None:
+            self.send_error(404)
+            return
+        size = int(match.group(1))
+        options = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        chunked = options.get("chunked") == "1"
+        ranges = options.get("norange") != "1" and not chunked
+
+        self.server.record_request(self.path)
+        fault = send_body and self.server.take_fault(
+            self.path, int(options.get("faults", 0))
+        )
+        if float(options.get("latency", 0)):
+            time.sleep(float(options["latency"]))
+        if fault and "status" in options:
+            self.send_response(int(options["status"]))
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        requested = (
+            RANGE_PATTERN.match(self.headers.get("Range", "")) if ranges else None
+        )
+        if_range = self.headers.get("If-Range")
+        if requested is not None and (
+            if_range is None or if_range in (self.etag(size), LAST_MODIFIED)
+        ):
+            first, last = requested.groups()
+            if first:
+                start, end = int(first), min(int(last), size - 1) if last else size - 1
+            elif last:
+                start = max(0, size - int(last))
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+
+        length = end - start + 1
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("ETag", self.etag(size))
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        if ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(length))
+        self.end_headers()
+        if not send_body:
+            return
+
+        if fault and "fail_after" in options:
+            length = min(length, int(options["fail_after"]))
+        self.send_body(start, length, chunked, float(options.get("rate", 0)))
+        if fault:
+            self.close_connection = True
+
+    def send_body(self, start, length, chunked, rate):
+        started = time.perf_counter()
+        sent = 0
+        try:
+            for block in payload(start, length):
+                for position in range(0, len(block), WRITE_SIZE):
+                    data = block[position : position + WRITE_SIZE]
+                    if chunked:
+                        self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+                    else:
+                        self.wfile.write(data)
+                    sent += len(data)
+                    if rate:
+                        # Cadence: pas d'avance sur rate octets/s
+                        delay = sent / rate - (time.perf_counter() - started)
+                        if delay > 0:
+                            time.sleep(delay)
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    @staticmethod
+    def etag(size):
+        return f'"bench-{size}"'
+
+
+class BenchServer(http.server.ThreadingHTTPServer):
+    """Serveur de benchmark sur 127.0.0.1 (port libre par défaut), dans un thread"""
+
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), BenchHandler)
+        self.faults = collections.Counter()  # Pannes déjà injectées, par URL
+        self.arrivals = {}  # Première requête reçue, par URL
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def take_fault(self, path, limit):
+        """Vrai si cette requête doit échouer (moins de limit pannes déjà injectées)"""
+        if limit <= 0:
+            return False
+        with self.lock:
+            if self.faults[path] >= limit:
+                return False
+            self.faults[path] += 1
+            return True
+
+    def record_request(self, path):
+        with self.lock:
+            self.arrivals.setdefault(path, time.time())
+
+    def first_request(self, path):
+        """Heure (time.time()) de la première requête reçue pour path, sinon None"""
+        with self.lock:
+            return self.arrivals.get(path)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    server = BenchServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
+    print(f"Serveur de benchmark sur {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+PytDm - moteur de téléchargement sans interface graphique
+
+Ce paquet n'importe jamais tkinter; l'interface graphique vit dans main.py.
+
+Les noms publics sont chargés à la première utilisation (PEP 562):
+``import download`` ne coûte presque rien, et ``from download import
+Checksum`` n'importe ni requests, ni asyncio, ni sqlite3.
+"""
+
+import importlib
+
+# Nom public: module qui le définit
+_EXPORTS = {
+    "Checksum": ".integrity",
+    "DEFAULT_HEADERS": ".manager",
+    "DEFAULT_SEGMENTS": ".segmented",
+    "DownloadCache": ".cache",
+    "DownloadJob": ".scheduler",
+    "DownloadManager": ".manager",
+    "DownloadQueue": ".scheduler",
+    "InsufficientSpaceError": ".output",
+    "IntegrityError": ".integrity",
+    "JobStore": ".jobstore",
+    "MIN_SEGMENT_SIZE": ".segmented",
+    "Mirror": ".mirrors",
+    "MultiSourceDownloader": ".mirrors",
+    "ProgressAggregator": ".progress",
+    "ProgressSnapshot": ".progress",
+    "RangeNotSupportedError": ".segmented",
+    "ResumeJournal": ".journal",
+    "RetryPolicy": ".retry",
+    "SegmentedDownloader": ".segmented",
+    "TokenBucket": ".ratelimit",
+    "TransferStats": ".streaming",
+    "WritePolicy": ".output",
+    "describe_error": ".manager",
+    "get_filename_from_url": ".manager",
+    "main": ".cli",
+    "parse_rate": ".ratelimit",
+    "read_url_file": ".scheduler",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    # Mis en cache: les accès suivants ne repassent pas par __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""Permet d'exécuter ``python -m download``"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
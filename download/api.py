@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+"""
+API de contrôle locale (HTTP + JSON) d'une DownloadQueue
+
+    GET  /jobs[?status=running&offset=0&limit=100]   liste des jobs
+    POST /jobs                                        ajoute un job ou un lot
+    GET  /jobs/<id>                                   un job
+    POST /jobs/<id>/pause | resume | cancel[?keep=1]  commande un job
+    POST /jobs/<id>/priority                          change priorité et échéance
+    GET  /events                                      flux Server-Sent Events
+    GET  /metrics                                     métriques Prometheus
+
+POST /jobs accepte {"url": ..., "folder": ..., "filename": ..., "mirrors":
+[...], "checksum": ..., "priority": 0, "deadline": <horodatage Unix>}, une
+liste de tels objets, ou {"urls": [...]}: un orchestrateur soumet des
+milliers de jobs en une requête. /jobs/<id>/priority accepte {"priority":
+..., "deadline": ...}.
+
+Les threads de transfert ne font que déposer des événements dans la file
+de chaque client SSE (jamais bloquante): la progression d'un job remplace
+la précédente non encore envoyée, et un client trop lent pour suivre est
+déconnecté plutôt que de retenir le moteur.
+
+Les POST doivent être en application/json (un navigateur ne peut pas en
+forger depuis une autre origine); avec un jeton, chaque requête doit
+porter ``Authorization: Bearer <jeton>``.
+"""
+
+import collections
+import hmac
+import http.server
+import itertools
+import json
+import os
+import threading
+from urllib.parse import parse_qs, urlparse
+
+from .integrity import Checksum
+from .metrics import METRICS
+from .scheduler import CANCELLED, COMPLETED, FAILED, PENDING, RUNNING
+
+# Événements en attente d'envoi au-delà desquels un client SSE est déconnecté
+MAX_PENDING_EVENTS = 10000
+
+# Commentaire SSE envoyé en l'absence d'événement, pour garder la connexion
+KEEPALIVE_INTERVAL = 15.0
+
+# Taille maximale d'un corps de requête
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+JOB_STATUSES = (PENDING, RUNNING, COMPLETED, CANCELLED, FAILED)
+
+
+class ApiError(Exception):
+    """Erreur renvoyée au client avec son code HTTP"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def job_to_dict(job):
+    """Représentation JSON d'un DownloadJob"""
+    manager = job.manager
+    return {
+        "id": job.id,
+        "url": job.url,
+        "folder": job.folder,
+        "filename": job.filename,
+        "mirrors": job.mirrors,
+        "status": job.status,
+        "priority": job.priority,
+        "deadline": job.deadline,
+        "paused": manager.is_paused if manager is not None else False,
+        "file_path": job.file_path,
+        "downloaded": manager.downloaded_size if manager is not None else 0,
+        "total": manager.total_size if manager is not None else 0,
+        "error": str(job.error) if job.error is not None else None,
+    }
+
+
+class Subscription:
+    """
+    Événements en attente pour un client SSE. Les événements de même clé
+    (la progression d'un job) se remplacent au lieu de s'accumuler.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_EVENTS):
+        self.max_pending = max_pending
+        self.condition = threading.Condition()
+        self.events = collections.OrderedDict()  # clé -> (événement, données)
+        self.overflowed = False
+        self.closed = False
+
+    def put(self, key, event, data):
+        with self.condition:
+            if self.closed:
+                return
+            if key not in self.events and len(self.events) >= self.max_pending:
+                self.overflowed = True
+            else:
+                self.events[key] = (event, data)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Événements en attente (liste vide après timeout); None: abonnement terminé"""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.events or self.overflowed or self.closed, timeout
+            )
+            if self.overflowed or self.closed:
+                return None
+            events = list(self.events.values())
+            self.events.clear()
+            return events
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+
+class EventBroker:
+    """
+    Diffuse les événements d'une DownloadQueue aux clients SSE. Ses méthodes
+    job_* ont la signature des callbacks de DownloadQueue.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_EVENTS):
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+        self.sequence = itertools.count()
+
+    def subscribe(self):
+        subscription = Subscription(self.max_pending)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+        subscription.close()
+
+    def publish(self, event, data, key=None):
+        """key: les événements de même clé non encore envoyés se remplacent"""
+        if key is None:
+            key = next(self.sequence)
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.put(key, event, data)
+
+    def close(self):
+        """Termine tous les flux en cours"""
+        with self.lock:
+            subscriptions, self.subscriptions = self.subscriptions, set()
+        for subscription in subscriptions:
+            subscription.close()
+
+    def job_added(self, job):
+        self.publish("added", job_to_dict(job))
+
+    def job_progress(self, job, snapshot):
+        data = dict(snapshot._asdict(), id=job.id)
+        self.publish("progress", data, key=("progress", job.id))
+
+    def job_status(self, job, message):
+        self.publish("status", {"id": job.id, "message": message})
+
+    def job_done(self, job):
+        self.publish("done", job_to_dict(job))
+
+
+class ControlHandler(http.server.BaseHTTPRequestHandler):
+    # Connexions keep-alive: un client enchaîne ses requêtes sans reconnexion
+    protocol_version = "HTTP/1.1"
+    # En-têtes et corps partent en deux écritures: sans TCP_NODELAY, Nagle et
+    # l'ACK retardé du client ajouteraient ~40 ms à chaque réponse keep-alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            self._authorize()
+            if method == "POST":
+                body = self._read_body()
+            if parts == ["events"] and method == "GET":
+                self._stream_events()
+            elif parts == ["metrics"] and method == "GET":
+                self._send(
+                    200,
+                    METRICS.render_prometheus().encode("utf-8"),
+                    "text/plain; version=0.0.4; charset=utf-8",
+                )
+            elif parts == ["jobs"] and method == "GET":
+                self._send_json(200, self._list_jobs(query))
+            elif parts == ["jobs"] and method == "POST":
+                self._send_json(201, self._add_jobs(body))
+            elif len(parts) == 2 and parts[0] == "jobs" and method == "GET":
+                self._send_json(200, job_to_dict(self._job(parts[1])))
+            elif len(parts) == 3 and parts[0] == "jobs" and method == "POST":
+                self._send_json(
+                    200, self._command(self._job(parts[1]), parts[2], query, body)
+                )
+            else:
+                raise ApiError(404, "Ressource inconnue")
+        except ApiError as e:
+            self._send_json(e.status, {"error": str(e)})
+
+    def _authorize(self):
+        token = self.server.token
+        if token is None:
+            return
+        supplied = self.headers.get("Authorization", "")
+        if not hmac.compare_digest(
+            supplied.encode("utf-8"), f"Bearer {token}".encode("utf-8")
+        ):
+            # Corps éventuel non lu: la connexion ne peut pas resservir
+            self.close_connection = True
+            raise ApiError(401, "Jeton d'accès manquant ou invalide")
+
+    def _read_body(self):
+        """Corps JSON d'un POST (None s'il est vide)"""
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise ApiError(400, "Content-Length invalide")
+        if length < 0:
+            # rfile.read(-1) attendrait la fin de la connexion
+            self.close_connection = True
+            raise ApiError(400, "Content-Length invalide")
+        if length > MAX_BODY_SIZE:
+            self.close_connection = True
+            raise ApiError(413, "Requête trop volumineuse")
+        data = self.rfile.read(length) if length else b""
+        content_type = (
+            self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        )
+        if content_type != "application/json":
+            raise ApiError(415, "Les requêtes POST doivent être en application/json")
+        if not data:
+            return None
+        try:
+            return json.loads(data)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise ApiError(400, f"JSON invalide: {e}")
+
+    def _job(self, text):
+        try:
+            job = self.server.queue.get(int(text))
+        except ValueError:
+            job = None
+        if job is None:
+            raise ApiError(404, f"Job inconnu: {text}")
+        return job
+
+    def _list_jobs(self, query):
+        jobs = list(self.server.queue.jobs)
+        status = query.get("status")
+        if status is not None:
+            if status not in JOB_STATUSES:
+                raise ApiError(400, f"État inconnu: {status}")
+            jobs = [job for job in jobs if job.status == status]
+        try:
+            offset = int(query.get("offset", 0))
+            limit = int(query["limit"]) if "limit" in query else None
+        except ValueError:
+            raise ApiError(400, "offset et limit doivent être des entiers")
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ApiError(400, "offset et limit doivent être positifs ou nuls")
+        page = jobs[offset : offset + limit if limit is not None else None]
+        return {"total": len(jobs), "jobs": [job_to_dict(job) for job in page]}
+
+    def _add_jobs(self, body):
+        """Ajoute un job, une liste de jobs ou {"urls": [...]}; retourne les jobs"""
+        if isinstance(body, dict) and "urls" in body:
+            if not isinstance(body["urls"], list):
+                raise ApiError(400, "urls doit être une liste")
+            common = {
+                key: body[key]
+                for key in ("folder", "priority", "deadline")
+                if key in body
+            }
+            specs = [dict(common, url=url) for url in body["urls"]]
+        elif isinstance(body, list):
+            specs = body
+        elif isinstance(body, dict):
+            specs = [body]
+        else:
+            raise ApiError(
+                400, 'Corps attendu: un job, une liste de jobs ou {"urls": [...]}'
+            )
+        # Tout le lot est validé avant d'ajouter le moindre job
+        entries = [self._job_request(spec) for spec in specs]
+        queue = self.server.queue
+        try:
+            jobs = [queue.add(*entry) for entry in entries]
+        except RuntimeError as e:
+            raise ApiError(503, str(e))
+        return {"jobs": [job_to_dict(job) for job in jobs]}
+
+    def _job_request(self, spec):
+        """(url, dossier, nom, miroirs, somme, priorité, échéance) d'un job JSON"""
+        if not isinstance(spec, dict):
+            raise ApiError(400, "Chaque job doit être un objet JSON")
+        url = spec.get("url")
+        mirrors = spec.get("mirrors") or []
+        if not isinstance(mirrors, list):
+            raise ApiError(400, "mirrors doit être une liste")
+        for candidate in [url] + mirrors:
+            if not isinstance(candidate, str) or not candidate.startswith(
+                ("http://", "https://")
+            ):
+                raise ApiError(
+                    400, f"URL invalide: {candidate!r} (attendu http:// ou https://)"
+                )
+        folder = spec.get("folder") or self.server.folder
+        if not isinstance(folder, str):
+            raise ApiError(400, "folder doit être une chaîne")
+        filename = spec.get("filename")
+        if filename is not None and (
+            not isinstance(filename, str)
+            or filename in ("", ".", "..")
+            or os.path.basename(filename.replace("\\", "/")) != filename
+        ):
+            raise ApiError(
+                400, f"filename doit être un simple nom de fichier: {filename!r}"
+            )
+        checksum = spec.get("checksum")
+        if checksum is not None:
+            if not isinstance(checksum, str):
+                raise ApiError(400, "checksum doit être une chaîne")
+            if not checksum.startswith(("http://", "https://")):
+                try:
+                    Checksum.parse(checksum)
+                except ValueError as e:
+                    raise ApiError(400, str(e))
+        priority, deadline = self._ordering(spec)
+        return url, folder, filename, mirrors, checksum, priority, deadline
+
+    @staticmethod
+    def _ordering(spec, priority=0, deadline=None):
+        """(priorité, échéance) d'un objet JSON; champ absent: valeur reçue"""
+        priority = spec.get("priority", priority)
+        deadline = spec.get("deadline", deadline)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ApiError(400, "priority doit être un entier")
+        if deadline is not None and (
+            not isinstance(deadline, (int, float)) or isinstance(deadline, bool)
+        ):
+            raise ApiError(
+                400, "deadline doit être un horodatage Unix (secondes) ou null"
+            )
+        return priority, deadline
+
+    def _command(self, job, command, query, body=None):
+        queue = self.server.queue
+        if job.status not in (PENDING, RUNNING):
+            raise ApiError(409, f"Job {job.id} déjà terminé ({job.status})")
+        if command == "pause":
+            queue.pause(job)
+        elif command == "resume":
+            queue.resume(job)
+        elif command == "cancel":
+            # keep=1: le fichier partiel est conservé pour une reprise
+            queue.cancel(job, remove_partial=query.get("keep") not in ("1", "true"))
+        elif command == "priority":
+            if not isinstance(body, dict):
+                raise ApiError(400, 'Corps attendu: {"priority": ..., "deadline": ...}')
+            queue.set_priority(job, *self._ordering(body, job.priority, job.deadline))
+        else:
+            raise ApiError(404, f"Commande inconnue: {command}")
+        return job_to_dict(job)
+
+    def _stream_events(self):
+        """Flux SSE jusqu'à la déconnexion du client ou l'arrêt du serveur"""
+        subscription = self.server.events.subscribe()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                events = subscription.get(KEEPALIVE_INTERVAL)
+                if events is None:
+                    if subscription.overflowed:
+                        self.wfile.write(b"event: overflow\ndata: {}\n\n")
+                    break
+                if not events:
+                    self.wfile.write(b": keep-alive\n\n")
+                for event, data in events:
+                    payload = json.dumps(data, ensure_ascii=False)
+                    self.wfile.write(
+                        f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+                    )
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.events.unsubscribe(subscription)
+
+    def _send_json(self, status, data):
+        self._send(
+            status,
+            json.dumps(data, ensure_ascii=False).encode("utf-8"),
+            "application/json; charset=utf-8",
+        )
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ControlServer(http.server.ThreadingHTTPServer):
+    """
+    API de contrôle d'une DownloadQueue, servie dans un thread. events:
+    EventBroker branché sur les callbacks de la file (on_job_added compris,
+    pour que les jobs ajoutés hors de l'API soient annoncés); folder: dossier des
+    jobs ajoutés sans dossier; token: jeton exigé (None: aucun).
+    """
+
+    daemon_threads = True
+    # Rafales de connexions d'un orchestrateur
+    request_queue_size = 128
+
+    def __init__(
+        self, queue, events, host="127.0.0.1", port=9465, folder=".", token=None
+    ):
+        super().__init__((host, port), ControlHandler)
+        self.queue = queue
+        self.events = events
+        self.folder = folder
+        self.token = token
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.events.close()
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,684 @@
+# -*- coding: utf-8 -*-
+"""
+Moteur de téléchargement asynchrone (asyncio + httpx)
+
+Un seul thread et une seule boucle d'événements pilotent des milliers de
+transferts, avec une concurrence bornée. Mêmes sémantiques que
+DownloadManager: pause/reprise/annulation et callbacks de progression.
+httpx est optionnel: il n'est requis qu'à l'utilisation de ce moteur.
+"""
+
+import asyncio
+import collections
+import functools
+import os
+import time
+from urllib.parse import urlparse
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    httpx = None
+
+from .journal import ResumeJournal, journal_path_for, part_path_for
+from .manager import DEFAULT_HEADERS, PAUSE_RELEASE_DELAY
+from .metadata import NAME_RESERVATIONS, FileMetadata
+from .metrics import METRICS, ReadTimer
+from .output import (
+    DEFAULT_WRITE_POLICY,
+    PartFile,
+    WritePolicy,
+    WritePool,
+    check_free_space,
+)
+from .progress import ProgressAggregator, ProgressTicker
+from .ratelimit import RateLimiter, TokenBucket
+from .retry import DEFAULT_RETRY_POLICY, RETRY_METRICS, retry_reason
+from .scheduler import CANCELLED, COMPLETED, FAILED, PENDING, RUNNING, DownloadJob
+from .streaming import (
+    CoalescingWriter,
+    ConnectionReleased,
+    IncompleteTransferError,
+    TransferStats,
+    check_part_complete,
+)
+
+DEFAULT_ASYNC_CONCURRENCY = 100
+
+
+def require_httpx():
+    """Lève une erreur explicite si httpx n'est pas installé"""
+    if httpx is None:
+        raise RuntimeError("Le moteur asynchrone nécessite httpx (pip install httpx)")
+
+
+class RequestTrace:
+    """
+    Trace httpcore d'une requête: durée de connexion (TCP + TLS) et délai
+    jusqu'aux en-têtes de réponse (TTFB, connexion comprise comme pour
+    requests), transmis à METRICS
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.started = None
+        self.connecting = None
+        self.ttfb = None
+
+    async def __call__(self, event, info):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now
+        if event == "connection.connect_tcp.started":
+            self.connecting = now
+        elif (
+            event.endswith(".send_request_headers.started")
+            and self.connecting is not None
+        ):
+            METRICS.connected(self.host, now - self.connecting)
+            self.connecting = None
+        elif event.endswith(".receive_response_headers.complete"):
+            self.ttfb = now - self.started
+
+
+async def trace_request(request):
+    request.extensions["trace"] = RequestTrace(request.url.netloc.decode("ascii"))
+
+
+async def record_response(response):
+    trace = response.request.extensions.get("trace")
+    METRICS.response(
+        response.request.url.netloc.decode("ascii"),
+        response.status_code,
+        getattr(trace, "ttfb", None),
+    )
+
+
+async def run_blocking(function, *args, **kwargs):
+    """
+    Exécute function(*args, **kwargs) dans le pool de threads de la boucle:
+    ouvertures, préallocations, journaux et renommages ne bloquent pas les
+    autres transferts
+    """
+    call = functools.partial(function, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+def file_size(path):
+    """Taille du fichier path, ou None s'il n'existe pas"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def ssl_context():
+    """
+    Contexte TLS commun à tous les clients httpx: le magasin de certificats
+    n'est chargé qu'une fois par processus (plusieurs dizaines de ms)
+    """
+    return httpx.create_ssl_context()
+
+
+def create_client(max_connections=DEFAULT_ASYNC_CONCURRENCY):
+    """Crée un client httpx partagé par tous les transferts (mesuré dans METRICS)"""
+    require_httpx()
+    limits = httpx.Limits(
+        max_connections=max_connections, max_keepalive_connections=max_connections
+    )
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=30,
+        limits=limits,
+        verify=ssl_context(),
+        event_hooks={"request": [trace_request], "response": [record_response]},
+    )
+
+
+class AsyncDownloadManager:
+    """
+    Équivalent asynchrone de DownloadManager.
+
+    pause(), resume() et cancel() peuvent être appelés depuis n'importe quel
+    thread; les callbacks sont appelés depuis la boucle d'événements.
+    write_pool: WritePool (download.output) partagé entre transferts (sinon
+    des threads d'écriture par fichier, selon write_policy). Aucune écriture
+    n'a lieu dans la boucle: une write_policy sans thread en reçoit un.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        on_progress=None,
+        on_status=None,
+        release_after=PAUSE_RELEASE_DELAY,
+        rate_limit=None,
+        shared_bucket=None,
+        retry_policy=DEFAULT_RETRY_POLICY,
+        write_policy=DEFAULT_WRITE_POLICY,
+        write_pool=None,
+    ):
+        self.is_paused = False
+        self.is_cancelled = False
+        self.remove_partial = True
+        self.release_after = release_after
+        self.accepts_ranges = False
+        self.downloaded_size = 0
+        self.total_size = 0
+        self.file_path = None
+        self.claimed_path = None  # Chemin réservé dans NAME_RESERVATIONS
+        self.journal = None
+        self.stats = None
+        self.client = client
+        self.on_progress = on_progress
+        self.on_status = on_status
+        self._loop = None
+        self._unpaused = None
+        self.bucket = TokenBucket(rate_limit)
+        self.limiter = RateLimiter(shared_bucket, self.bucket)
+        self.retry_policy = retry_policy
+        self.write_policy = write_policy
+        self.write_pool = write_pool
+
+    def get_headers(self):
+        """Retourne les en-têtes HTTP pour simuler un navigateur"""
+        return dict(DEFAULT_HEADERS)
+
+    def report_status(self, message):
+        if self.on_status is not None:
+            self.on_status(message)
+
+    def _set_unpaused(self, running):
+        """Ouvre ou ferme la barrière de pause, depuis n'importe quel thread"""
+        event = self._unpaused
+        if event is None:
+            return
+        action = event.set if running else event.clear
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+        if self._loop is not None and current_loop is not self._loop:
+            self._loop.call_soon_threadsafe(action)
+        else:
+            action()
+
+    def set_rate_limit(self, rate):
+        """Change la limite de débit de ce téléchargement (octets/s, None: illimité)"""
+        self.bucket.set_rate(rate)
+
+    def pause(self):
+        """Met le téléchargement en pause"""
+        self.is_paused = True
+        self._set_unpaused(False)
+
+    def resume(self):
+        """Reprend un téléchargement en pause"""
+        self.is_paused = False
+        self._set_unpaused(True)
+
+    def cancel(self, remove_partial=True):
+        """
+        Annule le téléchargement; le fichier partiel est supprimé par download()
+        une fois fermé
+        """
+        self.remove_partial = remove_partial
+        self.is_cancelled = True
+        self.is_paused = False
+        self._set_unpaused(True)
+
+    def loop_write_policy(self):
+        """write_policy, avec au moins un thread d'écriture hors de la boucle"""
+        policy = self.write_policy or DEFAULT_WRITE_POLICY
+        if policy.threads or self.write_pool is not None:
+            return policy
+        return WritePolicy(1, policy.max_pending, policy.fsync)
+
+    def load_journal(self, url, etag, last_modified):
+        """Journal de reprise valable pour cette ressource, ou None (bloquant)"""
+        journal = ResumeJournal.load(self.file_path)
+        if (
+            journal is not None
+            and journal.matches(url, self.total_size, etag, last_modified)
+            and os.path.exists(part_path_for(self.file_path))
+        ):
+            return journal
+        return None
+
+    def finish_part(self, journal):
+        """Renomme le fichier partiel complet et supprime son journal (bloquant)"""
+        check_part_complete(journal)
+        os.replace(part_path_for(self.file_path), self.file_path)
+        if journal is not None:
+            journal.remove()
+
+    def discard_partial(self):
+        """Supprime le fichier partiel et le journal d'un téléchargement annulé"""
+        if not self.file_path:
+            return
+        if self.journal is not None:
+            self.journal.remove()
+        for path in (part_path_for(self.file_path), journal_path_for(self.file_path)):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    async def download(self, url, folder, filename=None):
+        """
+        Télécharge url dans folder.
+
+        Retourne True si le fichier est complet, False si annulé.
+        Les erreurs réseau sont propagées (httpx.HTTPError).
+        """
+        self._loop = asyncio.get_running_loop()
+        self._unpaused = asyncio.Event()
+        if not self.is_paused:
+            self._unpaused.set()
+
+        client = self.client
+        owns_client = client is None
+        if owns_client:
+            client = create_client()
+        self.stats = TransferStats(urlparse(url).netloc)
+        ticker = None
+        if self.on_progress is not None:
+            aggregator = ProgressAggregator()
+            aggregator.track(self, self)
+            ticker = asyncio.ensure_future(
+                ProgressTicker(
+                    aggregator, lambda key, snapshot: self.on_progress(snapshot)
+                ).run_async()
+            )
+        METRICS.transfer_started()
+        outcome, error = "failed", None
+        try:
+            completed = await self._download(client, url, folder, filename)
+            outcome = "completed" if completed else "cancelled"
+            return completed
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.claimed_path is not None:
+                NAME_RESERVATIONS.release(self.claimed_path)
+                self.claimed_path = None
+            if self.is_cancelled and self.remove_partial:
+                await run_blocking(self.discard_partial)
+            self.stats.finish()
+            METRICS.transfer_finished(url, self.stats.host, self.stats, outcome, error)
+            if ticker is not None:
+                ticker.cancel()
+            if owns_client:
+                await client.aclose()
+
+    async def _download(self, client, url, folder, filename):
+        headers = self.get_headers()
+
+        self.report_status("🔍 Vérification du fichier...")
+        head_response = await client.head(url, headers=headers, timeout=10)
+        head_response.raise_for_status()
+
+        metadata = FileMetadata.from_response(head_response)
+        self.total_size = metadata.size
+        self.accepts_ranges = metadata.accepts_ranges
+
+        # Un nom déjà pris par un autre fichier devient 'nom (1).ext'
+        # (voir NameReservations)
+        self.file_path = self.claimed_path = await run_blocking(
+            NAME_RESERVATIONS.claim,
+            folder,
+            filename or metadata.suggested_filename(url),
+            {url},
+            self.total_size,
+            fixed=bool(filename),
+        )
+
+        if self.total_size == 0:
+            self.report_status("⚠️ Taille inconnue - téléchargement sans progression")
+            return await self._stream(client, url, None)
+
+        if await run_blocking(file_size, self.file_path) == self.total_size:
+            self.report_status("✅ Fichier déjà téléchargé")
+            self.downloaded_size = self.total_size
+            return True
+
+        # Reprise d'après le journal, si la ressource distante n'a pas changé
+        etag = metadata.etag
+        last_modified = metadata.last_modified
+        journal = await run_blocking(self.load_journal, url, etag, last_modified)
+        if journal is not None:
+            resume_pos = journal.completed_bytes()
+            self.report_status(
+                f"📥 Reprise du téléchargement à {resume_pos / (1024*1024):.2f} MB"
+            )
+        else:
+            journal = ResumeJournal.for_file(
+                self.file_path, url, self.total_size, etag, last_modified
+            )
+        self.journal = journal
+        await run_blocking(check_free_space, self.file_path, self.total_size)
+
+        failures = 0
+        while True:
+            written = journal.completed_bytes()
+            try:
+                return await self._stream(client, url, journal)
+            except ConnectionReleased:
+                # Longue pause: connexion fermée, rouverte avec Range à la reprise
+                await self._unpaused.wait()
+                if self.is_cancelled:
+                    await run_blocking(journal.save, force=True)
+                    return False
+                self.report_status("▶️ Reprise du téléchargement...")
+            except Exception as e:
+                # Connexion perdue: reprise au dernier octet écrit selon retry_policy
+                await run_blocking(journal.save, force=True)
+                if journal.completed_bytes() > written:
+                    failures = 0
+                if not await self.retry_wait(e, failures, url):
+                    raise
+                failures += 1
+
+    async def retry_wait(self, error, attempt, url):
+        """Équivalent asynchrone de DownloadManager.retry_wait"""
+        policy = self.retry_policy
+        if (
+            self.is_cancelled
+            or policy is None
+            or not policy.should_retry(error, attempt)
+        ):
+            return False
+        delay = policy.delay(attempt, error)
+        if self.stats is not None:
+            self.stats.add_retry()
+        RETRY_METRICS.record(urlparse(url).netloc, retry_reason(error))
+        self.report_status(
+            f"🔁 Erreur réseau ({retry_reason(error)}) - nouvelle tentative dans "
+            f"{delay:.1f} s ({attempt + 1}/{policy.max_retries})"
+        )
+        await asyncio.sleep(delay)
+        return not self.is_cancelled
+
+    async def checkpoint(self, releasable=False):
+        """
+        Point de contrôle entre deux blocs: attend pendant la pause.
+
+        Retourne False si le téléchargement est annulé. Lève
+        ConnectionReleased si releasable et que la pause dure plus de
+        release_after.
+        """
+        if self._unpaused.is_set():
+            return not self.is_cancelled
+        if not releasable or self.release_after is None:
+            await self._unpaused.wait()
+        else:
+            try:
+                await asyncio.wait_for(self._unpaused.wait(), self.release_after)
+            except asyncio.TimeoutError:
+                raise ConnectionReleased()
+        return not self.is_cancelled
+
+    async def _stream(self, client, url, journal):
+        """Copie le corps de la réponse dans le fichier partiel, puis le renomme"""
+        resume_pos = 0
+        headers = self.get_headers()
+        if journal is not None:
+            missing = journal.missing_ranges()
+            # Un seul flux ne peut reprendre que si seule la fin du fichier manque
+            if len(missing) == 1 and missing[0][1] == self.total_size - 1:
+                resume_pos = missing[0][0]
+        if resume_pos > 0:
+            headers["Range"] = f"bytes={resume_pos}-"
+            if journal.if_range():
+                headers["If-Range"] = journal.if_range()
+
+        async with client.stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+
+            if resume_pos > 0:
+                content_range = response.headers.get("content-range", "")
+                if response.status_code != 206 or not content_range.startswith(
+                    f"bytes {resume_pos}-"
+                ):
+                    self.report_status(
+                        "⚠️ Reprise impossible - téléchargement depuis le début"
+                    )
+                    self.accepts_ranges = False
+                    resume_pos = 0
+            if journal is not None and resume_pos == 0 and journal.completed_bytes():
+                await run_blocking(journal.reset)
+            releasable = journal is not None and self.accepts_ranges
+
+            downloaded = resume_pos
+            self.downloaded_size = downloaded
+
+            def written(offset, data):
+                if journal is not None:
+                    journal.add(offset, len(data))
+                    journal.save()
+
+            # Ouverture et préallocation hors de la boucle; écritures par
+            # l'étage d'écriture (write_policy, write_pool): la boucle ne fait
+            # que déposer les blocs, attend la place dans la file sans
+            # bloquer, et le journal ne consigne que des octets déjà transmis
+            # au système
+            part = await run_blocking(
+                PartFile,
+                self.file_path,
+                self.total_size,
+                resume=resume_pos > 0,
+                write_policy=self.loop_write_policy(),
+                stats=self.stats,
+                write_pool=self.write_pool,
+                backpressure=False,
+            )
+            with part:
+                writer = CoalescingWriter(
+                    part.at(resume_pos),
+                    resume_pos,
+                    on_flush=written,
+                    stats=self.stats,
+                    disk_writer=part.disk_writer,
+                )
+                disk_writer = part.disk_writer
+                timer = ReadTimer(self.stats.host, self.stats)
+                try:
+                    # Blocs de la taille reçue du réseau, regroupés par le writer;
+                    # octets bruts, comme iter_adaptive (Content-Encoding non décodé)
+                    waiting = time.perf_counter()
+                    async for chunk in response.aiter_raw(self.limiter.max_read()):
+                        timer.add(time.perf_counter() - waiting)
+                        await self.limiter.throttle_async(len(chunk))
+                        await disk_writer.room()
+                        writer.write(chunk)
+                        downloaded += len(chunk)
+                        self.downloaded_size = downloaded
+
+                        if not await self.checkpoint(releasable):
+                            break
+                        waiting = time.perf_counter()
+                finally:
+                    writer.flush()
+                    timer.flush()
+                    # Le temps CPU de la boucle est partagé entre transferts:
+                    # non attribué
+                    self.stats.add(downloaded - resume_pos, 0.0)
+                    # Fin des écritures et fsync hors de la boucle
+                    await run_blocking(part.close)
+
+        if self.is_cancelled:
+            if journal is not None:
+                await run_blocking(journal.save, force=True)
+            return False
+
+        if journal is not None and downloaded < self.total_size:
+            await run_blocking(journal.save, force=True)
+            raise IncompleteTransferError(
+                f"Téléchargement incomplet ({downloaded} / {self.total_size} octets)"
+            )
+
+        await run_blocking(self.finish_part, journal)
+        return True
+
+
+class AsyncDownloadQueue:
+    """
+    File d'attente asynchrone: même interface que DownloadQueue (jobs,
+    états, callbacks), mais tous les transferts partagent une seule boucle
+    d'événements et un seul client httpx.
+    """
+
+    def __init__(
+        self,
+        max_concurrent=DEFAULT_ASYNC_CONCURRENCY,
+        max_per_host=None,
+        client=None,
+        on_progress=None,
+        on_status=None,
+        on_job_done=None,
+        rate_limit=None,
+        per_download_rate=None,
+        retry_policy=DEFAULT_RETRY_POLICY,
+        write_policy=DEFAULT_WRITE_POLICY,
+    ):
+        require_httpx()
+        if max_concurrent < 1 or (max_per_host is not None and max_per_host < 1):
+            raise ValueError(
+                "Les limites de concurrence doivent être supérieures ou égales à 1"
+            )
+
+        self.max_concurrent = max_concurrent
+        self.max_per_host = max_per_host
+        self.client = client
+        self.on_progress = on_progress
+        self.on_status = on_status
+        self.on_job_done = on_job_done
+        self.bucket = TokenBucket(rate_limit)
+        self.per_download_rate = per_download_rate
+        self.retry_policy = retry_policy
+        self.write_policy = write_policy
+        self.write_pool = (
+            None  # Threads d'écriture de tous les transferts, le temps de run_async()
+        )
+        # Progression de tous les jobs, échantillonnée par une seule tâche
+        self.progress = ProgressAggregator()
+        self.jobs = []
+
+    def add(self, url, folder, filename=None):
+        """Ajoute une URL à la file et retourne le job créé"""
+        job = DownloadJob(url, folder, filename)
+        job.manager = AsyncDownloadManager(
+            on_status=self._job_callback(job, self.on_status),
+            rate_limit=self.per_download_rate,
+            shared_bucket=self.bucket,
+            retry_policy=self.retry_policy,
+            write_policy=self.write_policy,
+        )
+        self.jobs.append(job)
+        return job
+
+    def add_many(self, urls, folder):
+        """Ajoute plusieurs URL à la file"""
+        return [self.add(url, folder) for url in urls]
+
+    @staticmethod
+    def _job_callback(job, callback):
+        if callback is None:
+            return None
+        return lambda *args: callback(job, *args)
+
+    def set_rate_limit(self, rate, job=None):
+        """Change la limite globale, ou celle d'un job (octets/s, None: illimité)"""
+        if job is None:
+            self.bucket.set_rate(rate)
+        else:
+            job.manager.set_rate_limit(rate)
+
+    def cancel(self, job, remove_partial=True):
+        """Annule un job, qu'il soit en attente ou en cours"""
+        if job.status == PENDING:
+            job.status = CANCELLED
+            job.done.set()
+            if self.on_job_done is not None:
+                self.on_job_done(job)
+        job.manager.cancel(remove_partial=remove_partial)
+
+    def cancel_all(self, remove_partial=True):
+        for job in self.jobs:
+            if job.status in (PENDING, RUNNING):
+                self.cancel(job, remove_partial=remove_partial)
+
+    async def run_async(self):
+        """Exécute tous les jobs en attente et retourne la liste des jobs"""
+        client = self.client
+        owns_client = client is None
+        if owns_client:
+            client = create_client(self.max_concurrent)
+
+        # Toujours au moins un thread d'écriture: rien n'est écrit dans la boucle
+        policy = self.write_policy or DEFAULT_WRITE_POLICY
+        self.write_pool = WritePool(max(policy.threads, 1), policy.max_pending)
+
+        limit = asyncio.Semaphore(self.max_concurrent)
+        host_limits = collections.defaultdict(
+            lambda: asyncio.Semaphore(self.max_per_host)
+        )
+
+        async def run_job(job):
+            if self.max_per_host is None:
+                async with limit:
+                    await self._run_job(client, job)
+                return
+            # Place de l'hôte d'abord: un job bloqué par son hôte ne retient
+            # pas une place globale dont un autre hôte aurait l'usage
+            async with host_limits[job.host]:
+                async with limit:
+                    await self._run_job(client, job)
+
+        ticker = None
+        if self.on_progress is not None:
+            ticker = asyncio.ensure_future(
+                ProgressTicker(self.progress, self.on_progress).run_async()
+            )
+        try:
+            await asyncio.gather(
+                *(run_job(job) for job in self.jobs if job.status == PENDING)
+            )
+        finally:
+            if ticker is not None:
+                ticker.cancel()
+            if owns_client:
+                await client.aclose()
+            if self.write_pool is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.write_pool.close
+                )
+                self.write_pool = None
+        return list(self.jobs)
+
+    async def _run_job(self, client, job):
+        if job.status != PENDING:
+            return
+        job.status = RUNNING
+        job.manager.client = client
+        job.manager.write_pool = self.write_pool
+        self.progress.track(job, job.manager)
+        status = FAILED
+        try:
+            completed = await job.manager.download(job.url, job.folder, job.filename)
+            status = COMPLETED if completed else CANCELLED
+        except Exception as e:
+            job.error = e
+        self.progress.untrack(job)
+        job.status = status
+        job.done.set()
+        if self.on_job_done is not None:
+            self.on_job_done(job)
+
+    def run(self, urls=(), folder="."):
+        """Ajoute les URL et exécute toute la file (appel bloquant)"""
+        self.add_many(urls, folder)
+        return asyncio.run(self.run_async())
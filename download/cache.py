@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Cache local des téléchargements, adressé par contenu
+
+Chaque fichier téléchargé est rangé une seule fois sous sa somme SHA-256
+(``objects/ab/abcdef...``); une entrée par URL (``entries/<sha256 de
+l'URL>.json``) retient l'ETag, le Last-Modified et la somme du contenu.
+Avant de télécharger, la requête HEAD devient conditionnelle
+(If-None-Match / If-Modified-Since): si la ressource n'a pas changé, le
+fichier est servi depuis le cache par clonage (reflink) ou, à défaut,
+copie noyau (sendfile), sans retransfert.
+
+Jamais de lien physique: un objet partagerait son inode avec le fichier de
+l'utilisateur, dont chaque modification altérerait le cache. Les objets
+sont en lecture seule, et la copie servie est comparée à la somme de
+l'objet avant de remplacer la cible. La taille du cache est bornée: les
+objets les moins récemment servis sont évincés (date de modification
+rafraîchie à chaque utilisation). Aucun index global: plusieurs processus
+(tâches CI) peuvent partager le même dossier.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Taille maximale par défaut du cache
+DEFAULT_CACHE_SIZE = 10 * 1024**3
+
+# ioctl Linux de clonage de fichier (btrfs, xfs...)
+FICLONE = 0x40049409
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def default_cache_dir():
+    """$PYTDM_CACHE_DIR, sinon $XDG_CACHE_HOME/pytdm ou ~/.cache/pytdm"""
+    if os.environ.get("PYTDM_CACHE_DIR"):
+        return os.environ["PYTDM_CACHE_DIR"]
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return os.path.join(base, "pytdm")
+
+
+def file_digest(path):
+    """Somme SHA-256 d'un fichier"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(READ_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def temporary_path(path):
+    """Nom temporaire propre au processus et au thread, à côté de path"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def clone_file(source, target):
+    """
+    Crée target, fichier indépendant, avec le contenu de source: reflink
+    (copie sur écriture) si possible, sinon copie noyau. target ne doit pas
+    exister. Retourne la méthode utilisée ('reflink' ou 'copy').
+    """
+    if fcntl is not None:
+        with open(source, "rb") as src, open(target, "xb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return "reflink"
+            except OSError:
+                pass
+        os.remove(target)
+    # shutil.copyfile passe par sendfile sous Linux
+    shutil.copyfile(source, target)
+    return "copy"
+
+
+class CacheEntry:
+    """Une URL en cache: validateurs HTTP et somme du contenu"""
+
+    def __init__(self, url, digest, size, etag=None, last_modified=None, filename=None):
+        self.url = url
+        self.digest = digest
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.filename = filename
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "digest": self.digest,
+            "size": self.size,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "filename": self.filename,
+        }
+
+    def conditional_headers(self):
+        """En-têtes de revalidation"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def is_fresh(self, response):
+        """La réponse (HEAD conditionnel) confirme-t-elle un contenu inchangé ?"""
+        if response.status_code == 304:
+            return True
+        # Serveur qui ignore les conditions: comparer les validateurs
+        headers = response.headers
+        length = headers.get("content-length")
+        if length is not None and int(length) != self.size:
+            return False
+        if self.etag and headers.get("etag"):
+            return headers.get("etag") == self.etag
+        if self.last_modified and headers.get("last-modified"):
+            return headers.get("last-modified") == self.last_modified
+        return False
+
+    def __repr__(self):
+        return f"<CacheEntry {self.url} {self.digest[:12]}>"
+
+
+class DownloadCache:
+    """Dossier de cache partagé, borné à max_size octets (None: illimité)"""
+
+    def __init__(self, directory=None, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory or default_cache_dir()
+        self.max_size = max_size
+        self.objects_dir = os.path.join(self.directory, "objects")
+        self.entries_dir = os.path.join(self.directory, "entries")
+        self.lock = threading.Lock()
+        self.total_size = (
+            None  # Taille des objets estimée par ce processus (None: à mesurer)
+        )
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def entry_path(self, url):
+        return os.path.join(
+            self.entries_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def lookup(self, url):
+        """CacheEntry de url si son contenu est encore présent, sinon None"""
+        try:
+            with open(self.entry_path(url), "r", encoding="utf-8") as file:
+                entry = CacheEntry(**json.load(file))
+        except (OSError, ValueError, TypeError):
+            return None
+        if entry.url != url or not (entry.etag or entry.last_modified):
+            return None
+        try:
+            if os.path.getsize(self.object_path(entry.digest)) != entry.size:
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def materialize(self, entry, target):
+        """
+        Place le contenu de entry à target (remplacé atomiquement) et le
+        marque comme récemment utilisé. Retourne la méthode de copie, ou
+        None si l'objet a été évincé entre-temps ou ne correspond plus à sa
+        somme (il est alors supprimé).
+        """
+        source = self.object_path(entry.digest)
+        temporary = temporary_path(target)
+        try:
+            method = clone_file(source, temporary)
+        except FileNotFoundError:
+            return None
+        # Relire la copie coûte bien moins qu'un téléchargement, et rien
+        # d'altéré n'est servi
+        if file_digest(temporary) != entry.digest:
+            os.remove(temporary)
+            self.discard(source)
+            return None
+        os.replace(temporary, target)
+        try:
+            os.utime(source)
+        except OSError:
+            pass
+        return method
+
+    def store(self, url, path, etag=None, last_modified=None, digest=None):
+        """
+        Ajoute le fichier complet path au cache pour url. digest (SHA-256)
+        évite de relire le fichier s'il est déjà connu. Retourne l'entrée.
+        """
+        if not (etag or last_modified):
+            # Sans validateur, impossible de revalider: inutile de stocker
+            return None
+        size = os.path.getsize(path)
+        if self.max_size is not None and size > self.max_size:
+            return None
+        digest = digest or file_digest(path)
+        target = self.object_path(digest)
+        if os.path.exists(target):
+            os.utime(target)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temporary = temporary_path(target)
+            # Copie indépendante: le fichier de l'utilisateur reste le sien
+            clone_file(path, temporary)
+            os.chmod(temporary, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(temporary, target)
+            with self.lock:
+                if self.total_size is not None:
+                    self.total_size += size
+
+        entry = CacheEntry(
+            url, digest, size, etag, last_modified, os.path.basename(path)
+        )
+        entry_path = self.entry_path(url)
+        temporary = temporary_path(entry_path)
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(entry.to_dict(), file)
+        os.replace(temporary, entry_path)
+
+        self.evict(keep=target)
+        return entry
+
+    def discard(self, path):
+        """Supprime un objet (lecture seule: Windows refuse de le supprimer sinon)"""
+        try:
+            size = os.path.getsize(path)
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+            os.remove(path)
+        except OSError:
+            return False
+        with self.lock:
+            if self.total_size is not None:
+                self.total_size -= size
+        return True
+
+    def evict(self, keep=None):
+        """
+        Supprime les objets les moins récemment utilisés au-delà de max_size.
+        Le dossier n'est parcouru que si le total tenu à jour par ce
+        processus dépasse la limite (ou n'est pas encore connu): d'autres
+        processus ont pu ajouter ou évincer des objets entre-temps.
+        """
+        if self.max_size is None:
+            return
+        with self.lock:
+            if self.total_size is not None and self.total_size <= self.max_size:
+                return
+            objects = []
+            for root, _, files in os.walk(self.objects_dir):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue  # Objet en cours d'ajout
+                    path = os.path.join(root, name)
+                    try:
+                        info = os.stat(path)
+                    except OSError:
+                        continue
+                    objects.append((info.st_mtime, info.st_size, path))
+            total = sum(size for _, size, _ in objects)
+            victims = []
+            for _, size, path in sorted(objects):
+                if total <= self.max_size:
+                    break
+                if path != keep:
+                    victims.append((path, size))
+                    total -= size
+            self.total_size = None
+        for path, size in victims:
+            if not self.discard(path):
+                total += size
+        with self.lock:
+            # Mesuré à l'instant, suppressions déduites
+            self.total_size = total
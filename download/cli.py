@@ -0,0 +1,606 @@
+# -*- coding: utf-8 -*-
+"""
+Interface en ligne de commande de PytDm
+
+N'importe pas tkinter: utilisable sur des serveurs sans affichage et dans
+des conteneurs. Le chemin de chaque fichier téléchargé est écrit sur stdout,
+la progression et les erreurs sur stderr.
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+from .cache import DEFAULT_CACHE_SIZE, DownloadCache, default_cache_dir
+from .extract import DECOMPRESS, EXTRACT
+from .integrity import Checksum
+from .manager import describe_error
+from .metrics import METRICS, MetricsServer, parse_listen_address
+from .output import DEFAULT_WRITE_THREADS, FSYNC_NEVER, FSYNC_POLICIES, WritePolicy
+from .progress import format_eta
+from .ratelimit import parse_rate
+from .retry import DEFAULT_MAX_RETRIES, RETRY_METRICS, RetryPolicy
+from .scheduler import (
+    COMPLETED,
+    RUNNING,
+    DEFAULT_MAX_CONCURRENT,
+    DEFAULT_MAX_PER_HOST,
+    DownloadQueue,
+    read_url_file,
+)
+from .segmented import DEFAULT_SEGMENTS
+from .transport import DNS_CACHE_TTL, install_dns_cache
+
+
+def rate_argument(text):
+    """Type argparse pour un débit"""
+    try:
+        return parse_rate(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def print_retry_stats():
+    """Nouvelles tentatives par hôte, avec leurs causes"""
+    for host, reasons in sorted(RETRY_METRICS.by_host().items()):
+        causes = ", ".join(
+            f"{reason}: {count}" for reason, count in sorted(reasons.items())
+        )
+        print(
+            f"🔁 {host}: {sum(reasons.values())} nouvelle(s) tentative(s) ({causes})",
+            file=sys.stderr,
+        )
+
+
+def build_parser():
+    """Construit le parseur d'arguments"""
+    parser = argparse.ArgumentParser(
+        prog="PytDm",
+        description="PytDm - Python Download Manager (ligne de commande)",
+    )
+    parser.add_argument(
+        "urls", nargs="*", metavar="URL", help="URL(s) des fichiers à télécharger"
+    )
+    parser.add_argument(
+        "-i",
+        "--input-file",
+        help="fichier contenant une URL par ligne ('-' pour l'entrée standard)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default=str(Path.home() / "Downloads"),
+        help="dossier de téléchargement (défaut: ~/Downloads)",
+    )
+    parser.add_argument("-n", "--filename", help="nom du fichier (une seule URL)")
+    parser.add_argument(
+        "-c",
+        "--checksum",
+        metavar="SOMME",
+        help="somme attendue (sha256:<hex>, md5:<hex>...) ou URL d'un fichier de "
+        "sommes ou d'un Metalink (.meta4); vérifiée pendant le téléchargement "
+        "(une seule URL)",
+    )
+    unpack = parser.add_mutually_exclusive_group()
+    unpack.add_argument(
+        "-x",
+        "--extract",
+        dest="unpack",
+        action="store_const",
+        const=EXTRACT,
+        help="extrait les archives tar (.tar, .tar.gz, .tar.xz, .tar.zst...) pendant "
+        "le téléchargement, dans un dossier à côté du fichier; les autres fichiers "
+        "compressés sont décompressés",
+    )
+    unpack.add_argument(
+        "-z",
+        "--decompress",
+        dest="unpack",
+        action="store_const",
+        const=DECOMPRESS,
+        help="décompresse les fichiers .gz, .xz, .bz2, .zst pendant le téléchargement "
+        "(le fichier téléchargé est conservé)",
+    )
+    parser.add_argument(
+        "-m",
+        "--mirror",
+        action="append",
+        default=[],
+        metavar="URL",
+        help="autre URL du même fichier, utilisée en parallèle "
+        "(répétable, une seule URL)",
+    )
+    parser.add_argument(
+        "-s",
+        "--segments",
+        type=int,
+        default=DEFAULT_SEGMENTS,
+        help=f"connexions parallèles par fichier (défaut: {DEFAULT_SEGMENTS})",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT,
+        help=f"téléchargements simultanés (défaut: {DEFAULT_MAX_CONCURRENT})",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=DEFAULT_MAX_PER_HOST,
+        help=f"téléchargements simultanés par hôte (défaut: {DEFAULT_MAX_PER_HOST})",
+    )
+    parser.add_argument(
+        "--limit-rate",
+        type=rate_argument,
+        metavar="DÉBIT",
+        help="débit maximal cumulé, en octets/s (suffixes K, M, G: 500K, 2M)",
+    )
+    parser.add_argument(
+        "--limit-rate-per-file",
+        type=rate_argument,
+        metavar="DÉBIT",
+        help="débit maximal de chaque téléchargement (mêmes unités)",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        metavar="N",
+        help="connexions keep-alive gardées ouvertes par hôte et réutilisées "
+        "d'un fichier à l'autre (défaut: per-host × segments)",
+    )
+    parser.add_argument(
+        "--no-head",
+        action="store_true",
+        help="sonde chaque fichier par un GET Range: bytes=0- réutilisé pour le "
+        "transfert au lieu d'une requête HEAD séparée (gain d'un aller-retour par "
+        "fichier)",
+    )
+    parser.add_argument(
+        "--dns-ttl",
+        type=float,
+        default=0,
+        metavar="SECONDES",
+        help="active un cache DNS pour tout le processus, résolutions gardées "
+        f"SECONDES secondes (par exemple {DNS_CACHE_TTL:g}; défaut: désactivé, "
+        "chaque connexion résout le nom)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        nargs="?",
+        const=default_cache_dir(),
+        metavar="DOSSIER",
+        help="réutilise les fichiers déjà téléchargés d'un cache local partagé "
+        f"(défaut: {default_cache_dir()}; activé aussi par $PYTDM_CACHE_DIR)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=rate_argument,
+        default=DEFAULT_CACHE_SIZE,
+        metavar="TAILLE",
+        help="taille maximale du cache, les fichiers les moins récemment utilisés "
+        "sont évincés (suffixes K, M, G; défaut: 10G, 0: illimitée)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        metavar="N",
+        help="nouvelles tentatives consécutives sans progrès après une erreur réseau, "
+        f"reprises au dernier octet reçu (défaut: {DEFAULT_MAX_RETRIES}, 0: aucune)",
+    )
+    parser.add_argument(
+        "--priority",
+        type=int,
+        default=0,
+        metavar="N",
+        help="priorité des URL de cette commande: les plus grandes passent d'abord et "
+        "peuvent interrompre un gros transfert moins prioritaire, repris ensuite "
+        "(défaut: 0)",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDES",
+        help="échéance souhaitée, en secondes à partir de maintenant: à priorité "
+        "égale, l'échéance la plus proche passe d'abord",
+    )
+    parser.add_argument(
+        "--write-threads",
+        type=int,
+        default=DEFAULT_WRITE_THREADS,
+        metavar="N",
+        help="threads d'écriture sur disque par fichier, découplés des lectures "
+        f"réseau (défaut: {DEFAULT_WRITE_THREADS}, 0: écritures dans les threads de "
+        "transfert; moteur async: au moins un thread)",
+    )
+    parser.add_argument(
+        "--fsync",
+        choices=FSYNC_POLICIES,
+        default=FSYNC_NEVER,
+        help="synchronisation du fichier sur le disque: never (défaut), close (une "
+        "fois complet, avant le renommage) ou periodic (aussi pendant le transfert)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=("threads", "async"),
+        default="threads",
+        help="moteur de transfert: threads (défaut) ou async (asyncio + httpx, "
+        "pour de très nombreux petits fichiers)",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="affiche débit et temps CPU par Go de chaque téléchargement, "
+        "et les nouvelles tentatives par hôte",
+    )
+    parser.add_argument(
+        "--job-db",
+        nargs="?",
+        const="",
+        metavar="FICHIER",
+        help="enregistre les jobs dans une base SQLite et relance d'abord ceux qu'un "
+        "lancement précédent n'a pas terminés (défaut: $PYTDM_JOB_DB, sinon "
+        "$XDG_DATA_HOME/pytdm/jobs.db ou ~/.local/share/pytdm/jobs.db)",
+    )
+    parser.add_argument(
+        "--metrics-listen",
+        metavar="[HÔTE:]PORT",
+        help="expose les métriques des transferts au format Prometheus sur "
+        "http://HÔTE:PORT/metrics pendant l'exécution (hôte par défaut: 127.0.0.1)",
+    )
+    parser.add_argument(
+        "--metrics-log",
+        metavar="FICHIER",
+        help="ajoute à FICHIER une ligne JSON par téléchargement terminé et par "
+        "nouvelle tentative",
+    )
+    parser.add_argument(
+        "--api-listen",
+        metavar="[HÔTE:]PORT",
+        help="sert l'API de contrôle locale (ajout, pause, reprise, annulation, liste "
+        "des jobs, événements SSE sur /events) et attend de nouveaux jobs jusqu'à "
+        "Ctrl+C; jeton exigé si $PYTDM_API_TOKEN est défini "
+        "(hôte par défaut: 127.0.0.1)",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="n'affiche pas la progression"
+    )
+    return parser
+
+
+class ConsoleProgress:
+    """Affiche l'état et la progression sur une seule ligne de stderr"""
+
+    def __init__(self, stream=None, quiet=False):
+        self.stream = stream or sys.stderr
+        self.quiet = quiet
+        self.line_open = False
+
+    def status(self, message):
+        if self.quiet:
+            return
+        self.finish()
+        print(message, file=self.stream)
+
+    def progress(self, snapshot):
+        if self.quiet:
+            return
+        downloaded_mb = snapshot.downloaded / (1024 * 1024)
+        if snapshot.total > 0:
+            percentage = (snapshot.downloaded / snapshot.total) * 100
+            total_mb = snapshot.total / (1024 * 1024)
+            text = f"{downloaded_mb:.2f} MB / {total_mb:.2f} MB ({percentage:.1f}%)"
+        else:
+            text = f"{downloaded_mb:.2f} MB"
+        if snapshot.speed > 0:
+            text += f" - {snapshot.speed:.2f} MB/s"
+        if snapshot.eta is not None:
+            text += f" - reste {format_eta(snapshot.eta)}"
+        self.stream.write(f"\r{text:<72}")
+        self.stream.flush()
+        self.line_open = True
+
+    def finish(self):
+        """Termine la ligne de progression en cours"""
+        if self.line_open:
+            self.stream.write("\n")
+            self.stream.flush()
+            self.line_open = False
+
+
+def collect_urls(args):
+    """Réunit les URL de la ligne de commande et du fichier d'entrée"""
+    urls = list(args.urls)
+    if args.input_file == "-":
+        urls.extend(
+            line.strip()
+            for line in sys.stdin
+            if line.strip() and not line.lstrip().startswith("#")
+        )
+    elif args.input_file:
+        urls.extend(read_url_file(args.input_file))
+    return urls
+
+
+def main(argv=None):
+    """Point d'entrée de la ligne de commande"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.job_db == "":
+        # sqlite3 n'est chargé que si la base des jobs est demandée
+        from .jobstore import default_store_path
+
+        args.job_db = default_store_path()
+
+    try:
+        urls = collect_urls(args)
+    except OSError as e:
+        parser.error(f"impossible de lire {args.input_file}: {e}")
+
+    if not urls and not args.job_db and not args.api_listen:
+        parser.error("aucune URL à télécharger")
+    if args.filename and len(urls) > 1:
+        parser.error("--filename ne peut être utilisé qu'avec une seule URL")
+    if args.mirror and len(urls) > 1:
+        parser.error("--mirror ne peut être utilisé qu'avec une seule URL")
+    if args.mirror and args.engine == "async":
+        parser.error("--mirror n'est pas disponible avec --engine async")
+    if any(not mirror.startswith(("http://", "https://")) for mirror in args.mirror):
+        parser.error("les miroirs doivent commencer par http:// ou https://")
+    if (args.pool_size or args.no_head) and args.engine == "async":
+        parser.error(
+            "--pool-size et --no-head ne sont pas disponibles avec --engine async"
+        )
+    if args.pool_size is not None and args.pool_size < 1:
+        parser.error("--pool-size doit être supérieur ou égal à 1")
+    if args.unpack and args.engine == "async":
+        parser.error(
+            "--extract et --decompress ne sont pas disponibles avec --engine async"
+        )
+    if args.job_db and args.engine == "async":
+        parser.error("--job-db n'est pas disponible avec --engine async")
+    if args.api_listen and args.engine == "async":
+        parser.error("--api-listen n'est pas disponible avec --engine async")
+    if args.cache_dir and args.engine == "async":
+        parser.error("--cache-dir n'est pas disponible avec --engine async")
+    if args.checksum and len(urls) > 1:
+        parser.error("--checksum ne peut être utilisé qu'avec une seule URL")
+    if args.checksum and args.engine == "async":
+        parser.error("--checksum n'est pas disponible avec --engine async")
+    if (args.priority or args.deadline is not None) and args.engine == "async":
+        parser.error(
+            "--priority et --deadline ne sont pas disponibles avec --engine async"
+        )
+    if args.checksum and not args.checksum.startswith(("http://", "https://")):
+        try:
+            Checksum.parse(args.checksum)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.segments < 1 or args.jobs < 1 or args.per_host < 1:
+        parser.error(
+            "--segments, --jobs et --per-host doivent être supérieurs ou égaux à 1"
+        )
+    if args.retries < 0:
+        parser.error("--retries doit être positif ou nul")
+    if args.write_threads < 0:
+        parser.error("--write-threads doit être positif ou nul")
+    api_address = None
+    if args.api_listen:
+        try:
+            api_address = parse_listen_address(args.api_listen)
+        except ValueError as e:
+            parser.error(f"--api-listen: {e}")
+
+    metrics_server = None
+    if args.metrics_listen:
+        try:
+            metrics_server = MetricsServer(
+                *parse_listen_address(args.metrics_listen)
+            ).start()
+        except (ValueError, OSError) as e:
+            parser.error(f"--metrics-listen: {e}")
+    if args.metrics_log:
+        try:
+            METRICS.open_log(args.metrics_log)
+        except OSError as e:
+            parser.error(f"impossible d'ouvrir {args.metrics_log}: {e}")
+    store = None
+    if args.job_db:
+        import sqlite3
+
+        from .jobstore import JobStore
+
+        try:
+            store = JobStore(args.job_db)
+        except (OSError, sqlite3.Error) as e:
+            parser.error(f"impossible d'ouvrir {args.job_db}: {e}")
+
+    try:
+        return run(args, urls, store, api_address)
+    finally:
+        if store is not None:
+            store.close()
+        METRICS.close_log()
+        if metrics_server is not None:
+            metrics_server.stop()
+
+
+def run(args, urls, store=None, api_address=None):
+    """
+    Télécharge urls selon les options validées par main(). api_address:
+    (hôte, port) de l'API de contrôle; la file attend alors de nouveaux jobs
+    jusqu'à Ctrl+C.
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.dns_ttl > 0:
+        install_dns_cache(args.dns_ttl)
+
+    failures = 0
+    valid_urls = []
+    for url in urls:
+        if url.startswith(("http://", "https://")):
+            valid_urls.append(url)
+        else:
+            print(
+                f"❌ {url}: l'URL doit commencer par http:// ou https://",
+                file=sys.stderr,
+            )
+            failures += 1
+
+    # Jobs inachevés d'un lancement précédent: relancés avant les nouvelles URL
+    unfinished = store.unfinished() if store is not None else []
+    output_dir = os.path.abspath(args.output_dir)
+    resumed_urls = {stored.url for stored in unfinished if stored.folder == output_dir}
+    valid_urls = [url for url in valid_urls if url not in resumed_urls]
+
+    if not valid_urls and not unfinished and api_address is None:
+        print("Aucun téléchargement inachevé à reprendre", file=sys.stderr)
+        return 1 if failures else 0
+
+    # Une seule URL: barre de progression; plusieurs (ou l'API): une ligne par
+    # fichier terminé
+    alone = len(valid_urls) + len(unfinished) == 1 and api_address is None
+    console = ConsoleProgress(quiet=args.quiet or not alone)
+    events = None
+    if api_address is not None:
+        from .api import EventBroker
+
+        events = EventBroker()
+
+    def job_progress(job, snapshot):
+        # Un job qui vient de se terminer ne doit plus redessiner la ligne
+        if job.status == RUNNING:
+            console.progress(snapshot)
+        if events is not None:
+            events.job_progress(job, snapshot)
+
+    def job_status(job, message):
+        console.status(message)
+        if events is not None:
+            events.job_status(job, message)
+
+    def job_done(job):
+        if events is not None:
+            events.job_done(job)
+        console.finish()
+        if job.status == COMPLETED:
+            print(job.file_path, flush=True)
+            if args.stats and job.manager.stats is not None:
+                print(f"📊 {job.manager.stats.summary()}", file=sys.stderr, flush=True)
+        elif job.error is not None:
+            print(
+                f"{job.url}: {describe_error(job.error)}", file=sys.stderr, flush=True
+            )
+        else:
+            print(f"❌ {job.url}: téléchargement annulé", file=sys.stderr, flush=True)
+
+    callbacks = dict(
+        on_progress=job_progress,
+        on_status=job_status,
+        on_job_done=job_done,
+        rate_limit=args.limit_rate,
+        per_download_rate=args.limit_rate_per_file,
+        retry_policy=(
+            RetryPolicy(max_retries=args.retries) if args.retries > 0 else None
+        ),
+        write_policy=WritePolicy(args.write_threads, fsync=args.fsync),
+    )
+    if args.engine == "async":
+        # asyncio et httpx ne sont importés que pour ce moteur
+        import asyncio
+
+        from .async_engine import AsyncDownloadQueue
+
+        queue = AsyncDownloadQueue(
+            max_concurrent=args.jobs, max_per_host=args.per_host, **callbacks
+        )
+    else:
+        cache_dir = args.cache_dir or os.environ.get("PYTDM_CACHE_DIR")
+        queue = DownloadQueue(
+            max_concurrent=args.jobs,
+            max_per_host=args.per_host,
+            segments=args.segments,
+            cache=DownloadCache(cache_dir, args.cache_size) if cache_dir else None,
+            pool_size=args.pool_size,
+            skip_head=args.no_head,
+            extract=args.unpack,
+            store=store,
+            on_job_added=events.job_added if events is not None else None,
+            **callbacks,
+        )
+
+    if unfinished:
+        console.status(
+            f"🔁 {len(queue.restore())} téléchargement(s) inachevé(s) repris"
+        )
+    # Ordre d'exécution des URL de cette commande (moteur à threads seulement)
+    ordering = {}
+    if args.priority or args.deadline is not None:
+        deadline = time.time() + args.deadline if args.deadline is not None else None
+        ordering = dict(priority=args.priority, deadline=deadline)
+    # -n, -m et -c portent sur l'unique URL de la commande, même avec des
+    # jobs repris ou l'API (le parseur les refuse avec plusieurs URL)
+    if len(valid_urls) == 1 and (args.filename or args.mirror or args.checksum):
+        if args.engine != "async":
+            ordering.update(mirrors=args.mirror, checksum=args.checksum)
+        queue.add(valid_urls[0], args.output_dir, args.filename, **ordering)
+    else:
+        queue.add_many(valid_urls, args.output_dir, **ordering)
+
+    api_server = None
+    if api_address is not None:
+        from .api import ControlServer
+
+        try:
+            api_server = ControlServer(
+                queue,
+                events,
+                *api_address,
+                folder=args.output_dir,
+                token=os.environ.get("PYTDM_API_TOKEN") or None,
+            ).start()
+        except OSError as e:
+            print(f"❌ --api-listen: {e}", file=sys.stderr)
+            return 1
+        print(
+            f"🌐 API de contrôle: "
+            f"http://{api_address[0]}:{api_server.server_address[1]}/jobs",
+            file=sys.stderr,
+            flush=True,
+        )
+
+    try:
+        if args.engine == "async":
+            asyncio.run(queue.run_async())
+        elif api_server is not None:
+            # La file reste ouverte aux jobs ajoutés par l'API
+            queue.start()
+            while True:
+                time.sleep(0.5)
+        else:
+            queue.start()
+            queue.close()
+            # Attente par tranches pour rester réactif à Ctrl+C
+            while not queue.join(timeout=0.5):
+                pass
+    except KeyboardInterrupt:
+        # Garder les fichiers partiels pour une reprise ultérieure
+        queue.cancel_all(remove_partial=False)
+        if args.engine != "async":
+            # Laisser les workers enregistrer l'état des jobs avant de fermer la base
+            queue.close()
+            queue.join(timeout=5)
+        console.finish()
+        print("❌ Téléchargement interrompu", file=sys.stderr)
+        return 130
+    finally:
+        if api_server is not None:
+            api_server.stop()
+
+    if args.stats:
+        print_retry_stats()
+    failures += sum(1 for job in queue.jobs if job.status != COMPLETED)
+    return 1 if failures else 0
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+Décompression et extraction au fil du téléchargement
+
+Le fichier est toujours enregistré tel qu'envoyé par le serveur: les
+requêtes demandent ``Accept-Encoding: identity`` et un Content-Encoding
+imposé malgré tout n'est pas décodé par le transport, car Content-Length,
+les plages (reprise, segments) et les sommes de contrôle portent sur ces
+octets-là. Le décodage est l'affaire de StreamExtractor: un thread qui suit
+le début contigu du fichier partiel à mesure qu'il est écrit, le décompresse
+(gzip, xz, bzip2, zstd si ``zstandard`` est installé) et, si demandé,
+dépaquette l'archive tar qu'il contient. À la fin du téléchargement, le
+fichier décompressé ou le dossier extrait est prêt, sans seconde lecture
+complète du disque.
+
+Les sorties sont écrites sous un nom temporaire et ne prennent leur nom
+final qu'une fois le téléchargement complet et vérifié.
+"""
+
+import os
+import shutil
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    zstandard = None
+
+# bz2, lzma et tarfile sont importés à la première utilisation: ce module est
+# chargé par tout DownloadManager, y compris en ligne de commande sans -x/-z
+
+# Modes de post-traitement
+DECOMPRESS = "decompress"
+EXTRACT = "extract"
+
+# Lecture du fichier partiel par blocs modestes: la sortie d'un bloc
+# très compressible reste raisonnable en mémoire
+READ_SIZE = 64 * 1024
+
+# Attente maximale entre deux vérifications des octets disponibles
+POLL_INTERVAL = 0.1
+
+MAGIC_NUMBERS = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"BZh", "bzip2"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+MAGIC_SIZE = max(len(magic) for magic, _ in MAGIC_NUMBERS)
+
+# Suffixes retirés du nom du fichier décompressé
+SUFFIXES = {
+    ".gz": "",
+    ".tgz": ".tar",
+    ".xz": "",
+    ".txz": ".tar",
+    ".bz2": "",
+    ".tbz": ".tar",
+    ".tbz2": ".tar",
+    ".zst": "",
+    ".tzst": ".tar",
+}
+
+TAR_BLOCK_SIZE = 512
+
+
+class ExtractionError(IOError):
+    """Le fichier a été téléchargé mais n'a pas pu être décompressé ou extrait"""
+
+
+class _Restart(Exception):
+    """Le début du fichier partiel a été réécrit: tout reprendre depuis zéro"""
+
+
+class _Aborted(Exception):
+    """Téléchargement annulé ou en échec"""
+
+
+def detect_compression(head):
+    """Format de compression d'après les premiers octets, sinon None"""
+    for magic, kind in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def is_tar(head):
+    """Les 512 premiers octets décompressés sont-ils un en-tête tar (ustar ou v7) ?"""
+    if len(head) < TAR_BLOCK_SIZE:
+        return False
+    if head[257:262] == b"ustar":
+        return True
+    import tarfile
+
+    try:
+        tarfile.TarInfo.frombuf(
+            head[:TAR_BLOCK_SIZE], tarfile.ENCODING, "surrogateescape"
+        )
+        return True
+    except tarfile.HeaderError:
+        return False
+
+
+def new_decompressor(kind):
+    """Décompresseur incrémental (decompress(), eof, unused_data) pour kind"""
+    if kind == "gzip":
+        return zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    if kind == "xz":
+        import lzma
+
+        return lzma.LZMADecompressor()
+    if kind == "bzip2":
+        import bz2
+
+        return bz2.BZ2Decompressor()
+    if kind == "zstd":
+        if zstandard is None:
+            raise ExtractionError(
+                "Décompression zstd indisponible: installez le paquet 'zstandard'"
+            )
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Format de compression inconnu: {kind}")
+
+
+def decompressed_name(filename):
+    """Nom décompressé: archive.tar.gz -> archive.tar, data.tgz -> data.tar"""
+    root, suffix = os.path.splitext(filename)
+    if suffix.lower() in SUFFIXES and root:
+        return root + SUFFIXES[suffix.lower()]
+    return filename + ".out"
+
+
+def extracted_name(filename):
+    """Nom du dossier d'extraction: archive.tar.gz -> archive"""
+    name = (
+        decompressed_name(filename)
+        if os.path.splitext(filename)[1].lower() in SUFFIXES
+        else filename
+    )
+    root, suffix = os.path.splitext(name)
+    if suffix.lower() == ".tar" and root:
+        return root
+    return name + ".d"
+
+
+def safe_members(tar, destination):
+    """
+    Membres de tar sans danger hors de destination, pour les versions de
+    Python sans filtre d'extraction (tarfile.data_filter)
+    """
+    destination = os.path.realpath(destination)
+    for member in tar:
+        target = os.path.realpath(os.path.join(destination, member.name))
+        if (
+            os.path.isabs(member.name)
+            or os.path.commonpath([destination, target]) != destination
+        ):
+            raise ExtractionError(f"Chemin hors du dossier d'extraction: {member.name}")
+        if member.issym() or member.islnk():
+            link_base = os.path.dirname(target) if member.issym() else destination
+            link = os.path.realpath(os.path.join(link_base, member.linkname))
+            if (
+                os.path.isabs(member.linkname)
+                or os.path.commonpath([destination, link]) != destination
+            ):
+                raise ExtractionError(
+                    f"Lien hors du dossier d'extraction: {member.name}"
+                )
+        if member.isdev():
+            continue
+        yield member
+
+
+def merge_tree(source, target):
+    """Déplace le contenu du dossier source dans target (remplace l'existant)"""
+    for name in os.listdir(source):
+        src = os.path.join(source, name)
+        dst = os.path.join(target, name)
+        if os.path.isdir(src) and not os.path.islink(src) and os.path.isdir(dst):
+            merge_tree(src, dst)
+        else:
+            if os.path.isdir(dst) and not os.path.islink(dst):
+                shutil.rmtree(dst)
+            os.replace(src, dst)
+    os.rmdir(source)
+
+
+class DecodedStream:
+    """
+    Flux décompressé de la source d'un StreamExtractor, lu par tarfile ou
+    par copie. Le format est reconnu aux premiers octets; une source non
+    compressée est lue telle quelle.
+    """
+
+    def __init__(self, extractor):
+        self.extractor = extractor
+        self.kind = None
+        self.decompressor = None
+        self.buffer = bytearray()
+        self.eof = False
+
+    def detect(self):
+        """Lit le début de la source et retourne son format de compression (ou None)"""
+        head = b""
+        while len(head) < MAGIC_SIZE:
+            data = self.extractor.read_source(READ_SIZE)
+            if not data:
+                break
+            head += data
+        self.kind = detect_compression(head)
+        if self.kind is not None:
+            self.decompressor = new_decompressor(self.kind)
+        self._decode(head)
+        return self.kind
+
+    def _decode(self, data):
+        if self.decompressor is None:
+            self.buffer += data
+            return
+        while data:
+            if self.decompressor.eof:
+                # Membre suivant (gzip, xz, bzip2 et zstd admettent plusieurs membres)
+                if not data.strip(b"\x00"):
+                    break  # Bourrage final
+                self.decompressor = new_decompressor(self.kind)
+            self.buffer += self.decompressor.decompress(data)
+            data = self.decompressor.unused_data if self.decompressor.eof else b""
+
+    def _fill(self, size):
+        while len(self.buffer) < size and not self.eof:
+            data = self.extractor.read_source(READ_SIZE)
+            if not data:
+                self.eof = True
+                if self.decompressor is not None and not self.decompressor.eof:
+                    raise ExtractionError(f"Flux {self.kind} tronqué")
+                break
+            self._decode(data)
+
+    def peek(self, size):
+        self._fill(size)
+        return bytes(self.buffer[:size])
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = READ_SIZE
+        self._fill(size)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.extractor.decoded_bytes += len(data)
+        return data
+
+
+class StreamExtractor:
+    """
+    Décompresse source (fichier partiel en cours d'écriture) dans un thread.
+
+    available(): nombre d'octets écrits depuis le début de source; s'il
+    diminue (plages retéléchargées, fichier distant modifié), le traitement
+    reprend depuis zéro. mode: DECOMPRESS (fichier décompressé à côté du
+    téléchargement) ou EXTRACT (contenu d'une archive tar dans un dossier;
+    un fichier compressé qui n'est pas une archive est décompressé).
+    notify() réveille le thread après une écriture; finish(size) attend la
+    fin du traitement, commit() donne leur nom final aux sorties.
+    """
+
+    def __init__(self, source, file_path, mode=DECOMPRESS, available=None, stats=None):
+        self.source = source
+        self.file_path = file_path
+        self.mode = mode
+        self.available = available
+        self.stats = stats
+        self.total_size = None
+        self.stopped = False
+        self.error = None
+        self.kind = None
+        self.output = None  # Chemin final (fichier ou dossier), None si rien à produire
+        self.temporary = None
+        self.position = 0
+        self.input = None
+        self.decoded_bytes = 0
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def notify(self):
+        """De nouveaux octets ont été écrits"""
+        with self.condition:
+            self.condition.notify()
+
+    def read_source(self, size):
+        """Lit jusqu'à size octets de source dès qu'ils sont écrits; b'' à la fin"""
+        with self.condition:
+            while True:
+                if self.stopped:
+                    raise _Aborted()
+                finished = self.total_size is not None
+                available = self.total_size if finished else self.available()
+                if available < self.position:
+                    raise _Restart()
+                if available > self.position or finished:
+                    break
+                self.condition.wait(POLL_INTERVAL)
+        size = min(size, available - self.position)
+        if size <= 0:
+            return b""
+        if self.input is None:
+            # Sans tampon: une lecture anticipée garderait des octets pas encore écrits
+            self.input = open(self.source, "rb", buffering=0)
+        self.input.seek(self.position)
+        data = self.input.read(size)
+        self.position += len(data)
+        return data
+
+    def run(self):
+        started = time.perf_counter()
+        while True:
+            try:
+                self._process()
+                break
+            except _Restart:
+                self._reset()
+            except _Aborted:
+                break
+            except Exception as e:
+                if self._rewritten():
+                    # Octets lus corrompus, retéléchargés depuis: recommencer
+                    self._reset()
+                    continue
+                self.error = e
+                break
+        self._close_input()
+        if self.stats is not None and self.error is None and not self.stopped:
+            self.stats.add_decoded(
+                self.decoded_bytes, self.position, time.perf_counter() - started
+            )
+
+    def _process(self):
+        folder, filename = os.path.split(self.file_path)
+        stream = DecodedStream(self)
+        self.kind = stream.detect()
+        if self.mode == EXTRACT and is_tar(stream.peek(TAR_BLOCK_SIZE)):
+            self.output = os.path.join(folder, extracted_name(filename))
+            self.temporary = self.output + ".part"
+            self._remove_temporary()  # Reste d'un téléchargement interrompu
+            self._extract_tar(stream)
+        elif self.kind is not None:
+            self.output = os.path.join(folder, decompressed_name(filename))
+            self.temporary = self.output + ".part"
+            self._remove_temporary()
+            with open(self.temporary, "wb") as output:
+                for data in iter(lambda: stream.read(READ_SIZE), b""):
+                    output.write(data)
+
+    def _extract_tar(self, stream):
+        import tarfile
+
+        os.makedirs(self.temporary, exist_ok=True)
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(self.temporary, filter="data")
+            else:
+                tar.extractall(
+                    self.temporary, members=safe_members(tar, self.temporary)
+                )
+
+    def _rewritten(self):
+        """
+        Après une erreur: attend la fin du téléchargement, ou qu'une plage
+        déjà lue soit retéléchargée (True)
+        """
+        with self.condition:
+            while not self.stopped and self.total_size is None:
+                if self.available() < self.position:
+                    return True
+                self.condition.wait(POLL_INTERVAL)
+        return False
+
+    def _close_input(self):
+        if self.input is not None:
+            self.input.close()
+            self.input = None
+
+    def _reset(self):
+        """Oublie la sortie en cours avant de tout reprendre"""
+        self._close_input()
+        self._remove_temporary()
+        self.position = 0
+        self.decoded_bytes = 0
+        self.output = None
+
+    def _remove_temporary(self):
+        if self.temporary is None or not os.path.exists(self.temporary):
+            return
+        if os.path.isdir(self.temporary):
+            shutil.rmtree(self.temporary, ignore_errors=True)
+        else:
+            os.remove(self.temporary)
+
+    def finish(self, size):
+        """
+        source est complet (size octets): termine le traitement et ferme
+        source (qui peut ensuite être renommé). Lève ExtractionError en cas
+        d'échec du traitement.
+        """
+        with self.condition:
+            self.total_size = size
+            self.condition.notify()
+        self.thread.join()
+        if self.error is not None:
+            self._remove_temporary()
+            if isinstance(self.error, ExtractionError):
+                raise self.error
+            raise ExtractionError(
+                f"{type(self.error).__name__}: {self.error}"
+            ) from self.error
+
+    def commit(self):
+        """Donne leur nom final aux sorties; retourne le chemin produit ou None"""
+        if self.output is None:
+            return None
+        if os.path.isdir(self.temporary) and os.path.isdir(self.output):
+            merge_tree(self.temporary, self.output)
+        else:
+            os.replace(self.temporary, self.output)
+        return self.output
+
+    def abort(self):
+        """Arrête le traitement et supprime les sorties temporaires"""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self._remove_temporary()
@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+"""
+Vérification d'intégrité pendant le téléchargement
+
+La somme attendue vient d'une valeur explicite (``sha256:<hex>``,
+``md5:<hex>``, ``crc32:<hex>``...) ou d'une URL: fichier de sommes au format
+sha256sum/BSD, ou Metalink 4 (``.meta4``) dont les sommes par morceau
+permettent de ne retélécharger que les plages corrompues.
+
+Le calcul se fait au fil des écritures, sur les octets encore en mémoire.
+Seuls les octets reçus dans le désordre (segments) ou lors d'une session
+précédente sont relus depuis le fichier partiel, aussitôt écrits, donc le
+plus souvent depuis le cache du système.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import zlib
+
+# Algorithme déduit de la longueur d'une somme hexadécimale
+ALGORITHMS_BY_LENGTH = {8: "crc32", 32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+METALINK_NAMESPACES = {
+    "urn:ietf:params:xml:ns:metalink",  # Metalink 4 (RFC 5854)
+    "http://www.metalinker.org/",  # Metalink 3
+}
+
+
+class IntegrityError(Exception):
+    """La somme de contrôle du fichier ne correspond pas"""
+
+
+class CorruptRangesError(IntegrityError):
+    """Des morceaux sont corrompus; retirés du journal, ils seront retéléchargés"""
+
+    def __init__(self, ranges):
+        super().__init__(f"{len(ranges)} morceau(x) corrompu(s)")
+        self.ranges = ranges
+
+
+class Crc32:
+    """CRC-32 avec l'interface de hashlib"""
+
+    name = "crc32"
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f"{self.value & 0xffffffff:08x}"
+
+
+def normalize_algorithm(name):
+    """'SHA-256', 'sha256' -> 'sha256'"""
+    return name.lower().replace("-", "").replace("_", "")
+
+
+def new_hash(algorithm):
+    if algorithm == "crc32":
+        return Crc32()
+    try:
+        return hashlib.new(algorithm)
+    except ValueError:
+        raise ValueError(f"Algorithme de hachage inconnu: {algorithm}")
+
+
+class Checksum:
+    """
+    Somme attendue d'un fichier, avec éventuellement les sommes de ses
+    morceaux de piece_length octets (Metalink).
+    """
+
+    def __init__(
+        self,
+        algorithm=None,
+        digest=None,
+        piece_algorithm=None,
+        piece_length=None,
+        pieces=None,
+    ):
+        self.algorithm = normalize_algorithm(algorithm) if algorithm else None
+        self.digest = digest.lower() if digest else None
+        self.piece_algorithm = (
+            normalize_algorithm(piece_algorithm) if piece_algorithm else None
+        )
+        self.piece_length = piece_length
+        self.pieces = [piece.lower() for piece in pieces or ()]
+        for name in (self.algorithm, self.piece_algorithm):
+            if name:
+                new_hash(name)
+
+    @classmethod
+    def parse(cls, text):
+        """'sha256:<hex>', 'md5=<hex>' ou '<hex>' (algorithme déduit de la longueur)"""
+        match = re.fullmatch(r"\s*(?:([A-Za-z0-9-]+)[:=])?\s*([0-9A-Fa-f]+)\s*", text)
+        if match is None:
+            raise ValueError(
+                f"Somme de contrôle invalide: {text!r} (exemple: sha256:<hex>)"
+            )
+        algorithm, digest = match.groups()
+        if algorithm is None:
+            algorithm = ALGORITHMS_BY_LENGTH.get(len(digest))
+            if algorithm is None:
+                raise ValueError(
+                    "Impossible de deviner l'algorithme d'une somme de "
+                    f"{len(digest)} caractères"
+                )
+        return cls(algorithm, digest)
+
+    def __repr__(self):
+        return f"<Checksum {self.algorithm}:{self.digest} morceaux={len(self.pieces)}>"
+
+
+def parse_checksum_file(text, filename, url=""):
+    """
+    Lit un fichier de sommes (``<hex>  fichier``, ``<hex> *fichier`` ou
+    ``SHA256 (fichier) = <hex>``). Retourne la somme de filename, ou la
+    seule somme du fichier.
+    """
+    entries = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        bsd = re.fullmatch(r"([A-Za-z0-9-]+)\s*\((.+)\)\s*=\s*([0-9A-Fa-f]+)", line)
+        if bsd:
+            entries.append((bsd.group(2), bsd.group(1), bsd.group(3)))
+            continue
+        gnu = re.fullmatch(r"([0-9A-Fa-f]+)(?:\s+\*?(.+))?", line)
+        if gnu:
+            entries.append((gnu.group(2), None, gnu.group(1)))
+
+    chosen = [
+        entry
+        for entry in entries
+        if entry[0] and os.path.basename(entry[0]) == filename
+    ]
+    if not chosen:
+        if len(entries) != 1:
+            raise ValueError(
+                f"Aucune somme pour {filename} dans {url or 'le fichier de sommes'}"
+            )
+        chosen = entries
+    _, algorithm, digest = chosen[0]
+    if algorithm is None:
+        # Extension du fichier de sommes (.sha256, .md5...) ou longueur de la somme
+        extension = normalize_algorithm(url.rsplit(".", 1)[-1]) if "." in url else ""
+        algorithm = (
+            extension
+            if extension in hashlib.algorithms_available
+            else ALGORITHMS_BY_LENGTH.get(len(digest))
+        )
+    return Checksum(algorithm, digest)
+
+
+def parse_metalink(text, filename):
+    """Sommes (totale et par morceau) de filename, ou du seul fichier, d'un Metalink"""
+    # Seuls les Metalink ont besoin du parseur XML
+    import xml.etree.ElementTree as ElementTree
+
+    root = ElementTree.fromstring(text)
+    namespace = root.tag[1:].split("}")[0] if root.tag.startswith("{") else ""
+    if namespace not in METALINK_NAMESPACES:
+        raise ValueError("Document Metalink non reconnu")
+
+    def tag(name):
+        return f"{{{namespace}}}{name}"
+
+    files = list(root.iter(tag("file")))
+    chosen = [element for element in files if element.get("name") == filename] or files[
+        :1
+    ]
+    if not chosen:
+        raise ValueError("Metalink sans fichier")
+    element = chosen[0]
+
+    # Préférer l'algorithme le plus fort disponible
+    preferred = ["sha512", "sha384", "sha256", "sha1", "md5"]
+    hashes = {}
+    for hash_element in element.iter(tag("hash")):
+        if hash_element.get("type") and hash_element.text:
+            hashes[normalize_algorithm(hash_element.get("type"))] = (
+                hash_element.text.strip()
+            )
+    algorithm = next((name for name in preferred if name in hashes), None)
+
+    piece_algorithm = piece_length = None
+    pieces = []
+    pieces_element = element.find(tag("pieces"))
+    if pieces_element is None:
+        # Metalink 3: <verification><pieces>
+        pieces_element = next(element.iter(tag("pieces")), None)
+    if pieces_element is not None:
+        piece_algorithm = pieces_element.get("type")
+        piece_length = int(pieces_element.get("length"))
+        pieces = [
+            hash_element.text.strip()
+            for hash_element in pieces_element.iter(tag("hash"))
+        ]
+
+    if algorithm is None and not pieces:
+        raise ValueError(f"Aucune somme pour {filename} dans le Metalink")
+    return Checksum(
+        algorithm, hashes.get(algorithm), piece_algorithm, piece_length, pieces
+    )
+
+
+def load_checksum(spec, filename, session=None, headers=None):
+    """
+    Convertit spec en Checksum: Checksum, somme ('sha256:<hex>') ou URL
+    d'un fichier de sommes / d'un Metalink (téléchargé avec session).
+    """
+    if spec is None or isinstance(spec, Checksum):
+        return spec
+    if not spec.startswith(("http://", "https://")):
+        return Checksum.parse(spec)
+
+    response = session.get(spec, headers=headers, timeout=30)
+    response.raise_for_status()
+    text = response.text
+    if spec.endswith((".meta4", ".metalink")) or text.lstrip().startswith("<"):
+        return parse_metalink(text, filename)
+    return parse_checksum_file(text, filename, spec)
+
+
+class _Piece:
+    """Hachage en mémoire d'un morceau reçu dans l'ordre"""
+
+    def __init__(self, algorithm, offset):
+        self.hash = new_hash(algorithm)
+        self.position = offset
+        self.lock = threading.Lock()
+
+
+class StreamingVerifier:
+    """
+    Calcule, au fil des écritures dans le fichier partiel, la somme du
+    fichier entier et celles des morceaux.
+
+    update(offset, data) est appelée depuis les threads d'écriture (le
+    callback on_flush de CoalescingWriter), verify() une fois le fichier
+    complet. contiguous_end() indique jusqu'où le début du fichier est
+    écrit (ResumeJournal.contiguous_end).
+    """
+
+    def __init__(self, checksum, part_path, total_size, contiguous_end=None):
+        self.checksum = checksum
+        self.part_path = part_path
+        self.total_size = total_size
+        self.contiguous_end = contiguous_end or (lambda: 0)
+
+        # Somme du fichier: octets hachés dans l'ordre jusqu'à frontier
+        self.file_hash = new_hash(checksum.algorithm) if checksum.digest else None
+        self.frontier = 0
+        self.order_lock = threading.Lock()
+
+        # Sommes par morceau
+        self.piece_length = checksum.piece_length if checksum.pieces else None
+        self.pieces = {}
+        self.verified = set()
+        self.bad = set()
+        self.lock = threading.Lock()
+
+    def piece_range(self, index):
+        """Plage (début, fin) inclusive du morceau index"""
+        start = index * self.piece_length
+        return start, min(start + self.piece_length, self.total_size) - 1
+
+    def update(self, offset, data):
+        if self.piece_length:
+            self._update_pieces(offset, data)
+        if self.file_hash is not None:
+            self._update_file(offset, data)
+
+    def _update_file(self, offset, data):
+        # Un seul thread hache le fichier; les autres n'attendent pas: leurs
+        # octets seront relus depuis le disque par le thread qui avance
+        if not self.order_lock.acquire(blocking=False):
+            return
+        try:
+            if offset == self.frontier:
+                self.file_hash.update(data)
+                self.frontier += len(data)
+            self._catch_up(min(self.contiguous_end(), self.total_size))
+        finally:
+            self.order_lock.release()
+
+    def _catch_up(self, limit):
+        """Hache depuis le disque les octets entre frontier et limit (verrou tenu)"""
+        if limit <= self.frontier:
+            return
+        with open(self.part_path, "rb") as file:
+            file.seek(self.frontier)
+            while self.frontier < limit:
+                block = file.read(min(READ_BLOCK_SIZE, limit - self.frontier))
+                if not block:
+                    break
+                self.file_hash.update(block)
+                self.frontier += len(block)
+
+    def _update_pieces(self, offset, data):
+        view = memoryview(data)
+        position = offset
+        while view:
+            index = position // self.piece_length
+            start, end = self.piece_range(index)
+            count = min(len(view), end + 1 - position)
+            self._update_piece(index, start, end, position, view[:count])
+            position += count
+            view = view[count:]
+
+    def _update_piece(self, index, start, end, position, data):
+        with self.lock:
+            if index in self.verified or index in self.bad:
+                return
+            piece = self.pieces.get(index)
+            if piece is None:
+                if position != start:
+                    # Morceau commencé ailleurs: il sera relu à la fin
+                    self.pieces[index] = False
+                    return
+                piece = self.pieces[index] = _Piece(
+                    self.checksum.piece_algorithm, start
+                )
+            elif piece is False:
+                return
+        with piece.lock:
+            if position != piece.position:
+                with self.lock:
+                    self.pieces[index] = False
+                return
+            piece.hash.update(data)
+            piece.position += len(data)
+            complete = piece.position > end
+        if complete:
+            self._check_piece(index, piece.hash.hexdigest())
+
+    def _check_piece(self, index, digest):
+        with self.lock:
+            self.pieces.pop(index, None)
+            if (
+                index < len(self.checksum.pieces)
+                and digest == self.checksum.pieces[index]
+            ):
+                self.verified.add(index)
+            else:
+                self.bad.add(index)
+
+    def _hash_from_disk(self, algorithm, start, end):
+        digest = new_hash(algorithm)
+        with open(self.part_path, "rb") as file:
+            file.seek(start)
+            remaining = end + 1 - start
+            while remaining > 0:
+                block = file.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+        return digest.hexdigest()
+
+    def verify(self):
+        """
+        Termine la vérification du fichier complet.
+
+        Retourne la liste des plages (début, fin) corrompues, vide si tout
+        est correct. Lève IntegrityError si seule la somme globale diffère.
+        """
+        if self.piece_length:
+            count = -(-self.total_size // self.piece_length)
+            for index in range(count):
+                if index not in self.verified and index not in self.bad:
+                    start, end = self.piece_range(index)
+                    self._check_piece(
+                        index,
+                        self._hash_from_disk(self.checksum.piece_algorithm, start, end),
+                    )
+            if self.bad:
+                return [self.piece_range(index) for index in sorted(self.bad)]
+
+        if self.file_hash is not None:
+            with self.order_lock:
+                self._catch_up(self.total_size)
+                digest = self.file_hash.hexdigest()
+            if digest != self.checksum.digest:
+                raise IntegrityError(
+                    f"Somme {self.checksum.algorithm} incorrecte: {digest} "
+                    f"au lieu de {self.checksum.digest}"
+                )
+        return []
+
+    def reset(self):
+        """Oublie tout: le fichier partiel est retéléchargé depuis le début"""
+        with self.lock:
+            self.pieces.clear()
+            self.verified.clear()
+            self.bad.clear()
+        if self.file_hash is not None:
+            with self.order_lock:
+                self.file_hash = new_hash(self.checksum.algorithm)
+                self.frontier = 0
+
+    def reset_ranges(self, ranges):
+        """Oublie les morceaux à retélécharger, et la somme globale qui les incluait"""
+        with self.lock:
+            for start, _ in ranges:
+                index = start // self.piece_length
+                self.bad.discard(index)
+                self.verified.discard(index)
+                self.pieces.pop(index, None)
+        if self.file_hash is not None:
+            with self.order_lock:
+                self.file_hash = new_hash(self.checksum.algorithm)
+                self.frontier = 0
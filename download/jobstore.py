@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+Base des jobs de téléchargement (SQLite)
+
+Chaque job (URL, dossier, miroirs, somme de contrôle, priorité et
+échéance) est enregistré avec son état, son fichier cible, ses validateurs
+(ETag / Last-Modified) et sa progression. Après une fermeture ou un
+plantage, les jobs inachevés sont relus et relancés; les octets déjà
+écrits sont repris grâce au journal ``.part.journal`` de chaque fichier
+(voir journal.py).
+
+Coût d'écriture minimal: base en mode WAL (synchronous=NORMAL), états
+écrits à chaque changement (rares), progression des jobs suivis relevée
+par un seul thread et écrite en une transaction au plus une fois par
+FLUSH_INTERVAL.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Intervalle entre deux écritures de la progression des jobs suivis
+FLUSH_INTERVAL = 2.0
+
+# États enregistrés (mêmes valeurs que scheduler.py)
+UNFINISHED_STATUSES = ("pending", "running")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    filename TEXT,
+    mirrors TEXT NOT NULL DEFAULT '[]',
+    checksum TEXT,
+    status TEXT NOT NULL,
+    file_path TEXT,
+    total_size INTEGER NOT NULL DEFAULT 0,
+    downloaded INTEGER NOT NULL DEFAULT 0,
+    etag TEXT,
+    last_modified TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    deadline REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+# Colonnes ajoutées depuis la première version du schéma: (nom, définition)
+ADDED_COLUMNS = (
+    ("priority", "INTEGER NOT NULL DEFAULT 0"),
+    ("deadline", "REAL"),
+)
+
+
+def default_store_path():
+    """
+    $PYTDM_JOB_DB, sinon $XDG_DATA_HOME/pytdm/jobs.db ou
+    ~/.local/share/pytdm/jobs.db
+    """
+    if os.environ.get("PYTDM_JOB_DB"):
+        return os.environ["PYTDM_JOB_DB"]
+    base = os.environ.get("XDG_DATA_HOME") or str(Path.home() / ".local" / "share")
+    return os.path.join(base, "pytdm", "jobs.db")
+
+
+def checksum_text(checksum):
+    """Somme attendue sous forme enregistrable ('sha256:<hex>' ou URL), sinon None"""
+    if checksum is None or isinstance(checksum, str):
+        return checksum
+    if getattr(checksum, "digest", None):
+        return f"{checksum.algorithm}:{checksum.digest}"
+    return None
+
+
+class StoredJob:
+    """Un job relu depuis la base"""
+
+    def __init__(
+        self,
+        id,
+        url,
+        folder,
+        filename,
+        mirrors,
+        checksum,
+        status,
+        file_path,
+        total_size,
+        downloaded,
+        etag,
+        last_modified,
+        error,
+        created,
+        updated,
+        priority=0,
+        deadline=None,
+    ):
+        self.id = id
+        self.url = url
+        self.folder = folder
+        self.filename = filename
+        self.mirrors = json.loads(mirrors)
+        self.checksum = checksum
+        self.status = status
+        self.file_path = file_path
+        self.total_size = total_size
+        self.downloaded = downloaded
+        self.etag = etag
+        self.last_modified = last_modified
+        self.error = error
+        self.created = created
+        self.updated = updated
+        self.priority = priority
+        self.deadline = deadline  # Horodatage Unix, ou None
+
+    def __repr__(self):
+        return f"<StoredJob {self.id} {self.status} {self.url}>"
+
+
+class JobStore:
+    """
+    Jobs persistants dans une base SQLite, utilisable depuis plusieurs
+    threads. track(job_id, manager) fait relever la progression de manager
+    jusqu'à untrack(); close() écrit la dernière progression.
+    """
+
+    def __init__(self, path=None, flush_interval=FLUSH_INTERVAL):
+        self.path = path or default_store_path()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: pas de fsync par transaction, base toujours cohérente
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.flush_interval = flush_interval
+        self.tracked = {}  # id -> (manager, dernière progression écrite)
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _migrate(self):
+        """Ajoute les colonnes manquantes d'une base créée par une version précédente"""
+        existing = {
+            row[1] for row in self.connection.execute("PRAGMA table_info(jobs)")
+        }
+        for name, definition in ADDED_COLUMNS:
+            if name not in existing:
+                self.connection.execute(
+                    f"ALTER TABLE jobs ADD COLUMN {name} {definition}"
+                )
+
+    def _execute(self, sql, parameters=()):
+        with self.lock:
+            if self.closed:
+                raise sqlite3.ProgrammingError("La base des jobs est fermée")
+            return self.connection.execute(sql, parameters)
+
+    def _update(self, sql, parameters):
+        """Écriture sans effet une fois la base fermée (workers encore actifs)"""
+        with self.lock:
+            if not self.closed:
+                self.connection.execute(sql, parameters)
+
+    def add(
+        self,
+        url,
+        folder,
+        filename=None,
+        mirrors=(),
+        checksum=None,
+        status="pending",
+        priority=0,
+        deadline=None,
+    ):
+        """Enregistre un nouveau job et retourne son identifiant"""
+        now = time.time()
+        # Chemin absolu: le prochain lancement peut partir d'un autre dossier courant
+        cursor = self._execute(
+            "INSERT INTO jobs (url, folder, filename, mirrors, checksum, status, "
+            "created, updated, priority, deadline) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                url,
+                os.path.abspath(folder),
+                filename,
+                json.dumps(list(mirrors)),
+                checksum_text(checksum),
+                status,
+                now,
+                now,
+                priority,
+                deadline,
+            ),
+        )
+        return cursor.lastrowid
+
+    def set_priority(self, job_id, priority, deadline=None):
+        """Change la priorité et l'échéance (horodatage Unix, None: aucune) d'un job"""
+        self._update(
+            "UPDATE jobs SET priority = ?, deadline = ?, updated = ? WHERE id = ?",
+            (priority, deadline, time.time(), job_id),
+        )
+
+    def set_status(self, job_id, status, error=None, manager=None):
+        """
+        Change l'état d'un job; manager: enregistre aussi sa progression.
+        Sans effet une fois la base fermée (le job reste à reprendre).
+        """
+        if manager is None:
+            self._update(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+            return
+        self._update(
+            "UPDATE jobs SET status = ?, error = ?, updated = ?, file_path = ?, "
+            "total_size = ?, downloaded = ?, etag = COALESCE(?, etag), "
+            "last_modified = COALESCE(?, last_modified) WHERE id = ?",
+            (status, error, time.time(), *self._progress(manager), job_id),
+        )
+
+    def get(self, job_id):
+        """StoredJob d'identifiant job_id, ou None"""
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return StoredJob(*row) if row is not None else None
+
+    def jobs(self, statuses=None):
+        """Jobs enregistrés (filtrés par état), du plus ancien au plus récent"""
+        if statuses is None:
+            rows = self._execute("SELECT * FROM jobs ORDER BY id").fetchall()
+        else:
+            marks = ", ".join("?" * len(statuses))
+            rows = self._execute(
+                f"SELECT * FROM jobs WHERE status IN ({marks}) ORDER BY id",
+                tuple(statuses),
+            ).fetchall()
+        return [StoredJob(*row) for row in rows]
+
+    def unfinished(self):
+        """Jobs en attente ou interrompus en cours de transfert"""
+        return self.jobs(UNFINISHED_STATUSES)
+
+    def remove(self, job_id):
+        self.untrack(job_id)
+        self._execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def purge(self, statuses=("completed", "cancelled", "failed")):
+        """Supprime les jobs terminés; retourne leur nombre"""
+        marks = ", ".join("?" * len(statuses))
+        return self._execute(
+            f"DELETE FROM jobs WHERE status IN ({marks})", tuple(statuses)
+        ).rowcount
+
+    # Progression
+
+    @staticmethod
+    def _progress(manager):
+        """(fichier, taille, octets écrits, ETag, Last-Modified) d'un DownloadManager"""
+        journal = manager.journal
+        return (
+            manager.file_path,
+            manager.total_size,
+            manager.downloaded_size,
+            getattr(journal, "etag", None),
+            getattr(journal, "last_modified", None),
+        )
+
+    def track(self, job_id, manager):
+        """Relève la progression de manager toutes les flush_interval secondes"""
+        with self.lock:
+            if self.closed:
+                return
+            self.tracked[job_id] = (manager, None)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def untrack(self, job_id):
+        with self.lock:
+            self.tracked.pop(job_id, None)
+
+    def flush(self):
+        """Écrit, en une transaction, la progression des jobs suivis qui a changé"""
+        now = time.time()
+        with self.lock:
+            if self.closed:
+                return
+            updates = []
+            for job_id, (manager, written) in self.tracked.items():
+                progress = self._progress(manager)
+                if progress != written:
+                    self.tracked[job_id] = (manager, progress)
+                    updates.append((*progress, now, job_id))
+            if not updates:
+                return
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    "UPDATE jobs SET file_path = ?, total_size = ?, downloaded = ?, "
+                    "etag = COALESCE(?, etag), "
+                    "last_modified = COALESCE(?, last_modified), updated = ? "
+                    "WHERE id = ?",
+                    updates,
+                )
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Écrit la dernière progression et ferme la base"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        with self.lock:
+            self.closed = True
+            self.connection.close()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Journal de reprise des téléchargements
+
+Chaque téléchargement en cours écrit dans ``<fichier>.part`` et tient à
+côté un petit journal JSON (``<fichier>.part.journal``) avec l'URL, la
+taille, les validateurs (ETag / Last-Modified) et les plages d'octets déjà
+écrites. Au redémarrage, seules les plages manquantes sont demandées, avec
+If-Range pour garantir que le fichier distant n'a pas changé.
+
+Les plages ne doivent être ajoutées qu'une fois les octets transmis au
+système (écritures non bufferisées ou flush), sans quoi le journal pourrait
+annoncer des données absentes du fichier.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+PART_SUFFIX = ".part"
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_VERSION = 1
+
+# Intervalle minimal entre deux écritures du journal sur disque
+SAVE_INTERVAL = 1.0
+
+
+def part_path_for(file_path):
+    """Chemin du fichier partiel associé à un fichier final"""
+    return file_path + PART_SUFFIX
+
+
+def journal_path_for(file_path):
+    """Chemin du journal associé à un fichier final"""
+    return part_path_for(file_path) + JOURNAL_SUFFIX
+
+
+class ResumeJournal:
+    """
+    Plages terminées et validateurs d'un téléchargement.
+
+    Les plages sont stockées fusionnées, en intervalles semi-ouverts
+    [début, fin). add() est en O(log n) et ne touche pas le disque; save()
+    n'écrit qu'au plus une fois par SAVE_INTERVAL sauf si force=True.
+    """
+
+    def __init__(
+        self, path, url, total_size, etag=None, last_modified=None, ranges=None
+    ):
+        self.path = path
+        self.url = url
+        self.total_size = total_size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.starts = []
+        self.ends = []
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.last_save = 0.0
+        self.dirty = False
+        self.discarded = False
+        for start, end in ranges or ():
+            self.add(start, end - start)
+
+    @classmethod
+    def for_file(cls, file_path, url, total_size, etag=None, last_modified=None):
+        """Nouveau journal vide pour file_path"""
+        return cls(journal_path_for(file_path), url, total_size, etag, last_modified)
+
+    @classmethod
+    def load(cls, file_path):
+        """Relit le journal de file_path; None s'il est absent ou illisible"""
+        path = journal_path_for(file_path)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("version") != JOURNAL_VERSION:
+                return None
+            return cls(
+                path,
+                data["url"],
+                int(data["size"]),
+                data.get("etag"),
+                data.get("last_modified"),
+                [(int(start), int(end)) for start, end in data.get("ranges", [])],
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def matches(self, url, total_size, etag=None, last_modified=None):
+        """Indique si le journal décrit bien la même ressource distante"""
+        if total_size != self.total_size:
+            return False
+        if etag or self.etag:
+            return etag == self.etag
+        if last_modified or self.last_modified:
+            return last_modified == self.last_modified
+        # Sans validateur, seule l'URL permet de reconnaître la ressource
+        return url == self.url
+
+    def if_range(self):
+        """Valeur de l'en-tête If-Range, ou None sans validateur utilisable"""
+        # If-Range exige un ETag fort
+        if self.etag and not self.etag.startswith("W/"):
+            return self.etag
+        return self.last_modified
+
+    def add(self, start, length):
+        """Marque [start, start + length) comme écrit"""
+        if length <= 0:
+            return
+        end = start + length
+        with self.lock:
+            # Intervalles qui touchent ou chevauchent [start, end)
+            first = bisect.bisect_left(self.ends, start)
+            last = bisect.bisect_right(self.starts, end)
+            if first < last:
+                start = min(start, self.starts[first])
+                end = max(end, self.ends[last - 1])
+            self.starts[first:last] = [start]
+            self.ends[first:last] = [end]
+            self.dirty = True
+
+    def completed_bytes(self):
+        """Nombre d'octets déjà écrits"""
+        with self.lock:
+            return sum(end - start for start, end in zip(self.starts, self.ends))
+
+    def is_complete(self):
+        with self.lock:
+            return self.starts == [0] and self.ends == [self.total_size]
+
+    def contiguous_end(self):
+        """Fin de la plage écrite depuis le début du fichier (0 si le début manque)"""
+        with self.lock:
+            if self.starts and self.starts[0] == 0:
+                return self.ends[0]
+            return 0
+
+    def discard(self, start, end):
+        """Retire la plage [start, end] (inclusive) des plages écrites"""
+        end += 1
+        with self.lock:
+            starts = []
+            ends = []
+            for range_start, range_end in zip(self.starts, self.ends):
+                if range_end <= start or range_start >= end:
+                    starts.append(range_start)
+                    ends.append(range_end)
+                    continue
+                if range_start < start:
+                    starts.append(range_start)
+                    ends.append(start)
+                if range_end > end:
+                    starts.append(end)
+                    ends.append(range_end)
+            self.starts = starts
+            self.ends = ends
+            self.dirty = True
+
+    def missing_ranges(self):
+        """Plages manquantes, en (début, fin) inclusifs comme l'en-tête Range"""
+        missing = []
+        position = 0
+        with self.lock:
+            for start, end in zip(self.starts, self.ends):
+                if start > position:
+                    missing.append((position, start - 1))
+                position = max(position, end)
+        if position < self.total_size:
+            missing.append((position, self.total_size - 1))
+        return missing
+
+    def reset(self):
+        """Oublie toutes les plages (le fichier distant a changé)"""
+        with self.lock:
+            self.starts = []
+            self.ends = []
+            self.dirty = True
+        self.save(force=True)
+
+    def save(self, force=False):
+        """Écrit le journal sur disque de façon atomique"""
+        now = time.monotonic()
+        if not force and (not self.dirty or now - self.last_save < SAVE_INTERVAL):
+            return
+        with self.save_lock:
+            if self.discarded:
+                return
+            with self.lock:
+                data = {
+                    "version": JOURNAL_VERSION,
+                    "url": self.url,
+                    "size": self.total_size,
+                    "etag": self.etag,
+                    "last_modified": self.last_modified,
+                    "ranges": [
+                        [start, end] for start, end in zip(self.starts, self.ends)
+                    ],
+                }
+                self.dirty = False
+                self.last_save = now
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(data, file, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """Supprime le journal (téléchargement terminé ou abandonné)"""
+        with self.save_lock:
+            self.discarded = True
+            for path in (self.path, self.path + ".tmp"):
+                if os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
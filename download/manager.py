@@ -0,0 +1,999 @@
+# -*- coding: utf-8 -*-
+"""
+Moteur de téléchargement indépendant de l'interface graphique
+
+Le moteur ne connaît ni tkinter ni la console: il signale son état par des
+callbacks appelés depuis le thread de téléchargement. C'est à l'appelant
+(GUI, CLI) de les relayer vers son propre thread si nécessaire.
+"""
+
+import os
+import threading
+from urllib.parse import urlparse
+
+import requests
+
+from .extract import ExtractionError, StreamExtractor
+from .integrity import (
+    Checksum,
+    CorruptRangesError,
+    IntegrityError,
+    StreamingVerifier,
+    load_checksum,
+)
+from .journal import ResumeJournal, journal_path_for, part_path_for
+from .metadata import (
+    DEFAULT_FILENAME,
+    NAME_RESERVATIONS,
+    FileMetadata,
+    filename_from_url,
+)
+from .metrics import METRICS
+from .mirrors import MultiSourceDownloader, probe_mirrors, select_mirrors
+from .output import (
+    DEFAULT_WRITE_POLICY,
+    InsufficientSpaceError,
+    PartFile,
+    check_free_space,
+)
+from .progress import ProgressAggregator, ProgressTicker
+from .ratelimit import RateLimiter, TokenBucket
+from .retry import DEFAULT_RETRY_POLICY, RETRY_METRICS, retry_reason
+from .segmented import (
+    DEFAULT_SEGMENTS,
+    MIN_SEGMENT_SIZE,
+    RangeNotSupportedError,
+    SegmentedDownloader,
+)
+from .streaming import (
+    CoalescingWriter,
+    ConnectionReleased,
+    CpuTimer,
+    IncompleteTransferError,
+    MissingRangesError,
+    TransferStats,
+    check_part_complete,
+    iter_adaptive,
+)
+from .transport import (
+    DEFAULT_POOL_SIZE,
+    create_session,
+    probe_get,
+)
+
+# Au-delà de cette durée de pause, la connexion est fermée puis rouverte
+# avec une requête Range à la reprise (None pour la garder ouverte)
+PAUSE_RELEASE_DELAY = 30.0
+
+# Description des méthodes de DownloadCache.materialize
+CLONE_LABELS = {"reflink": "clone", "copy": "copie"}
+
+# Passes de retéléchargement des morceaux corrompus avant d'abandonner
+VERIFY_ATTEMPTS = 3
+
+# En-têtes HTTP pour simuler un navigateur
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": (
+        "text/html,application/xhtml+xml,application/xml;q=0.9,"
+        "image/webp,image/apng,*/*;q=0.8"
+    ),
+    "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.8",
+    # Les offsets de reprise portent sur les octets stockés: pas de compression
+    "Accept-Encoding": "identity",
+    "DNT": "1",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Cache-Control": "max-age=0",
+}
+
+
+def get_filename_from_url(url):
+    """Extrait le nom du fichier à partir de l'URL"""
+    filename = filename_from_url(url)
+
+    if not filename or "." not in filename:
+        filename = DEFAULT_FILENAME
+
+    return filename
+
+
+def describe_error(error):
+    """Retourne un message d'erreur lisible pour une exception de téléchargement"""
+    # requests.HTTPError et httpx.HTTPStatusError portent tous deux la réponse
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None and status_code >= 400:
+        if status_code == 403:
+            return (
+                "❌ Accès interdit (403 Forbidden)\n\n"
+                "Le serveur bloque les téléchargements automatiques.\n"
+                "Essayez de copier le lien directement depuis votre navigateur."
+            )
+        if status_code == 404:
+            return "❌ Fichier non trouvé (404)\n\nVérifiez que l'URL est correcte."
+        return f"❌ Erreur HTTP {status_code}: {str(error)}"
+    if isinstance(error, ExtractionError):
+        return (
+            f"❌ Extraction impossible: {str(error)}\n\n"
+            "Le fichier téléchargé a été conservé."
+        )
+    if isinstance(error, InsufficientSpaceError):
+        return (
+            f"❌ {error.strerror}\n\n"
+            "Libérez de l'espace ou choisissez un autre dossier."
+        )
+    if isinstance(error, IntegrityError):
+        return (
+            f"❌ Fichier corrompu: {str(error)}\n\nLe fichier partiel a été supprimé."
+        )
+    if isinstance(error, requests.exceptions.RequestException) or type(
+        error
+    ).__module__.startswith("httpx"):
+        return f"❌ Erreur de connexion: {str(error)}"
+    return f"❌ Erreur inattendue: {str(error)}"
+
+
+class DownloadManager:
+    """
+    Télécharge un fichier avec pause/reprise/annulation.
+
+    Callbacks optionnels:
+        on_progress(snapshot): ProgressSnapshot, appelé depuis un thread
+            d'échantillonnage (PROGRESS_INTERVAL), jamais depuis les threads
+            de transfert
+        on_status(message): message d'état lisible
+
+    rate_limit limite ce téléchargement (octets/s); shared_bucket est un
+    TokenBucket partagé avec d'autres téléchargements (limite globale).
+    cache: DownloadCache consulté avant chaque téléchargement et alimenté
+    après chaque téléchargement réussi.
+    skip_head: sonder par un GET ``Range: bytes=0-`` dont le corps sert
+    ensuite au transfert, au lieu d'un HEAD suivi d'un GET.
+    retry_policy: RetryPolicy des erreurs réseau passagères (None: aucune
+    nouvelle tentative); les transferts reprennent au dernier octet écrit.
+    extract: DECOMPRESS ou EXTRACT (download.extract) pour décompresser ou
+    dépaqueter le fichier pendant le transfert (chemin produit dans
+    extracted_path).
+    write_policy: WritePolicy (download.output) de l'étage d'écriture, qui
+    découple lectures réseau et écritures disque, et politique fsync (None
+    ou threads=0: écritures dans les threads de transfert).
+
+    pause(), resume() et cancel() réveillent immédiatement les threads de
+    transfert; hors pause, le coût par bloc se limite à deux is_set().
+    """
+
+    def __init__(
+        self,
+        session=None,
+        segments=DEFAULT_SEGMENTS,
+        on_progress=None,
+        on_status=None,
+        release_after=PAUSE_RELEASE_DELAY,
+        rate_limit=None,
+        shared_bucket=None,
+        cache=None,
+        skip_head=False,
+        retry_policy=DEFAULT_RETRY_POLICY,
+        extract=None,
+        write_policy=DEFAULT_WRITE_POLICY,
+    ):
+        self.download_thread = None
+        self.running = threading.Event()  # levé hors pause
+        self.running.set()
+        self.cancelled = threading.Event()
+        self.remove_partial = True  # Supprimer le fichier partiel en cas d'annulation
+        self.release_after = release_after
+        self.accepts_ranges = False
+        self.downloaded_size = 0
+        self.total_size = 0
+        self.file_path = None
+        self.response = None
+        self.journal = None
+        self.mirrors = []  # Miroirs retenus pour le téléchargement en cours
+        self.verifier = None  # StreamingVerifier si une somme de contrôle est attendue
+        self.cache = cache
+        self.cache_key = (
+            None  # (url, etag, last_modified) à mettre en cache en fin de transfert
+        )
+        self.stats = None  # TransferStats du dernier téléchargement
+        self.extract = extract
+        self.extractor = None  # StreamExtractor du téléchargement en cours
+        self.extracted_path = None  # Fichier décompressé ou dossier extrait
+        # Session pour maintenir les cookies et réutiliser les connexions
+        self.session = session or create_session(
+            pool_size=max(segments, DEFAULT_POOL_SIZE)
+        )
+        self.skip_head = skip_head
+        self.retry_policy = retry_policy
+        self.write_policy = write_policy
+        self.probe_response = None  # Réponse de la sonde GET, pas encore lue
+        self.claimed_path = None  # Chemin réservé dans NAME_RESERVATIONS
+        self.prefetched = None  # (url, réponse HEAD) obtenue d'avance par DownloadQueue
+        self.segments = segments  # Connexions parallèles par fichier
+        self.on_progress = on_progress
+        self.on_status = on_status
+        self.bucket = TokenBucket(rate_limit)
+        self.limiter = RateLimiter(shared_bucket, self.bucket)
+
+    def get_headers(self):
+        """Retourne les en-têtes HTTP pour simuler un navigateur"""
+        return dict(DEFAULT_HEADERS)
+
+    def report_status(self, message):
+        """Transmet un message d'état au callback"""
+        if self.on_status is not None:
+            self.on_status(message)
+
+    @property
+    def is_paused(self):
+        return not self.running.is_set()
+
+    @property
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+    def reset(self):
+        """Réinitialise l'état avant un nouveau téléchargement"""
+        self.running.set()
+        self.cancelled.clear()
+        self.remove_partial = True
+        self.accepts_ranges = False
+        self.downloaded_size = 0
+        self.total_size = 0
+        self.file_path = None
+        self.response = None
+        self.journal = None
+        self.mirrors = []
+        self.verifier = None
+        self.cache_key = None
+        self.probe_response = None
+        self.stats = None
+        self.extractor = None
+        self.extracted_path = None
+
+    def start(
+        self,
+        url,
+        folder,
+        filename=None,
+        on_complete=None,
+        on_error=None,
+        mirrors=(),
+        checksum=None,
+    ):
+        """
+        Démarre le téléchargement dans un thread séparé.
+
+        on_complete(completed) est appelé à la fin (False si annulé),
+        on_error(exception) en cas d'échec.
+        """
+        self.reset()
+
+        def run():
+            try:
+                completed = self.download(url, folder, filename, mirrors, checksum)
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+                return
+            if on_complete is not None:
+                on_complete(completed)
+
+        self.download_thread = threading.Thread(target=run)
+        self.download_thread.daemon = True
+        self.download_thread.start()
+        return self.download_thread
+
+    def pause(self):
+        """Met le téléchargement en pause"""
+        self.running.clear()
+
+    def resume(self):
+        """Reprend un téléchargement en pause"""
+        self.running.set()
+
+    def set_rate_limit(self, rate):
+        """Change la limite de débit de ce téléchargement (octets/s, None: illimité)"""
+        self.bucket.set_rate(rate)
+
+    def checkpoint(self, response=None):
+        """
+        Point de contrôle entre deux blocs: bloque pendant la pause.
+
+        Retourne False si le téléchargement est annulé. Si response est
+        fournie et que la pause dépasse release_after, la connexion est
+        fermée et ConnectionReleased est levée à la reprise: l'appelant doit
+        rouvrir avec une requête Range à partir du dernier octet écrit.
+        """
+        if self.running.is_set():
+            return not self.cancelled.is_set()
+
+        if response is None or self.release_after is None:
+            self.running.wait()
+        elif not self.running.wait(self.release_after):
+            response.close()
+            self.running.wait()
+            if not self.cancelled.is_set():
+                raise ConnectionReleased()
+        return not self.cancelled.is_set()
+
+    def cancel(self, remove_partial=True):
+        """
+        Annule le téléchargement. Le fichier partiel et son journal sont
+        supprimés (remove_partial) par le thread de téléchargement lui-même,
+        une fois toutes les écritures terminées et le fichier fermé.
+        """
+        self.remove_partial = remove_partial
+        self.cancelled.set()
+        # Réveiller les threads en pause pour qu'ils constatent l'annulation
+        self.running.set()
+
+    def discard_partial(self):
+        """Supprime le fichier partiel et le journal d'un téléchargement annulé"""
+        if not self.file_path:
+            return
+        if self.journal is not None:
+            self.journal.remove()
+        for path in (part_path_for(self.file_path), journal_path_for(self.file_path)):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def record_retry(self, url, error):
+        """Compte une nouvelle tentative (stats du transfert et compteurs par hôte)"""
+        if self.stats is not None:
+            self.stats.add_retry()
+        RETRY_METRICS.record(urlparse(url).netloc, retry_reason(error))
+
+    def retry_wait(self, error, attempt, url):
+        """
+        Après une erreur sur url: si retry_policy le permet, attend le délai
+        de backoff et retourne True (nouvelle tentative), sinon False.
+        attempt: nombre de tentatives déjà refaites sans progrès.
+        """
+        policy = self.retry_policy
+        if (
+            self.is_cancelled
+            or policy is None
+            or not policy.should_retry(error, attempt)
+        ):
+            return False
+        delay = policy.delay(attempt, error)
+        self.record_retry(url, error)
+        self.report_status(
+            f"🔁 Erreur réseau ({retry_reason(error)}) - nouvelle tentative dans "
+            f"{delay:.1f} s ({attempt + 1}/{policy.max_retries})"
+        )
+        self.cancelled.wait(delay)
+        return not self.is_cancelled
+
+    def with_retries(self, url, function, *args):
+        """Appelle function(*args) et refait les tentatives échouées (retry_policy)"""
+        attempt = 0
+        while True:
+            try:
+                return function(*args)
+            except Exception as e:
+                if not self.retry_wait(e, attempt, url):
+                    raise
+                attempt += 1
+
+    def download(self, url, folder, filename=None, mirrors=(), checksum=None):
+        """
+        Télécharge url dans folder (appel bloquant).
+
+        mirrors: autres URL du même fichier, utilisées en parallèle si elles
+        s'accordent avec url (taille, ETag) et acceptent les plages.
+        checksum: somme attendue ('sha256:<hex>', Checksum) ou URL d'un
+        fichier de sommes / Metalink; vérifiée au fil du transfert, les
+        morceaux corrompus (Metalink) sont retéléchargés.
+        Retourne True si le fichier est complet, False si annulé.
+        Les erreurs réseau sont propagées (requests.exceptions.*).
+        Les mesures du transfert sont disponibles ensuite dans self.stats.
+        """
+        self.stats = TransferStats(urlparse(url).netloc)
+        ticker = None
+        if self.on_progress is not None:
+            aggregator = ProgressAggregator()
+            aggregator.track(self, self)
+            ticker = ProgressTicker(
+                aggregator, lambda key, snapshot: self.on_progress(snapshot)
+            ).start()
+        METRICS.transfer_started()
+        outcome, error = "failed", None
+        try:
+            completed = self._download(url, folder, filename, mirrors, checksum)
+            outcome = "completed" if completed else "cancelled"
+            if completed and self.cache_key is not None:
+                self.store_in_cache(*self.cache_key)
+            return completed
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.close_probe()
+            self.release_path()
+            if self.extractor is not None:
+                # Échec ou annulation: sorties temporaires supprimées
+                self.extractor.abort()
+                self.extractor = None
+            if self.is_cancelled and self.remove_partial:
+                self.discard_partial()
+            self.stats.finish()
+            METRICS.transfer_finished(url, self.stats.host, self.stats, outcome, error)
+            if ticker is not None:
+                ticker.stop()
+
+    def _download(self, url, folder, filename, mirrors=(), checksum=None):
+        headers = self.get_headers()
+        requested_url = url
+        cached = self.cache.lookup(url) if self.cache is not None else None
+
+        # Obtenir les informations du fichier (HEAD conditionnel si en cache)
+        if mirrors:
+            url, head_response = self.probe_mirrors(url, mirrors, headers)
+        else:
+            head_response = self.take_prefetched(url) if cached is None else None
+            if head_response is None:
+                self.report_status("🔍 Vérification du fichier...")
+                head_headers = (
+                    dict(headers, **cached.conditional_headers())
+                    if cached is not None
+                    else headers
+                )
+                head_response = self.with_retries(url, self.probe, url, head_headers)
+
+        urls = {requested_url, url, *mirrors}
+        if cached is not None and cached.is_fresh(head_response):
+            if self.serve_from_cache(cached, folder, filename, checksum, urls):
+                return True
+            if head_response.status_code == 304:
+                # Objet évincé entre-temps: il faut les en-têtes complets
+                head_response = self.with_retries(url, self.probe, url, headers)
+        # Nom, taille, type et plages: tout vient de la première réponse
+        # (HEAD ou sonde GET)
+        metadata = FileMetadata.from_response(head_response)
+        if metadata.content_encoding != "identity":
+            self.report_status(
+                "ℹ️ Contenu encodé par le serveur "
+                f"({metadata.content_encoding}): enregistré tel quel"
+            )
+        if self.cache is not None:
+            self.cache_key = (requested_url, metadata.etag, metadata.last_modified)
+
+        self.total_size = metadata.size
+        self.accepts_ranges = metadata.accepts_ranges
+
+        if self.total_size == 0:
+            self.report_status("⚠️ Taille inconnue - téléchargement sans progression")
+            return self.download_without_progress(url, folder, filename, checksum)
+
+        # Un nom déjà pris par un autre fichier devient 'nom (1).ext'
+        fixed = bool(filename)
+        filename = filename or metadata.suggested_filename(url)
+        self.claim_path(folder, filename, urls, self.total_size, fixed)
+
+        if (
+            os.path.exists(self.file_path)
+            and os.path.getsize(self.file_path) == self.total_size
+        ):
+            self.report_status("✅ Fichier déjà téléchargé")
+            self.cache_key = None
+            self.downloaded_size = os.path.getsize(self.file_path)
+            self.extract_file()
+            return True
+
+        # Reprise d'après le journal, si la ressource distante n'a pas changé
+        etag = metadata.etag
+        last_modified = metadata.last_modified
+        journal = ResumeJournal.load(self.file_path)
+        if (
+            journal is not None
+            and journal.matches(url, self.total_size, etag, last_modified)
+            and os.path.exists(part_path_for(self.file_path))
+        ):
+            resume_pos = journal.completed_bytes()
+            self.report_status(
+                f"📥 Reprise du téléchargement à {resume_pos / (1024*1024):.2f} MB"
+            )
+        else:
+            if journal is not None:
+                self.report_status(
+                    "⚠️ Le fichier distant a changé - nouveau téléchargement"
+                )
+            journal = ResumeJournal.for_file(
+                self.file_path, url, self.total_size, etag, last_modified
+            )
+        self.journal = journal
+        # Un disque plein se signale avant le premier octet
+        check_free_space(self.file_path, self.total_size)
+
+        if checksum is not None:
+            self.verifier = StreamingVerifier(
+                load_checksum(checksum, filename, self.session, headers),
+                part_path_for(self.file_path),
+                self.total_size,
+                journal.contiguous_end,
+            )
+        if self.extract is not None:
+            self.extractor = StreamExtractor(
+                part_path_for(self.file_path),
+                self.file_path,
+                self.extract,
+                journal.contiguous_end,
+                self.stats,
+            ).start()
+
+        for attempt in range(VERIFY_ATTEMPTS):
+            try:
+                return self._transfer(url)
+            except (CorruptRangesError, MissingRangesError) as e:
+                # Plages retirées du journal ou jamais écrites: refaites seules
+                if attempt == VERIFY_ATTEMPTS - 1:
+                    raise
+                self.report_status(f"⚠️ {e} - nouveau téléchargement de ces plages")
+
+    def probe(self, url, headers):
+        """
+        Informations sur url (taille, plages, validateurs): HEAD, ou GET
+        ``Range: bytes=0-`` si skip_head, dont la réponse est gardée ouverte
+        pour servir de flux (take_probe_response). Une réponse 304 est
+        retournée telle quelle.
+        """
+        if self.skip_head:
+            self.close_probe()
+            response = probe_get(self.session, url, headers)
+            if response.status_code == 416:
+                # Ressource vide: une plage 0- est insatisfaisable
+                response.close()
+            else:
+                if response.status_code != 304:
+                    response.raise_for_status()
+                self.probe_response = response
+                return response
+        return self.head(url, headers)
+
+    def head(self, url, headers):
+        """Requête HEAD (redirections suivies); une réponse 304 est retournée telle"""
+        response = self.session.head(
+            url, headers=headers, allow_redirects=True, timeout=10
+        )
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    def take_prefetched(self, url):
+        """Réponse HEAD de url obtenue d'avance (DownloadQueue), ou None"""
+        prefetched, self.prefetched = self.prefetched, None
+        if prefetched is None or prefetched[0] != url:
+            return None
+        return prefetched[1]
+
+    def take_probe_response(self):
+        """Réponse de la sonde GET, lisible depuis le début du fichier, ou None"""
+        response = self.probe_response
+        self.probe_response = None
+        if response is not None and response.status_code not in (200, 206):
+            response.close()
+            return None
+        return response
+
+    def close_probe(self):
+        """Ferme la sonde GET si aucun transfert ne l'a reprise"""
+        response = self.take_probe_response()
+        if response is not None:
+            response.close()
+
+    def claim_path(self, folder, filename, urls, size=0, fixed=False):
+        """Réserve le chemin local du fichier (voir NameReservations) et le retourne"""
+        self.release_path()
+        self.file_path = self.claimed_path = NAME_RESERVATIONS.claim(
+            folder, filename, urls, size, fixed
+        )
+        return self.file_path
+
+    def release_path(self):
+        if self.claimed_path is not None:
+            NAME_RESERVATIONS.release(self.claimed_path)
+            self.claimed_path = None
+
+    def serve_from_cache(self, entry, folder, filename, checksum=None, urls=()):
+        """Copie le fichier en cache dans folder; False s'il n'est pas utilisable"""
+        fixed = bool(filename)
+        filename = filename or entry.filename
+        if checksum is not None:
+            # Le cache est adressé par SHA-256: comparaison directe
+            expected = load_checksum(
+                checksum, filename, self.session, self.get_headers()
+            )
+            if (
+                expected.algorithm == "sha256"
+                and expected.digest
+                and expected.digest != entry.digest
+            ):
+                return False
+
+        self.claim_path(folder, filename, urls, entry.size, fixed)
+        method = self.cache.materialize(entry, self.file_path)
+        if method is None:
+            return False
+        # Un éventuel téléchargement partiel du même fichier n'a plus lieu d'être
+        for path in (part_path_for(self.file_path), journal_path_for(self.file_path)):
+            if os.path.exists(path):
+                os.remove(path)
+        self.total_size = self.downloaded_size = entry.size
+        self.report_status(f"♻️ Fichier servi depuis le cache ({CLONE_LABELS[method]})")
+        self.extract_file()
+        return True
+
+    def store_in_cache(self, url, etag, last_modified):
+        """Ajoute le fichier téléchargé au cache; un échec est sans conséquence"""
+        digest = None
+        if self.verifier is not None and self.verifier.checksum.algorithm == "sha256":
+            # Déjà vérifiée: inutile de relire le fichier
+            digest = self.verifier.checksum.digest
+        try:
+            self.cache.store(url, self.file_path, etag, last_modified, digest)
+        except OSError as e:
+            self.report_status(f"⚠️ Mise en cache impossible: {e}")
+
+    def _transfer(self, url):
+        """Télécharge les plages manquantes du journal par la voie la plus adaptée"""
+        journal = self.journal
+        if journal.is_complete():
+            return self.finish_part()
+
+        # Téléchargement segmenté si le serveur accepte les plages
+        missing = journal.missing_ranges()
+        missing_size = sum(end - start + 1 for start, end in missing)
+        self.downloaded_size = journal.completed_bytes()
+        if len(self.mirrors) > 1:
+            try:
+                return self.download_multi_source()
+            except RangeNotSupportedError:
+                self.report_status(
+                    "⚠️ Miroirs inutilisables - "
+                    "téléchargement depuis la source principale"
+                )
+        # (un trou ailleurs qu'en fin de fichier, après un morceau corrompu,
+        # ne peut être comblé que par des requêtes Range; un seul segment
+        # demandé: flux unique repris en fin de fichier)
+        if self.accepts_ranges and (
+            len(missing) > 1
+            or missing[-1][1] != self.total_size - 1
+            or (self.segments > 1 and missing_size >= 2 * MIN_SEGMENT_SIZE)
+        ):
+            try:
+                return self.download_segmented(url)
+            except RangeNotSupportedError:
+                self.accepts_ranges = False
+                journal.reset()
+                if self.verifier is not None:
+                    self.verifier.reset()
+                self.downloaded_size = 0
+                self.report_status(
+                    "⚠️ Plages non supportées - téléchargement en un seul flux"
+                )
+
+        # Téléchargement avec reprise
+        return self.download_with_resume(url)
+
+    def written(self, offset, data):
+        """on_flush des CoalescingWriter: consigne les octets écrits et les vérifie"""
+        self.journal.add(offset, len(data))
+        self.journal.save()
+        if self.verifier is not None:
+            self.verifier.update(offset, data)
+        if self.extractor is not None:
+            self.extractor.notify()
+
+    def verify_part(self):
+        """
+        Vérifie le fichier partiel complet. Les morceaux corrompus sont
+        retirés du journal (CorruptRangesError); si seule la somme globale
+        est fausse, le fichier partiel est supprimé (IntegrityError).
+        """
+        verifier = self.verifier
+        if verifier is None:
+            return
+        self.report_status("🔐 Vérification de la somme de contrôle...")
+        try:
+            bad_ranges = verifier.verify()
+        except IntegrityError:
+            self.journal.remove()
+            os.remove(part_path_for(self.file_path))
+            raise
+        if bad_ranges:
+            for start, end in bad_ranges:
+                self.journal.discard(start, end)
+            self.journal.save(force=True)
+            verifier.reset_ranges(bad_ranges)
+            raise CorruptRangesError(bad_ranges)
+        algorithm = verifier.checksum.algorithm or verifier.checksum.piece_algorithm
+        self.report_status(f"✅ Somme de contrôle vérifiée ({algorithm})")
+
+    def finish_part(self):
+        """Vérifie le fichier partiel complet, le renomme et supprime son journal"""
+        check_part_complete(self.journal)
+        self.verify_part()
+        try:
+            if self.extractor is not None:
+                # Fin de la décompression, fichier partiel fermé avant le renommage
+                self.extractor.finish(self.total_size)
+        finally:
+            # Un échec d'extraction n'invalide pas le fichier téléchargé
+            os.replace(part_path_for(self.file_path), self.file_path)
+            if self.journal is not None:
+                self.journal.remove()
+            self.downloaded_size = self.total_size
+        self.commit_extraction()
+        return True
+
+    def extract_file(self):
+        """Décompresse ou extrait le fichier déjà complet self.file_path, si demandé"""
+        if self.extract is None:
+            return
+        size = os.path.getsize(self.file_path)
+        self.extractor = StreamExtractor(
+            self.file_path, self.file_path, self.extract, lambda: size, self.stats
+        ).start()
+        self.extractor.finish(size)
+        self.commit_extraction()
+
+    def commit_extraction(self):
+        """Donne leur nom final aux sorties de l'extraction"""
+        extractor = self.extractor
+        if extractor is None:
+            return
+        self.extractor = None
+        self.extracted_path = extractor.commit()
+        if self.extracted_path is None:
+            self.report_status("ℹ️ Ni compressé ni archive tar: rien à extraire")
+        elif os.path.isdir(self.extracted_path):
+            self.report_status(
+                f"📦 Archive extraite dans {os.path.basename(self.extracted_path)}"
+            )
+        else:
+            self.report_status(
+                f"📦 Fichier décompressé ({extractor.kind}): "
+                f"{os.path.basename(self.extracted_path)}"
+            )
+
+    def download_segmented(self, url):
+        """Téléchargement en plusieurs segments parallèles (requêtes Range)"""
+        self.close_probe()
+        downloader = SegmentedDownloader(
+            self,
+            url,
+            self.get_headers(),
+            self.total_size,
+            segments=self.segments,
+        )
+        return downloader.run(self.file_path, journal=self.journal)
+
+    def probe_mirrors(self, url, mirrors, headers):
+        """
+        Sonde url et ses miroirs en parallèle, retient ceux qui s'accordent
+        et acceptent les plages (self.mirrors), et retourne l'URL et la
+        réponse HEAD de référence (url, ou le premier miroir joignable).
+        """
+        self.report_status(f"🔍 Vérification de {len(mirrors) + 1} sources...")
+        probed = probe_mirrors(self.session, [url, *mirrors], headers)
+        selected = select_mirrors(probed)
+        if not selected:
+            raise probed[0].error
+        if selected[0].url != url:
+            self.report_status(
+                f"⚠️ Source principale injoignable - utilisation de {selected[0].url}"
+            )
+        rejected = len(probed) - len(selected)
+        self.mirrors = [mirror for mirror in selected if mirror.accepts_ranges]
+        if len(self.mirrors) > 1:
+            message = f"🌐 {len(self.mirrors)} sources utilisables"
+            if rejected:
+                message += f" ({rejected} écartée(s): injoignable ou fichier différent)"
+            self.report_status(message)
+        return selected[0].url, selected[0].response
+
+    def download_multi_source(self):
+        """Téléchargement réparti entre plusieurs miroirs"""
+        self.close_probe()
+        downloader = MultiSourceDownloader(
+            self,
+            self.mirrors,
+            self.get_headers(),
+            self.total_size,
+            segments=self.segments,
+        )
+        return downloader.run(self.file_path, journal=self.journal)
+
+    def download_with_resume(self, url):
+        """
+        Téléchargement en un seul flux, repris après la dernière plage écrite
+        (longue pause, ou connexion perdue selon retry_policy)
+        """
+        failures = 0
+        while True:
+            written = self.journal.completed_bytes()
+            try:
+                return self._stream_single(url)
+            except ConnectionReleased:
+                # Longue pause terminée: rouvrir à partir du dernier octet écrit
+                self.report_status("▶️ Reprise du téléchargement...")
+            except Exception as e:
+                self.journal.save(force=True)
+                if self.journal.completed_bytes() > written:
+                    failures = 0  # Le compteur ne porte que sur les échecs sans progrès
+                if not self.retry_wait(e, failures, url):
+                    raise
+                failures += 1
+
+    def _stream_single(self, url):
+        journal = self.journal
+        missing = journal.missing_ranges()
+        # Un seul flux ne peut reprendre que si seule la fin du fichier manque
+        resume_pos = (
+            missing[0][0]
+            if len(missing) == 1 and missing[0][1] == self.total_size - 1
+            else 0
+        )
+
+        headers = self.get_headers()
+        if resume_pos > 0:
+            self.close_probe()
+            headers["Range"] = f"bytes={resume_pos}-"
+            if journal.if_range():
+                headers["If-Range"] = journal.if_range()
+
+        # Depuis le début, la sonde GET déjà ouverte fait office de requête
+        response = self.take_probe_response() if resume_pos == 0 else None
+        if response is None:
+            response = self.session.get(url, headers=headers, stream=True, timeout=30)
+            response.raise_for_status()
+
+        if resume_pos > 0:
+            content_range = response.headers.get("content-range", "")
+            if response.status_code != 206 or not content_range.startswith(
+                f"bytes {resume_pos}-"
+            ):
+                # If-Range refusé (fichier modifié) ou plages ignorées: tout reprendre
+                self.report_status(
+                    "⚠️ Reprise impossible - téléchargement depuis le début"
+                )
+                self.accepts_ranges = False
+                resume_pos = 0
+        if resume_pos == 0 and journal.completed_bytes():
+            journal.reset()
+            if self.verifier is not None:
+                self.verifier.reset()
+
+        # La connexion ne peut être libérée en pause que si l'on sait reprendre
+        releasable = response if self.accepts_ranges else None
+
+        self.response = response
+
+        downloaded = resume_pos
+        self.downloaded_size = downloaded
+
+        # Écritures positionnelles (pwrite), hors de ce thread selon
+        # write_policy: le journal ne consigne que des octets déjà transmis
+        # au système
+        with PartFile(
+            self.file_path,
+            self.total_size,
+            resume=resume_pos > 0,
+            write_policy=self.write_policy,
+            stats=self.stats,
+        ) as part, CpuTimer(self.stats) as timer:
+            writer = CoalescingWriter(
+                part.at(resume_pos),
+                resume_pos,
+                on_flush=self.written,
+                stats=self.stats,
+                disk_writer=part.disk_writer,
+            )
+            try:
+                for chunk in iter_adaptive(
+                    response, limiter=self.limiter, stats=self.stats
+                ):
+                    writer.write(chunk)
+                    downloaded += len(chunk)
+                    timer.nbytes += len(chunk)
+                    self.downloaded_size = downloaded
+
+                    # Gestion de la pause et de l'annulation
+                    if not self.checkpoint(releasable):
+                        break
+            finally:
+                writer.flush()
+
+        if self.is_cancelled:
+            journal.save(force=True)
+            return False
+
+        if downloaded < self.total_size:
+            journal.save(force=True)
+            raise IncompleteTransferError(
+                f"Téléchargement incomplet ({downloaded} / {self.total_size} octets)"
+            )
+
+        return self.finish_part()
+
+    def download_without_progress(self, url, folder, filename=None, checksum=None):
+        """Téléchargement sans barre de progression (taille inconnue)"""
+        headers = self.get_headers()
+        response = self.take_probe_response()
+        if response is None:
+            response = self.session.get(url, headers=headers, stream=True, timeout=30)
+            response.raise_for_status()
+
+        # Sans taille, un fichier existant ne peut pas être reconnu: jamais écrasé
+        fixed = bool(filename)
+        filename = filename or FileMetadata.from_response(response).suggested_filename(
+            url
+        )
+        self.claim_path(folder, filename, {url}, 0, fixed)
+        part_path = part_path_for(self.file_path)
+
+        # Flux unique et séquentiel: la somme se calcule entièrement en mémoire
+        verify = None
+        if checksum is not None:
+            checksum = load_checksum(checksum, filename, self.session, headers)
+            if not checksum.digest:
+                raise ValueError(
+                    "Sommes par morceau inutilisables sans la taille du fichier"
+                )
+            verifier = StreamingVerifier(
+                Checksum(checksum.algorithm, checksum.digest), part_path, 0
+            )
+            verify = verifier.update
+
+        with PartFile(
+            self.file_path, write_policy=self.write_policy, stats=self.stats
+        ) as part, CpuTimer(self.stats) as timer:
+            writer = CoalescingWriter(
+                part.at(0),
+                on_flush=verify,
+                stats=self.stats,
+                disk_writer=part.disk_writer,
+            )
+            try:
+                for chunk in iter_adaptive(
+                    response, limiter=self.limiter, stats=self.stats
+                ):
+                    writer.write(chunk)
+                    timer.nbytes += len(chunk)
+                    self.downloaded_size += len(chunk)
+
+                    if not self.checkpoint():
+                        break
+            finally:
+                writer.flush()
+
+        if self.is_cancelled:
+            return False
+
+        if verify is not None:
+            verifier.total_size = self.downloaded_size
+            try:
+                verifier.verify()
+            except IntegrityError:
+                os.remove(part_path)
+                raise
+            self.report_status(
+                f"✅ Somme de contrôle vérifiée ({verifier.checksum.algorithm})"
+            )
+
+        os.replace(part_path, self.file_path)
+        # Taille inconnue: pas de début contigu à suivre, extraction une fois le
+        # fichier complet
+        self.extract_file()
+        return True
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Métadonnées d'un fichier distant et choix de son nom local
+
+FileMetadata réunit nom, taille, type et support des plages à partir de la
+première réponse disponible: HEAD, sonde GET ``Range: bytes=0-`` ou GET
+complet (requests ou httpx). Le nom vient de Content-Disposition
+(``filename*`` RFC 5987 en priorité, puis ``filename``), sinon de l'URL;
+il est réduit à un nom de fichier sûr (ni dossier, ni caractère interdit).
+
+NameReservations choisit le chemin local sans écraser un fichier qui
+appartient à un autre téléchargement: ``nom (1).ext``, ``nom (2).ext``...
+Un fichier partiel dont le journal porte sur la même URL est repris, un
+fichier complet de la même taille est considéré comme déjà téléchargé.
+"""
+
+import mimetypes
+import os
+import re
+import threading
+from urllib.parse import unquote, urlparse
+
+from .journal import ResumeJournal
+from .transport import response_accepts_ranges, response_total_size
+
+# Nom utilisé quand ni l'en-tête ni l'URL n'en fournissent un
+DEFAULT_FILENAME = "fichier_telecharge"
+
+# Limite de la plupart des systèmes de fichiers, en octets
+MAX_FILENAME_BYTES = 255
+
+# Autres noms essayés avant d'abandonner
+MAX_COLLISION_SUFFIX = 1000
+
+# Caractères interdits sous Windows, séparateurs et caractères de contrôle
+UNSAFE_CHARACTERS = re.compile(r'[\x00-\x1f\x7f<>:"/\\|?*]')
+
+# Noms de périphériques réservés sous Windows
+RESERVED_NAMES = frozenset(
+    ["CON", "PRN", "AUX", "NUL"]
+    + [f"COM{index}" for index in range(1, 10)]
+    + [f"LPT{index}" for index in range(1, 10)]
+)
+
+# Paramètre d'en-tête: nom=jeton ou nom="chaîne \"échappée\""
+PARAMETER = re.compile(r';\s*([^\s=;]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)')
+
+
+def parse_content_disposition(value):
+    """
+    Nom de fichier d'un en-tête Content-Disposition, ou None.
+    ``filename*=UTF-8''caf%C3%A9.txt`` (RFC 5987) l'emporte sur ``filename``.
+    """
+    if not value:
+        return None
+    parameters = {}
+    for name, raw in PARAMETER.findall(value):
+        raw = raw.strip()
+        if raw.startswith('"'):
+            raw = re.sub(r"\\(.)", r"\1", raw[1:-1])
+        parameters.setdefault(name.lower(), raw)
+
+    extended = parameters.get("filename*")
+    if extended is not None:
+        charset, quote, encoded = extended.partition("'")
+        language, quote2, encoded = encoded.partition("'")
+        if quote and quote2:
+            try:
+                return unquote(encoded, encoding=charset or "utf-8", errors="strict")
+            except (LookupError, UnicodeDecodeError):
+                pass
+    name = parameters.get("filename")
+    if name is None:
+        return None
+    try:
+        # UTF-8 brut, décodé en Latin-1 par le client HTTP
+        return name.encode("latin-1").decode("utf-8")
+    except UnicodeError:
+        return name
+
+
+def split_extension(filename):
+    """('archive', '.tar.gz'), ('notes', '.txt'): .tar reste avec sa compression"""
+    stem, extension = os.path.splitext(filename)
+    if stem.lower().endswith(".tar"):
+        stem, extension = stem[:-4], stem[-4:] + extension
+    return stem, extension
+
+
+def sanitize_filename(name):
+    """Nom sûr tiré de name (dernier composant, sans caractère interdit), ou None"""
+    if not name:
+        return None
+    name = name.replace("\\", "/").rsplit("/", 1)[-1]
+    name = UNSAFE_CHARACTERS.sub("_", name).strip().rstrip(". ")
+    if not name or name in (".", ".."):
+        return None
+    stem, extension = split_extension(name)
+    if stem.upper() in RESERVED_NAMES:
+        stem = f"_{stem}"
+    # Tronqué en octets, extension conservée
+    while (
+        len((stem + extension).encode("utf-8")) > MAX_FILENAME_BYTES and len(stem) > 1
+    ):
+        stem = stem[:-1]
+    return (
+        (stem + extension)
+        .encode("utf-8")[:MAX_FILENAME_BYTES]
+        .decode("utf-8", "ignore")
+    )
+
+
+def filename_from_url(url):
+    """Dernier segment (décodé) du chemin de url, ou None"""
+    return sanitize_filename(unquote(os.path.basename(urlparse(url).path)))
+
+
+class FileMetadata:
+    """Nom, taille, type et validateurs d'un fichier distant"""
+
+    def __init__(
+        self,
+        filename=None,
+        size=0,
+        content_type=None,
+        accepts_ranges=False,
+        etag=None,
+        last_modified=None,
+        content_encoding="identity",
+    ):
+        self.filename = (
+            filename  # Nom proposé par le serveur (Content-Disposition), ou None
+        )
+        self.size = size  # 0 si inconnue
+        self.content_type = content_type
+        self.accepts_ranges = accepts_ranges
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_encoding = content_encoding
+
+    @classmethod
+    def from_response(cls, response):
+        """Métadonnées d'une réponse HEAD, 206 (sonde Range) ou 200"""
+        headers = response.headers
+        content_type = headers.get("content-type")
+        return cls(
+            filename=sanitize_filename(
+                parse_content_disposition(headers.get("content-disposition"))
+            ),
+            size=response_total_size(response),
+            content_type=(
+                content_type.split(";")[0].strip().lower() if content_type else None
+            ),
+            accepts_ranges=response_accepts_ranges(response),
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+            content_encoding=headers.get("content-encoding", "identity").lower(),
+        )
+
+    def suggested_filename(self, url):
+        """
+        Nom local: celui du serveur, sinon celui de l'URL, complété d'une
+        extension d'après le type
+        """
+        if self.filename:
+            return self.filename
+        name = filename_from_url(url)
+        if name and "." in name:
+            return name
+        extension = None
+        if self.content_type and self.content_type != "application/octet-stream":
+            extension = mimetypes.guess_extension(self.content_type)
+        return (name or DEFAULT_FILENAME) + (extension or "")
+
+    def __repr__(self):
+        return f"<FileMetadata {self.filename!r} {self.size} {self.content_type}>"
+
+
+def candidate_names(filename):
+    """filename, puis 'nom (1).ext', 'nom (2).ext'..."""
+    yield filename
+    stem, extension = split_extension(filename)
+    for index in range(1, MAX_COLLISION_SUFFIX + 1):
+        yield f"{stem} ({index}){extension}"
+
+
+class NameReservations:
+    """
+    Chemins locaux des téléchargements en cours du processus: deux jobs
+    simultanés qui proposent le même nom n'écrivent pas dans le même fichier.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.paths = set()
+
+    def claim(self, folder, filename, urls, size=0, fixed=False):
+        """
+        Réserve et retourne le chemin où enregistrer le fichier de urls
+        (URL principale et miroirs) de taille size (0: inconnue). fixed: nom
+        imposé par l'appelant, utilisé tel quel.
+        """
+        with self.lock:
+            if fixed:
+                path = os.path.join(folder, filename)
+                self.paths.add(path)
+                return path
+            for candidate in candidate_names(filename):
+                path = os.path.join(folder, candidate)
+                if path not in self.paths and self._available(path, urls, size):
+                    self.paths.add(path)
+                    return path
+        raise FileExistsError(f"Aucun nom libre pour {filename} dans {folder}")
+
+    @staticmethod
+    def _available(path, urls, size):
+        """path est-il libre, ou déjà celui de ce téléchargement ?"""
+        journal = ResumeJournal.load(path)
+        if journal is not None:
+            # Fichier partiel d'un autre téléchargement: ne pas le reprendre ni
+            # l'écraser
+            return journal.url in urls
+        if os.path.exists(path):
+            return size > 0 and os.path.getsize(path) == size
+        return True
+
+    def release(self, path):
+        with self.lock:
+            self.paths.discard(path)
+
+
+NAME_RESERVATIONS = NameReservations()
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Métriques des transferts, exportables pour Prometheus ou en JSON lines
+
+METRICS est le registre du processus: compteurs et histogrammes par hôte,
+alimentés par le moteur (octets écrits, attente réseau et disque,
+blocages, nouvelles tentatives, latence de connexion et TTFB, débit de
+chaque téléchargement terminé). Le coût reste hors de la boucle par bloc:
+les mesures sont regroupées par écriture (1 Mo) ou par seconde de lecture.
+
+Export:
+- render_prometheus(): format texte Prometheus, servi par MetricsServer
+  (``GET /metrics``);
+- MetricsLog: un objet JSON par ligne pour chaque téléchargement terminé
+  et chaque nouvelle tentative (METRICS.open_log()).
+"""
+
+import bisect
+import collections
+import datetime
+import http.server
+import json
+import threading
+
+# Une lecture plus longue est comptée comme un blocage du transfert
+STALL_THRESHOLD = 2.0
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+THROUGHPUT_BUCKETS = tuple(
+    size * 1024**2 for size in (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+)
+
+# Nom: (type, aide, seuils des histogrammes)
+DEFINITIONS = {
+    "pytdm_downloads_total": ("counter", "Téléchargements terminés, par issue", None),
+    "pytdm_active_downloads": ("gauge", "Téléchargements en cours", None),
+    "pytdm_bytes_total": ("counter", "Octets écrits sur disque", None),
+    "pytdm_network_wait_seconds_total": (
+        "counter",
+        "Temps passé à attendre le réseau",
+        None,
+    ),
+    "pytdm_disk_write_seconds_total": (
+        "counter",
+        "Temps passé à écrire sur disque",
+        None,
+    ),
+    "pytdm_cpu_seconds_total": ("counter", "Temps CPU des threads de transfert", None),
+    "pytdm_stalls_total": (
+        "counter",
+        f"Lectures bloquées plus de {STALL_THRESHOLD:g} s",
+        None,
+    ),
+    "pytdm_stall_seconds_total": (
+        "counter",
+        "Durée cumulée des lectures bloquées",
+        None,
+    ),
+    "pytdm_retries_total": (
+        "counter",
+        "Nouvelles tentatives après une erreur réseau",
+        None,
+    ),
+    "pytdm_responses_total": ("counter", "Réponses HTTP reçues, par code", None),
+    "pytdm_connect_seconds": (
+        "histogram",
+        "Durée d'établissement des connexions (TCP + TLS)",
+        LATENCY_BUCKETS,
+    ),
+    "pytdm_ttfb_seconds": (
+        "histogram",
+        "Délai entre l'envoi d'une requête et ses en-têtes de réponse",
+        LATENCY_BUCKETS,
+    ),
+    "pytdm_download_seconds": (
+        "histogram",
+        "Durée des téléchargements terminés",
+        DURATION_BUCKETS,
+    ),
+    "pytdm_download_throughput_bytes_per_second": (
+        "histogram",
+        "Débit moyen des téléchargements terminés",
+        THROUGHPUT_BUCKETS,
+    ),
+}
+
+
+def format_value(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for _, value in labels
+    )
+    return (
+        "{"
+        + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped))
+        + "}"
+    )
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Compteurs, jauges et histogrammes étiquetés; sûr entre threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = collections.defaultdict(dict)  # nom -> {étiquettes: valeur}
+        self.log = None
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[name][self._key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.values[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(DEFINITIONS[name][2])
+            histogram.observe(value)
+
+    def get(self, name, **labels):
+        """Valeur d'un compteur (0 s'il n'existe pas)"""
+        with self.lock:
+            return self.values[name].get(self._key(labels), 0)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    # Événements du moteur
+
+    def transfer_started(self):
+        self.inc("pytdm_active_downloads")
+
+    def transfer_finished(self, url, host, stats, outcome, error=None):
+        """Fin d'un téléchargement (outcome: completed, cancelled ou failed)"""
+        self.inc("pytdm_active_downloads", -1)
+        self.inc("pytdm_downloads_total", outcome=outcome)
+        self.inc("pytdm_cpu_seconds_total", stats.cpu_seconds, host=host)
+        if outcome == "completed" and stats.wall_seconds > 0:
+            self.observe("pytdm_download_seconds", stats.wall_seconds)
+            self.observe(
+                "pytdm_download_throughput_bytes_per_second",
+                stats.bytes / stats.wall_seconds,
+            )
+        self.write_event(
+            "transfer",
+            url=url,
+            host=host,
+            outcome=outcome,
+            error=str(error) if error is not None else None,
+            **stats.to_dict(),
+        )
+
+    def network_wait(self, host, seconds, stalls=0, stall_seconds=0.0):
+        self.inc("pytdm_network_wait_seconds_total", seconds, host=host)
+        if stalls:
+            self.inc("pytdm_stalls_total", stalls, host=host)
+            self.inc("pytdm_stall_seconds_total", stall_seconds, host=host)
+
+    def disk_write(self, host, nbytes, seconds):
+        self.inc("pytdm_bytes_total", nbytes, host=host)
+        self.inc("pytdm_disk_write_seconds_total", seconds, host=host)
+
+    def retry(self, host, reason):
+        self.inc("pytdm_retries_total", host=host, reason=reason)
+        self.write_event("retry", host=host, reason=reason)
+
+    def response(self, host, status, ttfb=None):
+        self.inc("pytdm_responses_total", host=host, status=str(status))
+        if ttfb is not None:
+            self.observe("pytdm_ttfb_seconds", ttfb, host=host)
+
+    def connected(self, host, seconds):
+        self.observe("pytdm_connect_seconds", seconds, host=host)
+
+    # Export
+
+    def open_log(self, path):
+        """Journalise les événements en JSON lines dans path (ajout)"""
+        self.close_log()
+        self.log = MetricsLog(path)
+        return self.log
+
+    def close_log(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def write_event(self, event, **fields):
+        log = self.log
+        if log is not None:
+            log.write(event, **fields)
+
+    def render_prometheus(self):
+        """Toutes les séries au format texte d'exposition Prometheus"""
+        lines = []
+        with self.lock:
+            for name in sorted(self.values):
+                kind, help_text, _ = DEFINITIONS.get(name, ("untyped", "", None))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(self.values[name].items()):
+                    if kind != "histogram":
+                        lines.append(
+                            f"{name}{format_labels(labels)} {format_value(value)}"
+                        )
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets, value.counts):
+                        cumulative += count
+                        bucket = format_labels(labels + (("le", f"{bound:g}"),))
+                        lines.append(f"{name}_bucket{bucket} {cumulative}")
+                    bucket = format_labels(labels + (("le", "+Inf"),))
+                    lines.append(f"{name}_bucket{bucket} {value.count}")
+                    lines.append(
+                        f"{name}_sum{format_labels(labels)} {format_value(value.sum)}"
+                    )
+                    lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsLog:
+    """Fichier JSON lines: un objet par événement, écrit et vidé immédiatement"""
+
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def write(self, event, **fields):
+        record = {
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "event": event,
+        }
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            if self.file.closed:
+                # Transfert terminé après la fermeture du journal
+                return
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class ReadTimer:
+    """
+    Attente réseau d'un flux, transmise à METRICS (et à TransferStats) au
+    plus une fois par seconde plutôt qu'à chaque lecture
+    """
+
+    def __init__(self, host, stats=None, registry=None):
+        self.host = host
+        self.stats = stats
+        self.registry = registry or METRICS
+        self.seconds = 0.0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+
+    def add(self, elapsed):
+        self.seconds += elapsed
+        if elapsed >= STALL_THRESHOLD:
+            self.stalls += 1
+            self.stall_seconds += elapsed
+        if self.seconds >= 1.0:
+            self.flush()
+
+    def flush(self):
+        if not self.seconds:
+            return
+        self.registry.network_wait(
+            self.host, self.seconds, self.stalls, self.stall_seconds
+        )
+        if self.stats is not None:
+            self.stats.add_network(self.seconds, self.stalls, self.stall_seconds)
+        self.seconds = 0.0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    """Point de collecte Prometheus (``GET /metrics``), servi dans un thread"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=9464, registry=None):
+        super().__init__((host, port), MetricsHandler)
+        self.registry = registry or METRICS
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_listen_address(text, default_host="127.0.0.1"):
+    """'9464' ou 'hôte:9464' -> (hôte, port)"""
+    host, _, port = text.rpartition(":")
+    if not port.isdigit():
+        raise ValueError(f"Adresse d'écoute invalide: {text} (attendu [HÔTE:]PORT)")
+    return host.strip("[]") or default_host, int(port)
+
+
+METRICS = MetricsRegistry()
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+Téléchargement multi-sources (miroirs)
+
+Les URL d'un même fichier sont d'abord sondées en parallèle (HEAD: latence,
+taille, ETag). Seuls les miroirs d'accord avec la référence sont gardés.
+Le fichier est ensuite découpé en morceaux distribués dynamiquement: chaque
+connexion prend le morceau suivant sur le miroir le plus rapide du moment,
+un miroir en échec est écarté et ses morceaux redistribués, et en fin de
+transfert les connexions libres reprennent la seconde moitié des morceaux
+encore en cours sur les miroirs lents.
+"""
+
+import collections
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .segmented import (
+    MIN_SEGMENT_SIZE,
+    Piece,
+    RangeNotSupportedError,
+    SegmentedDownloader,
+)
+from .streaming import (
+    CoalescingWriter,
+    ConnectionReleased,
+    CpuTimer,
+    IncompleteTransferError,
+    iter_adaptive,
+)
+from .transport import response_total_size
+
+# Taille maximale d'un morceau distribué à une connexion
+MAX_PIECE_SIZE = 16 * 1024 * 1024
+
+# En dessous, un morceau en cours n'est plus partagé avec une autre connexion
+MIN_STEAL_SIZE = 512 * 1024
+
+# Échecs tolérés avant d'écarter un miroir
+MAX_MIRROR_FAILURES = 3
+
+
+class Mirror:
+    """Une source possible du fichier et ses mesures"""
+
+    def __init__(self, url):
+        self.url = url
+        self.response = None
+        self.error = None
+        self.latency = None
+        self.total_size = 0
+        self.etag = None
+        self.last_modified = None
+        self.accepts_ranges = False
+        # Débit mesuré par connexion (octets/s, moyenne glissante)
+        self.rate = None
+        self.active = 0
+        self.failures = 0
+        self.disabled = False
+        self.retry_at = (
+            0.0  # Après une erreur passagère: pas de nouvelle requête avant (monotonic)
+        )
+
+    @property
+    def ok(self):
+        return self.response is not None and not self.disabled
+
+    def if_range(self):
+        """Validateur If-Range propre à ce miroir"""
+        if self.etag and not self.etag.startswith("W/"):
+            return self.etag
+        return self.last_modified
+
+    def agrees_with(self, other):
+        """Même taille et, si les deux en ont un, même ETag fort"""
+        if self.total_size != other.total_size:
+            return False
+        if (
+            self.etag
+            and other.etag
+            and not self.etag.startswith("W/")
+            and not other.etag.startswith("W/")
+        ):
+            return self.etag == other.etag
+        return True
+
+    def record(self, nbytes, seconds):
+        """Ajoute la mesure d'un morceau transféré"""
+        if nbytes <= 0 or seconds <= 0:
+            return
+        rate = nbytes / seconds
+        self.rate = rate if self.rate is None else 0.7 * self.rate + 0.3 * rate
+
+    def score(self):
+        """Débit espéré pour une connexion de plus (miroir non mesuré: prioritaire)"""
+        if self.rate is None:
+            return float("inf")
+        return self.rate / (self.active + 1)
+
+    def __repr__(self):
+        return f"<Mirror {self.url} latence={self.latency} débit={self.rate}>"
+
+
+def probe_mirrors(session, urls, headers, timeout=10):
+    """HEAD parallèle sur chaque URL; retourne les Mirror dans l'ordre des URL"""
+    mirrors = [Mirror(url) for url in urls]
+
+    def probe(mirror):
+        started = time.perf_counter()
+        try:
+            response = session.head(
+                mirror.url, headers=headers, allow_redirects=True, timeout=timeout
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            mirror.error = e
+            return
+        mirror.latency = time.perf_counter() - started
+        mirror.response = response
+        # Content-Length illisible: taille inconnue, comme s'il manquait
+        mirror.total_size = response_total_size(response)
+        mirror.etag = response.headers.get("etag")
+        mirror.last_modified = response.headers.get("last-modified")
+        mirror.accepts_ranges = (
+            response.headers.get("accept-ranges", "").lower() == "bytes"
+        )
+
+    with ThreadPoolExecutor(max_workers=len(mirrors)) as pool:
+        list(pool.map(probe, mirrors))
+    return mirrors
+
+
+def select_mirrors(mirrors):
+    """
+    Garde les miroirs joignables et d'accord avec la référence (la première
+    URL qui répond), triés par latence, référence en tête.
+    """
+    reachable = [mirror for mirror in mirrors if mirror.response is not None]
+    if not reachable:
+        return []
+    reference = reachable[0]
+    others = sorted(
+        (mirror for mirror in reachable[1:] if mirror.agrees_with(reference)),
+        key=lambda mirror: mirror.latency,
+    )
+    return [reference] + others
+
+
+class MultiSourceDownloader(SegmentedDownloader):
+    """
+    SegmentedDownloader dont les connexions puisent des morceaux dans une
+    file commune et choisissent à chaque morceau le meilleur miroir.
+    """
+
+    def __init__(self, download_manager, mirrors, headers, total_size, segments):
+        super().__init__(
+            download_manager,
+            mirrors[0].url,
+            headers,
+            total_size,
+            max(segments, len(mirrors)),
+        )
+        self.mirrors = mirrors
+        self.queue = collections.deque()
+        self.in_flight = []
+        self.condition = threading.Condition()
+        self.last_error = None
+
+    def split_pieces(self, missing):
+        remaining = sum(end - start + 1 for start, end in missing)
+        size = min(
+            MAX_PIECE_SIZE, max(MIN_SEGMENT_SIZE, remaining // (self.segments * 4))
+        )
+        pieces = []
+        for start, end in missing:
+            for piece_start in range(start, end + 1, size):
+                pieces.append(Piece(piece_start, min(piece_start + size - 1, end)))
+        return pieces
+
+    def tasks(self, part, missing, journal):
+        self.queue.extend(self.split_pieces(missing))
+        return [
+            functools.partial(self.worker, part, journal, slot)
+            for slot in range(self.segments)
+        ]
+
+    def _assign(self):
+        """
+        Prochain (morceau, miroir, 0), (None, None, attente) si tous les
+        miroirs sont en backoff, ou (None, None, 0) s'il n'y a plus rien à faire.
+        """
+        with self.condition:
+            mirrors = [mirror for mirror in self.mirrors if mirror.ok]
+            if not mirrors:
+                return None, None, 0
+            now = time.monotonic()
+            ready = [mirror for mirror in mirrors if mirror.retry_at <= now]
+            if not ready:
+                wait = min(mirror.retry_at for mirror in mirrors) - now
+                return None, None, wait if self.queue else 0
+            mirror = max(ready, key=lambda mirror: (mirror.score(), -mirror.latency))
+
+            if self.queue:
+                piece = self.queue.popleft()
+            else:
+                piece = self._steal()
+                if piece is None:
+                    return None, None, 0
+            mirror.active += 1
+            self.in_flight.append(piece)
+            return piece, mirror, 0
+
+    def _steal(self):
+        """Partage en deux le morceau en cours le plus en retard (verrou tenu)"""
+        candidates = [
+            piece for piece in self.in_flight if piece.remaining >= 2 * MIN_STEAL_SIZE
+        ]
+        if not candidates:
+            return None
+        victim = max(candidates, key=lambda piece: piece.remaining)
+        # Sous le verrou du morceau: le propriétaire n'écrit que ce qu'il a réservé
+        return victim.split(MIN_STEAL_SIZE)
+
+    def _release(self, piece, mirror, error=None):
+        with self.condition:
+            mirror.active -= 1
+            self.in_flight.remove(piece)
+            if piece.remaining > 0 and not self.failed.is_set():
+                # Reste du morceau (échec, pause longue): à reprendre par n'importe qui
+                self.queue.appendleft(Piece(piece.position, piece.end))
+            if error is not None:
+                self.last_error = error
+                mirror.failures += 1
+                policy = self.download_manager.retry_policy
+                if policy is not None and policy.is_retryable(error):
+                    # Backoff propre au miroir: les autres continuent de servir
+                    mirror.retry_at = time.monotonic() + policy.delay(
+                        mirror.failures - 1, error
+                    )
+                    self.download_manager.record_retry(mirror.url, error)
+                if not mirror.disabled and (
+                    isinstance(error, RangeNotSupportedError)
+                    or mirror.failures >= MAX_MIRROR_FAILURES
+                ):
+                    mirror.disabled = True
+                    self.download_manager.report_status(
+                        f"⚠️ Miroir écarté: {mirror.url}"
+                    )
+
+    def worker(self, part, journal, slot):
+        manager = self.download_manager
+        while not (manager.is_cancelled or self.failed.is_set()):
+            piece, mirror, wait = self._assign()
+            if piece is None:
+                if wait > 0:
+                    manager.cancelled.wait(wait)
+                    continue
+                break
+            error = None
+            started = time.perf_counter()
+            position = piece.position
+            try:
+                self._fetch_piece(part, piece, mirror, journal, slot)
+            except ConnectionReleased:
+                pass
+            except (requests.RequestException, RangeNotSupportedError, IOError) as e:
+                error = e
+            mirror.record(piece.position - position, time.perf_counter() - started)
+            self._release(piece, mirror, error)
+
+        with self.condition:
+            unfinished = self.queue or self.in_flight
+        if (
+            unfinished
+            and not (manager.is_cancelled or self.failed.is_set())
+            and not any(mirror.ok for mirror in self.mirrors)
+        ):
+            raise self.last_error or IOError("Aucun miroir utilisable")
+
+    def _fetch_piece(self, part, piece, mirror, journal, slot):
+        """Télécharge piece depuis mirror, en s'arrêtant si piece.end est réduit"""
+        manager = self.download_manager
+        headers = dict(self.headers)
+        headers["Range"] = f"bytes={piece.position}-{piece.end}"
+        if mirror.if_range():
+            headers["If-Range"] = mirror.if_range()
+
+        response = manager.session.get(
+            mirror.url, headers=headers, stream=True, timeout=30
+        )
+        try:
+            response.raise_for_status()
+            content_range = response.headers.get("content-range", "")
+            if response.status_code != 206 or not content_range.startswith(
+                f"bytes {piece.position}-"
+            ):
+                raise RangeNotSupportedError(
+                    f"{mirror.url}: réponse {response.status_code} à une requête Range"
+                )
+
+            with CpuTimer(manager.stats) as timer:
+                writer = CoalescingWriter(
+                    part.at(piece.position),
+                    piece.position,
+                    on_flush=manager.written if journal is not None else None,
+                    stats=manager.stats,
+                    disk_writer=part.disk_writer,
+                )
+                try:
+                    for chunk in iter_adaptive(
+                        response, limiter=manager.limiter, stats=manager.stats
+                    ):
+                        size = piece.take(len(chunk))
+                        if size < len(chunk):
+                            # Fin du morceau, ou fin cédée à une autre connexion
+                            chunk = chunk[:size]
+                        writer.write(chunk)
+                        timer.nbytes += size
+                        self.received[slot] += size
+                        if piece.position > piece.end or self.failed.is_set():
+                            break
+                        if not manager.checkpoint(response):
+                            break
+                finally:
+                    writer.flush()
+        finally:
+            response.close()
+
+        if piece.position <= piece.end and not (
+            manager.is_cancelled or self.failed.is_set()
+        ):
+            raise IncompleteTransferError(
+                f"{mirror.url}: morceau {piece.start}-{piece.end} incomplet"
+            )
@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+"""
+Fichier de sortie partagé par les connexions d'un téléchargement
+
+Le fichier partiel (``<fichier>.part``) est ouvert une seule fois et, si la
+taille est connue, préalloué en entier (fallocate, sinon fichier creux):
+moins de fragmentation, et un disque plein se signale dès le départ plutôt
+qu'au milieu du transfert. Chaque connexion écrit à ses propres offsets par
+pwrite, sans position de fichier partagée, donc sans verrou global. Le
+fichier n'est renommé vers son nom final qu'une fois complet.
+
+Avec une WritePolicy, les écritures passent par un étage dédié
+(DiskWriter): les lecteurs réseau déposent leurs blocs dans une file
+bornée en octets et repartent lire, un ou plusieurs threads (WritePool,
+partagé par tout le moteur asyncio) les écrivent.
+Réseau et disque avancent en parallèle; un disque plus lent que le réseau
+ralentit les lecteurs (contre-pression) sans que la mémoire n'explose.
+check_free_space() refuse de commencer un fichier qui ne tiendra pas.
+"""
+
+import collections
+import errno
+import os
+import shutil
+import threading
+import time
+
+from .journal import part_path_for
+
+# Octets reçus mais pas encore écrits au-delà desquels les lecteurs attendent
+DEFAULT_MAX_PENDING_WRITES = 16 * 1024 * 1024
+
+# Threads d'écriture par fichier
+DEFAULT_WRITE_THREADS = 1
+
+# Politiques de synchronisation (fsync) du fichier partiel
+FSYNC_NEVER = "never"  # Le système écrit quand il le juge bon
+FSYNC_CLOSE = "close"  # Une fois en fin de transfert, avant le renommage
+FSYNC_PERIODIC = (
+    "periodic"  # Aussi toutes les FSYNC_INTERVAL secondes pendant le transfert
+)
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_CLOSE, FSYNC_PERIODIC)
+
+# Intervalle de FSYNC_PERIODIC, en secondes
+FSYNC_INTERVAL = 5.0
+
+
+class InsufficientSpaceError(OSError):
+    """Pas assez d'espace libre pour le fichier à télécharger"""
+
+    def __init__(self, folder, needed, free):
+        super().__init__(
+            errno.ENOSPC,
+            f"Espace disque insuffisant dans {folder}: "
+            f"{needed / (1024*1024):.1f} MB nécessaires, "
+            f"{free / (1024*1024):.1f} MB libres",
+        )
+        self.folder = folder
+        self.needed = needed
+        self.free = free
+
+
+def free_space(folder):
+    """Octets disponibles dans folder (psutil si installé)"""
+    try:
+        import psutil
+    except ImportError:  # pragma: no cover - dépendance optionnelle
+        return shutil.disk_usage(folder).free
+    return psutil.disk_usage(folder).free
+
+
+def check_free_space(file_path, total_size):
+    """
+    Lève InsufficientSpaceError si le fichier partiel de file_path ne peut
+    pas atteindre total_size octets. L'espace déjà alloué au fichier partiel
+    (reprise, préallocation) est décompté.
+    """
+    if not total_size:
+        return
+    try:
+        stat = os.stat(part_path_for(file_path))
+        allocated = stat.st_blocks * 512 if hasattr(stat, "st_blocks") else stat.st_size
+    except FileNotFoundError:
+        allocated = 0
+    needed = total_size - allocated
+    if needed <= 0:
+        return
+    folder = os.path.dirname(os.path.abspath(file_path))
+    free = free_space(folder)
+    if free < needed:
+        raise InsufficientSpaceError(folder, needed, free)
+
+
+class WritePolicy:
+    """
+    Écriture des fichiers partiels.
+
+    threads: threads d'écriture par fichier (0: écritures directes dans les
+    threads de transfert). max_pending: octets en attente d'écriture
+    au-delà desquels les lecteurs réseau attendent. fsync: FSYNC_NEVER,
+    FSYNC_CLOSE ou FSYNC_PERIODIC, appliquée dans tous les cas.
+    """
+
+    def __init__(
+        self,
+        threads=DEFAULT_WRITE_THREADS,
+        max_pending=DEFAULT_MAX_PENDING_WRITES,
+        fsync=FSYNC_NEVER,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Politique fsync inconnue: {fsync}")
+        self.threads = max(threads, 0)
+        self.max_pending = max_pending
+        self.fsync = fsync
+
+    def __repr__(self):
+        return (
+            f"<WritePolicy threads={self.threads} max_pending={self.max_pending} "
+            f"fsync={self.fsync}>"
+        )
+
+
+DEFAULT_WRITE_POLICY = WritePolicy()
+
+
+def sync_file(fd):
+    """Force l'écriture sur le disque du contenu de fd"""
+    if hasattr(os, "fdatasync"):
+        os.fdatasync(fd)
+    else:
+        os.fsync(fd)
+
+
+class WritePool:
+    """
+    Threads d'écriture et file bornée en octets, propres à un fichier ou
+    partagés par tous les transferts d'un moteur (asyncio). Les blocs sont
+    déposés par les DiskWriter; avec un seul thread, ils sont écrits dans
+    l'ordre de dépôt. Les tampons écrits sont recyclés (buffer()).
+    """
+
+    def __init__(
+        self, threads=DEFAULT_WRITE_THREADS, max_pending=DEFAULT_MAX_PENDING_WRITES
+    ):
+        self.max_pending = max_pending
+        self.condition = threading.Condition()
+        self.blocks = collections.deque()
+        self.pending = 0  # Octets en file ou en cours d'écriture
+        self.closed = False
+        self.buffers = []  # Tampons déjà écrits, réutilisables
+        self.waiters = []  # Callbacks appelés quand la file a de la place (when_room)
+        self.threads = [
+            threading.Thread(target=self._run, daemon=True)
+            for _ in range(max(threads, 1))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def buffer(self, size):
+        """Tampon de size octets, recyclé (à rendre par put(..., recycle=True))"""
+        with self.condition:
+            while self.buffers:
+                buffer = self.buffers.pop()
+                if len(buffer) == size:
+                    return buffer
+        return bytearray(size)
+
+    def has_room(self):
+        return self.pending < self.max_pending
+
+    def when_room(self, callback):
+        """
+        Appelle callback (depuis un thread d'écriture) dès que la file a de la
+        place; retourne False, sans l'appeler, si elle en a déjà.
+        """
+        with self.condition:
+            if self.pending < self.max_pending or self.closed:
+                return False
+            self.waiters.append(callback)
+            return True
+
+    def _wake(self):
+        with self.condition:
+            if self.pending >= self.max_pending and not self.closed:
+                return
+            waiters, self.waiters = self.waiters, []
+        for callback in waiters:
+            callback()
+
+    def put(self, writer, offset, data, size, on_done, recycle, wait=True):
+        """Dépose un bloc de writer; wait: attendre d'abord qu'il tienne dans la file"""
+        with self.condition:
+            if wait:
+                self.condition.wait_for(
+                    lambda: not self.pending or self.pending + size <= self.max_pending
+                )
+            if self.closed:
+                raise RuntimeError("Threads d'écriture arrêtés")
+            self.pending += size
+            self.blocks.append((writer, offset, data, size, on_done, recycle))
+            self.condition.notify_all()
+
+    def close(self):
+        """Écrit les blocs restants et arrête les threads"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self._wake()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.blocks or self.closed)
+                if not self.blocks:
+                    return
+                writer, offset, data, size, on_done, recycle = self.blocks.popleft()
+            try:
+                writer._write(offset, data, size, on_done)
+            finally:
+                with self.condition:
+                    self.pending -= size
+                    if recycle and len(self.buffers) * len(data) < self.max_pending:
+                        self.buffers.append(data)
+                    self.condition.notify_all()
+                writer._written(size)
+                if self.waiters:
+                    self._wake()
+
+
+class DiskWriter:
+    """
+    Étage d'écriture d'un PartFile: file bornée entre les lecteurs réseau
+    et les threads d'un WritePool (le sien, ou pool s'il est partagé).
+
+    submit() rend la main dès que le bloc est en file, et n'attend que si
+    max_pending octets attendent déjà (contre-pression). Avec
+    backpressure=False, submit() n'attend jamais: l'appelant (boucle
+    asyncio) attend lui-même la place par ``await room()``. Le thread
+    d'écriture appelle on_done(offset, data) une fois les octets transmis au
+    système: data n'est valable que pendant l'appel. La première erreur
+    d'écriture est relevée par le submit() ou le drain() suivant.
+    """
+
+    def __init__(
+        self,
+        part,
+        policy=DEFAULT_WRITE_POLICY,
+        stats=None,
+        pool=None,
+        backpressure=True,
+    ):
+        self.part = part
+        self.stats = stats
+        self.backpressure = backpressure
+        self.owns_pool = pool is None
+        self.pool = (
+            pool if pool is not None else WritePool(policy.threads, policy.max_pending)
+        )
+        self.condition = threading.Condition()
+        self.pending = 0  # Octets de ce fichier en file ou en cours d'écriture
+        self.error = None
+
+    def buffer(self, size):
+        return self.pool.buffer(size)
+
+    def submit(self, offset, data, size=None, on_done=None, recycle=False):
+        """
+        Met en file l'écriture des size premiers octets de data à offset.
+        data ne doit plus être modifié; recycle: tampon obtenu par buffer().
+        """
+        size = len(data) if size is None else size
+        with self.condition:
+            if self.error is not None:
+                raise self.error
+            self.pending += size
+        try:
+            self.pool.put(
+                self, offset, data, size, on_done, recycle, wait=self.backpressure
+            )
+        except BaseException:
+            self._written(size)
+            raise
+
+    async def room(self):
+        """Attend, sans bloquer la boucle d'événements, que la file ait de la place"""
+        if self.pool.has_room():
+            return
+        import asyncio  # Pas à l'import du module: inutile au moteur à threads
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve():
+            if not future.done():
+                future.set_result(None)
+
+        if self.pool.when_room(lambda: loop.call_soon_threadsafe(resolve)):
+            await future
+
+    def drain(self):
+        """Attend que tous les blocs soumis soient écrits"""
+        with self.condition:
+            self.condition.wait_for(lambda: not self.pending)
+            if self.error is not None:
+                raise self.error
+
+    def close(self):
+        """Écrit les blocs restants (et arrête les threads s'ils sont les siens)"""
+        try:
+            self.drain()
+        finally:
+            if self.owns_pool:
+                self.pool.close()
+
+    def _write(self, offset, data, size, on_done):
+        """Appelée par un thread du pool"""
+        if self.error is not None:
+            return
+        try:
+            with memoryview(data) as view:
+                view = view[:size]
+                started = time.perf_counter()
+                position = 0
+                while position < size:
+                    position += self.part.pwrite(view[position:], offset + position)
+                if self.stats is not None:
+                    self.stats.add_disk(size, time.perf_counter() - started)
+                if on_done is not None:
+                    on_done(offset, view)
+                view.release()
+        except BaseException as e:
+            with self.condition:
+                if self.error is None:
+                    self.error = e
+
+    def _written(self, size):
+        with self.condition:
+            self.pending -= size
+            self.condition.notify_all()
+
+
+class PositionalWriter:
+    """
+    Vue d'un PartFile qui écrit séquentiellement à partir de offset;
+    s'utilise comme un fichier non bufferisé (CoalescingWriter).
+    """
+
+    def __init__(self, part, offset):
+        self.part = part
+        self.offset = offset
+
+    def write(self, data):
+        written = self.part.pwrite(data, self.offset)
+        self.offset += written
+        return written
+
+
+class PartFile:
+    """
+    Fichier partiel de file_path.
+
+    total_size: taille finale si connue (préallocation). resume: conserver
+    le contenu existant (reprise) au lieu de repartir d'un fichier vide.
+    write_policy: WritePolicy (étage d'écriture disk_writer si elle a des
+    threads, fsync), ou None pour des écritures directes dans le thread
+    appelant; stats reçoit alors le temps d'écriture (TransferStats).
+    write_pool: WritePool partagé à utiliser au lieu de threads propres à
+    ce fichier; backpressure: voir DiskWriter.
+    """
+
+    def __init__(
+        self,
+        file_path,
+        total_size=None,
+        resume=False,
+        write_policy=None,
+        stats=None,
+        write_pool=None,
+        backpressure=True,
+    ):
+        self.file_path = file_path
+        self.path = part_path_for(file_path)
+        self.total_size = total_size
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        if not resume:
+            flags |= os.O_TRUNC
+        self.fd = os.open(self.path, flags, 0o666)
+        # Sans pwrite (Windows): seek + write sous verrou
+        self.lock = None if hasattr(os, "pwrite") else threading.Lock()
+        self.fsync = write_policy.fsync if write_policy is not None else FSYNC_NEVER
+        self.sync_lock = threading.Lock()
+        self.last_sync = time.monotonic()
+        self.close_lock = threading.Lock()
+        self.disk_writer = None
+        try:
+            if total_size:
+                self.preallocate(total_size)
+        except BaseException:
+            os.close(self.fd)
+            raise
+        if write_policy is not None and (
+            write_policy.threads or write_pool is not None
+        ):
+            self.disk_writer = DiskWriter(
+                self, write_policy, stats, write_pool, backpressure
+            )
+
+    def preallocate(self, size):
+        """Réserve size octets sur le disque, ou à défaut étend le fichier (creux)"""
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(self.fd, 0, size)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+                    raise  # ENOSPC: inutile de commencer
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+
+    def pwrite(self, data, offset):
+        """Écrit data à offset sans déplacer la position; retourne les octets écrits"""
+        if self.lock is None:
+            written = os.pwrite(self.fd, data, offset)
+        else:
+            with self.lock:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                written = os.write(self.fd, data)
+        if (
+            self.fsync == FSYNC_PERIODIC
+            and time.monotonic() - self.last_sync >= FSYNC_INTERVAL
+        ):
+            self.sync(periodic=True)
+        return written
+
+    def sync(self, periodic=False):
+        """
+        Synchronise le fichier sur le disque (periodic: sauf si un autre thread
+        vient de le faire)
+        """
+        with self.sync_lock:
+            if periodic and time.monotonic() - self.last_sync < FSYNC_INTERVAL:
+                return
+            sync_file(self.fd)
+            self.last_sync = time.monotonic()
+
+    def at(self, offset):
+        """Écrivain séquentiel à partir de offset"""
+        return PositionalWriter(self, offset)
+
+    def close(self):
+        """
+        Termine les écritures en file, synchronise selon la politique fsync et
+        ferme le fichier. Sans effet si le fichier est déjà fermé, y compris
+        par un autre thread.
+        """
+        with self.close_lock:
+            if self.fd is None:
+                return
+            try:
+                if self.disk_writer is not None:
+                    self.disk_writer.close()
+                if self.fsync != FSYNC_NEVER:
+                    self.sync()
+            finally:
+                os.close(self.fd)
+                self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
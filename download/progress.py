@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Progression échantillonnée
+
+Les threads de transfert ne font que mettre à jour des compteurs
+(downloaded_size, total_size): ni verrou, ni callback, ni horloge. Un seul
+échantillonneur (ProgressTicker, ou la boucle d'affichage elle-même) lit
+ces compteurs à intervalle fixe et en déduit vitesse sur fenêtre glissante
+et temps restant. Le coût de l'affichage ne dépend donc pas du nombre de
+transferts actifs.
+"""
+
+import collections
+import math
+import threading
+import time
+
+# Intervalle d'échantillonnage par défaut, en secondes
+PROGRESS_INTERVAL = 0.25
+
+# Fenêtre de calcul de la vitesse, en secondes
+SPEED_WINDOW = 3.0
+
+ProgressSnapshot = collections.namedtuple(
+    "ProgressSnapshot", "downloaded total speed eta"
+)
+ProgressSnapshot.__doc__ = """
+Octets reçus, taille totale (0 si inconnue), vitesse en MB/s, secondes
+restantes ou None
+"""
+
+
+def format_eta(seconds):
+    """Temps restant lisible: '42 s', '3 min 05 s', '1 h 02 min'"""
+    if seconds is None:
+        return "?"
+    seconds = math.ceil(seconds)
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min {seconds % 60:02d} s"
+    return f"{seconds // 3600} h {seconds % 3600 // 60:02d} min"
+
+
+class SpeedWindow:
+    """Vitesse moyenne sur les window dernières secondes d'échantillons"""
+
+    def __init__(self, window=SPEED_WINDOW):
+        self.window = window
+        self.samples = collections.deque()
+
+    def add(self, now, downloaded):
+        """Ajoute un échantillon et retourne la vitesse en octets/s"""
+        samples = self.samples
+        if samples and downloaded < samples[-1][1]:
+            # Compteur remis à zéro (reprise depuis le début)
+            samples.clear()
+        samples.append((now, downloaded))
+        while len(samples) > 2 and now - samples[1][0] >= self.window:
+            samples.popleft()
+        first_time, first_bytes = samples[0]
+        if now <= first_time:
+            return 0.0
+        return (downloaded - first_bytes) / (now - first_time)
+
+
+class ProgressAggregator:
+    """
+    Ensemble de sources suivies. Une source est tout objet exposant
+    downloaded_size et total_size (DownloadManager, AsyncDownloadManager).
+
+    sample() ne doit être appelée que depuis un seul thread à la fois.
+    """
+
+    def __init__(self, window=SPEED_WINDOW):
+        self.window = window
+        self.sources = {}
+
+    def track(self, key, source):
+        self.sources[key] = (source, SpeedWindow(self.window))
+
+    def untrack(self, key):
+        self.sources.pop(key, None)
+
+    def sample(self):
+        """Retourne [(clé, ProgressSnapshot)] pour toutes les sources suivies"""
+        now = time.monotonic()
+        snapshots = []
+        for key, (source, speed_window) in list(self.sources.items()):
+            downloaded = source.downloaded_size
+            total = source.total_size
+            speed = speed_window.add(now, downloaded)
+            eta = None
+            if total > 0 and speed > 0:
+                eta = max(total - downloaded, 0) / speed
+            snapshots.append(
+                (key, ProgressSnapshot(downloaded, total, speed / (1024 * 1024), eta))
+            )
+        return snapshots
+
+
+class ProgressTicker:
+    """
+    Thread unique qui échantillonne un ProgressAggregator toutes les
+    interval secondes et appelle callback(clé, snapshot) pour chaque source
+    dont la progression a changé.
+    """
+
+    def __init__(self, aggregator, callback, interval=PROGRESS_INTERVAL):
+        self.aggregator = aggregator
+        self.callback = callback
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+        self.last = {}
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """Arrête le thread après un dernier échantillon"""
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def tick(self):
+        """Un échantillon: appelle le callback pour les sources modifiées"""
+        last = {}
+        for key, snapshot in self.aggregator.sample():
+            last[key] = snapshot
+            if self.last.get(key) != snapshot:
+                self.callback(key, snapshot)
+        self.last = last
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.tick()
+        self.tick()
+
+    async def run_async(self):
+        """Variante asyncio de start(): échantillonne dans la boucle (annulable)"""
+        import asyncio
+
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                self.tick()
+        finally:
+            self.tick()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Limitation de bande passante par seau à jetons
+
+Un TokenBucket par téléchargement et, optionnellement, un seau global
+partagé par toute la file. Chaque lecture réserve ses octets dans tous les
+seaux concernés puis attend le temps nécessaire: le débit est lissé bloc
+par bloc au lieu d'alterner rafales et longues pauses. Les débits se
+modifient à chaud avec set_rate().
+"""
+
+import re
+import threading
+import time
+
+# Réserve de jetons d'un seau, en secondes de débit
+BURST_SECONDS = 0.25
+
+# Sous limitation, une lecture dure environ READ_INTERVAL au débit visé
+READ_INTERVAL = 0.05
+MIN_LIMITED_READ = 4 * 1024
+
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+
+
+def parse_rate(text):
+    """
+    Convertit '500K', '2M', '1.5m' ou '65536' en octets par seconde
+    (0 ou vide: illimité)
+    """
+    match = re.fullmatch(
+        r"\s*(\d+(?:\.\d+)?)\s*([kKmMgG]?)[bB]?(?:/s)?\s*", text or "0"
+    )
+    if match is None:
+        raise ValueError(f"Débit invalide: {text!r} (exemples: 500K, 2M)")
+    rate = int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+    return rate or None
+
+
+class TokenBucket:
+    """
+    Seau à jetons thread-safe: rate octets par seconde, None pour illimité.
+
+    reserve() ne bloque jamais: elle débite le seau, éventuellement à
+    découvert, et retourne le délai à respecter avant d'utiliser les
+    octets. Les réservations concurrentes s'alignent ainsi d'elles-mêmes.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.lock = threading.Lock()
+        self.rate = None
+        self.burst = burst
+        self.capacity = 0.0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """Change le débit (octets/s, None ou 0 pour illimité), effet immédiat"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate or None
+            if self.rate is None:
+                self.capacity = self.tokens = 0.0
+                return
+            self.capacity = float(
+                self.burst or max(self.rate * BURST_SECONDS, MIN_LIMITED_READ)
+            )
+            # La dette d'un ancien débit plus bas ne doit pas pénaliser le nouveau
+            self.tokens = max(min(self.tokens, self.capacity), -self.capacity)
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+        self.updated = now
+
+    def reserve(self, nbytes):
+        """Débite nbytes et retourne le délai d'attente en secondes"""
+        if self.rate is None:
+            return 0.0
+        with self.lock:
+            if self.rate is None:
+                return 0.0
+            self._refill(time.monotonic())
+            self.tokens -= nbytes
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def max_read(self):
+        """Taille de lecture adaptée au débit, None si illimité"""
+        rate = self.rate
+        if rate is None:
+            return None
+        return max(int(rate * READ_INTERVAL), MIN_LIMITED_READ)
+
+
+class RateLimiter:
+    """Combine plusieurs seaux (par exemple global + par téléchargement)"""
+
+    def __init__(self, *buckets):
+        self.buckets = [bucket for bucket in buckets if bucket is not None]
+
+    def reserve(self, nbytes):
+        delay = 0.0
+        for bucket in self.buckets:
+            delay = max(delay, bucket.reserve(nbytes))
+        return delay
+
+    def throttle(self, nbytes):
+        """Attend que nbytes puissent passer"""
+        delay = self.reserve(nbytes)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def throttle_async(self, nbytes):
+        delay = self.reserve(nbytes)
+        if delay > 0:
+            # Importé ici: le moteur à threads n'a pas à charger asyncio
+            import asyncio
+
+            await asyncio.sleep(delay)
+
+    def max_read(self):
+        """Taille de lecture imposée par le seau le plus lent, None si illimité"""
+        sizes = [
+            size
+            for size in (bucket.max_read() for bucket in self.buckets)
+            if size is not None
+        ]
+        return min(sizes) if sizes else None
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Nouvelles tentatives après une erreur réseau
+
+RetryPolicy décide si une erreur mérite une nouvelle tentative (connexion
+perdue, délai dépassé, transfert tronqué, HTTP 408/425/429/5xx) et combien
+de temps attendre: backoff exponentiel avec gigue, ou le Retry-After du
+serveur (429, 503). Les transferts reprennent ensuite au dernier octet
+écrit, par une requête Range.
+
+Chaque nouvelle tentative est comptée par hôte et par cause dans
+RETRY_METRICS, pour repérer les hôtes instables.
+"""
+
+import collections
+import email.utils
+import random
+import threading
+import time
+
+import requests
+
+from .metrics import METRICS
+from .streaming import IncompleteTransferError
+
+# Nouvelles tentatives consécutives sans progrès avant d'abandonner
+DEFAULT_MAX_RETRIES = 5
+
+# Backoff: BACKOFF_BASE * 2^tentative, plafonné, la moitié tirée au hasard
+BACKOFF_BASE = 0.5
+MAX_BACKOFF = 30.0
+
+# Au-delà, un Retry-After est plafonné plutôt que de bloquer le transfert
+MAX_RETRY_AFTER = 300.0
+
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def error_status(error):
+    """Code HTTP porté par l'erreur (requests ou httpx), sinon None"""
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+
+def retry_reason(error):
+    """Cause lisible d'une erreur (compteurs): 'http-503', 'délai', 'connexion'..."""
+    status = error_status(error)
+    if status is not None and status >= 400:
+        return f"http-{status}"
+    if isinstance(error, IncompleteTransferError):
+        return "incomplet"
+    if (
+        isinstance(error, requests.exceptions.Timeout)
+        or "Timeout" in type(error).__name__
+    ):
+        return "délai"
+    return "connexion"
+
+
+def parse_retry_after(value):
+    """Secondes demandées par Retry-After (nombre ou date HTTP), sinon None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """
+    max_retries nouvelles tentatives consécutives sans progrès (0: aucune);
+    l'appelant remet son compteur à zéro dès que des octets ont été écrits.
+    """
+
+    def __init__(
+        self,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff=BACKOFF_BASE,
+        max_backoff=MAX_BACKOFF,
+        max_retry_after=MAX_RETRY_AFTER,
+        statuses=RETRY_STATUSES,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.statuses = statuses
+
+    def is_retryable(self, error):
+        status = error_status(error)
+        if status is not None:
+            return status in self.statuses
+        if isinstance(
+            error,
+            (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+                IncompleteTransferError,
+            ),
+        ):
+            return True
+        # httpx.TransportError (connexion, délai, protocole) sans dépendre de httpx
+        return any(
+            cls.__module__.startswith("httpx") and cls.__name__ == "TransportError"
+            for cls in type(error).__mro__
+        )
+
+    def should_retry(self, error, attempt):
+        """attempt: nombre de tentatives déjà refaites sans progrès"""
+        return attempt < self.max_retries and self.is_retryable(error)
+
+    def delay(self, attempt, error=None):
+        """Attente avant la tentative suivante, en secondes"""
+        response = getattr(error, "response", None)
+        if response is not None and error_status(error) in (429, 503):
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+        ceiling = min(self.max_backoff, self.backoff * 2**attempt)
+        # Gigue: des clients qui échouent ensemble ne reviennent pas ensemble
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class RetryMetrics:
+    """Nombre de nouvelles tentatives par (hôte, cause), pour tout le processus"""
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+
+    def record(self, host, reason):
+        with self.lock:
+            self.counts[(host, reason)] += 1
+        METRICS.retry(host, reason)
+
+    def by_host(self):
+        """{hôte: {cause: nombre}}"""
+        hosts = collections.defaultdict(dict)
+        with self.lock:
+            for (host, reason), count in self.counts.items():
+                hosts[host][reason] = count
+        return dict(hosts)
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+RETRY_METRICS = RetryMetrics()
@@ -0,0 +1,729 @@
+# -*- coding: utf-8 -*-
+"""
+File d'attente de téléchargements concurrents
+
+Plusieurs DownloadManager tournent en parallèle sur une même session
+requests (et donc un même pool de connexions), avec une limite globale et
+une limite par hôte. Avec un JobStore, la file est persistante: ses jobs
+inachevés sont relancés par restore() après un redémarrage.
+
+Quelques threads de sonde envoient d'avance, sur les connexions du pool,
+la requête HEAD des prochains jobs en attente: un worker qui prend un job
+connaît déjà nom, taille et support des plages, et passe directement au
+transfert au lieu d'attendre un aller-retour de plus.
+
+Ordre d'exécution: priorité la plus haute, puis échéance la plus proche,
+puis plus petite taille restante connue (la sonde d'avance la fait
+connaître), puis ordre d'arrivée: un petit fichier de configuration
+n'attend pas derrière une image de 50 Go. Quand aucune place n'est libre
+pour un job plus urgent, un gros transfert en cours qui accepte les plages
+est interrompu (préemption), son fichier partiel conservé, et remis en
+file: il reprendra plus tard à son offset Range.
+"""
+
+import collections
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from .manager import DownloadManager
+from .output import DEFAULT_WRITE_POLICY
+from .progress import PROGRESS_INTERVAL, ProgressAggregator, ProgressTicker
+from .ratelimit import TokenBucket
+from .retry import DEFAULT_RETRY_POLICY
+from .segmented import DEFAULT_SEGMENTS
+from .transport import create_session, response_total_size
+
+# États d'un job
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+DEFAULT_MAX_CONCURRENT = 4
+DEFAULT_MAX_PER_HOST = 2
+
+# Sondes d'avance (HEAD) simultanées, et threads qui s'en chargent
+DEFAULT_PROBE_AHEAD = 8
+MAX_PROBE_THREADS = 4
+
+# Au-delà, une sonde faite d'avance est refaite par le worker
+PROBE_MAX_AGE = 30.0
+
+# Un transfert n'est préempté que s'il lui reste au moins autant d'octets
+PREEMPT_MIN_REMAINING = 32 * 1024 * 1024
+
+
+def read_url_file(path):
+    """Lit une liste d'URL (une par ligne, lignes vides et # ignorées)"""
+    with open(path, "r", encoding="utf-8") as file:
+        return [
+            line.strip()
+            for line in file
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+
+
+class DownloadJob:
+    """Un téléchargement de la file d'attente"""
+
+    def __init__(
+        self,
+        url,
+        folder,
+        filename=None,
+        manager=None,
+        mirrors=(),
+        checksum=None,
+        id=None,
+        priority=0,
+        deadline=None,
+    ):
+        # Identifiant dans le JobStore de la file, sinon numéro d'ordre dans la file
+        self.id = id
+        self.seq = None  # Ordre d'arrivée dans la file
+        self.url = url
+        self.folder = folder
+        self.filename = filename
+        self.mirrors = list(mirrors)
+        self.checksum = checksum
+        self.host = urlparse(url).netloc.lower()
+        self.status = PENDING
+        self.error = None
+        self.manager = manager
+        self.probe = None  # (instant, réponse HEAD) obtenue d'avance
+        self.probed = False
+        self.priority = priority  # Plus grand: plus urgent
+        self.deadline = (
+            deadline  # Horodatage Unix (time.time()) souhaité pour la fin, ou None
+        )
+        # Taille connue avant le transfert (sonde, lancement précédent), 0 si inconnue
+        self.size = 0
+        self.downloaded = 0  # Octets déjà écrits par un transfert interrompu
+        self.preempted = (
+            False  # Interrompu au profit d'un job plus urgent, à remettre en file
+        )
+        self.done = threading.Event()
+
+    @property
+    def file_path(self):
+        return self.manager.file_path if self.manager is not None else None
+
+    def remaining_size(self):
+        """Octets restant à télécharger, ou None si la taille est inconnue"""
+        manager = self.manager
+        if manager is not None and manager.total_size:
+            return max(manager.total_size - manager.downloaded_size, 0)
+        if self.size:
+            return max(self.size - self.downloaded, 0)
+        return None
+
+    def rank(self):
+        """Clé d'ordonnancement: la plus petite passe en premier"""
+        remaining = self.remaining_size()
+        return (
+            -self.priority,
+            self.deadline if self.deadline is not None else math.inf,
+            remaining if remaining is not None else math.inf,
+            self.seq,
+        )
+
+    def __repr__(self):
+        return f"<DownloadJob {self.status} {self.url}>"
+
+
+class PendingJobs:
+    """
+    Jobs en attente, rangés selon DownloadJob.rank(). Tas à invalidation
+    paresseuse: update() après un changement de priorité ou de taille, les
+    entrées périmées sont ignorées au retrait. Les jobs pas encore sondés
+    sont aussi rangés par urgence seule (priorité, échéance, arrivée): leur
+    taille, inconnue, est justement ce que la sonde apprend.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.keys = {}  # job -> clé de son entrée valide
+        self.unprobed = []  # Tas (urgence, job) des jobs à sonder
+
+    @staticmethod
+    def _urgency(job):
+        return job.rank()[:2] + (job.seq,)
+
+    def push(self, job):
+        key = job.rank()
+        self.keys[job] = key
+        # seq unique: deux clés ne sont jamais égales, les jobs jamais comparés
+        heapq.heappush(self.heap, (key, job))
+        if len(self.heap) > 2 * len(self.keys) + 64:
+            self.heap = [(key, job) for job, key in self.keys.items()]
+            heapq.heapify(self.heap)
+        if not job.probed:
+            heapq.heappush(self.unprobed, (self._urgency(job), job))
+            if len(self.unprobed) > 2 * len(self.keys) + 64:
+                self.unprobed = [
+                    (self._urgency(job), job) for job in self.keys if not job.probed
+                ]
+                heapq.heapify(self.unprobed)
+
+    def update(self, job):
+        """Reclasse job s'il est en attente"""
+        if job in self.keys:
+            self.push(job)
+
+    def remove(self, job):
+        del self.keys[job]
+
+    def pop(self, eligible):
+        """Retire et retourne le premier job tel que eligible(job) est vrai, ou None"""
+        skipped = []
+        found = None
+        while self.heap:
+            key, job = heapq.heappop(self.heap)
+            if self.keys.get(job) != key:
+                continue
+            if eligible(job):
+                del self.keys[job]
+                found = job
+                break
+            skipped.append((key, job))
+        for entry in skipped:
+            heapq.heappush(self.heap, entry)
+        return found
+
+    def next_unprobed(self):
+        """Job en attente pas encore sondé le plus urgent, ou None"""
+        while self.unprobed:
+            key, job = heapq.heappop(self.unprobed)
+            if job in self.keys and not job.probed and key == self._urgency(job):
+                return job
+        return None
+
+    def __contains__(self, job):
+        return job in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class DownloadQueue:
+    """
+    Exécute des DownloadJob avec au plus max_concurrent téléchargements
+    simultanés, dont au plus max_per_host vers un même hôte.
+
+    rate_limit borne le débit cumulé de la file et per_download_rate celui
+    de chaque job (octets/s, None: illimité); voir set_rate_limit().
+    cache: DownloadCache partagé par tous les jobs.
+
+    Tous les jobs partagent une session dont les connexions keep-alive
+    passent d'un job à l'autre; pool_size connexions sont gardées par hôte
+    (défaut: max_per_host * segments). skip_head, extract, write_policy: voir
+    DownloadManager.
+    probe_ahead: nombre de requêtes HEAD envoyées d'avance en parallèle (au
+    plus MAX_PROBE_THREADS; 0: aucune; sans effet avec skip_head, dont la
+    sonde GET sert de transfert). Tous les jobs en attente sont sondés, les
+    plus urgents d'abord, pour que leur taille compte dans l'ordonnancement.
+    store: JobStore où enregistrer les jobs, leur état et leur progression;
+    un job interrompu (annulé sans supprimer son fichier partiel, ou arrêté
+    par la fermeture du programme) y reste en attente, pour restore().
+    preempt: interrompre un gros transfert en cours (plus de
+    PREEMPT_MIN_REMAINING octets restants, serveur acceptant les plages)
+    quand un job plus urgent ne trouve pas de place; il est remis en file
+    et reprend plus tard là où il s'était arrêté.
+
+    Callbacks optionnels:
+        on_progress(job, snapshot): ProgressSnapshot, depuis un unique
+            thread d'échantillonnage (toutes les progress_interval secondes)
+        on_status(job, message): depuis les threads de travail
+        on_job_done(job): depuis les threads de travail
+        on_job_added(job): depuis le thread qui ajoute le job (add(),
+            restore()...)
+    """
+
+    def __init__(
+        self,
+        max_concurrent=DEFAULT_MAX_CONCURRENT,
+        max_per_host=DEFAULT_MAX_PER_HOST,
+        session=None,
+        segments=DEFAULT_SEGMENTS,
+        on_progress=None,
+        on_status=None,
+        on_job_done=None,
+        rate_limit=None,
+        per_download_rate=None,
+        progress_interval=PROGRESS_INTERVAL,
+        cache=None,
+        pool_size=None,
+        skip_head=False,
+        retry_policy=DEFAULT_RETRY_POLICY,
+        extract=None,
+        store=None,
+        probe_ahead=DEFAULT_PROBE_AHEAD,
+        write_policy=DEFAULT_WRITE_POLICY,
+        preempt=True,
+        on_job_added=None,
+    ):
+        if max_concurrent < 1 or max_per_host < 1:
+            raise ValueError(
+                "Les limites de concurrence doivent être supérieures ou égales à 1"
+            )
+
+        self.max_concurrent = max_concurrent
+        self.max_per_host = max_per_host
+        self.segments = segments
+        self.on_progress = on_progress
+        self.on_status = on_status
+        self.on_job_done = on_job_done
+        self.on_job_added = on_job_added
+        self.bucket = TokenBucket(rate_limit)
+        self.per_download_rate = per_download_rate
+        self.cache = cache
+        self.skip_head = skip_head
+        self.retry_policy = retry_policy
+        self.extract = extract
+        self.write_policy = write_policy
+        self.store = store
+        self.probe_ahead = 0 if skip_head else probe_ahead
+        self.preempt = preempt
+        self.progress = ProgressAggregator()
+        self.ticker = None
+        if on_progress is not None:
+            self.ticker = ProgressTicker(self.progress, on_progress, progress_interval)
+
+        if session is None:
+            # Pool assez grand pour tous les segments de tous les jobs d'un hôte
+            session = create_session(
+                pool_size=pool_size or max_per_host * max(segments, 1),
+                pool_hosts=max_concurrent,
+            )
+        self.session = session
+
+        self.jobs = []
+        self.by_id = {}
+        self.ids = itertools.count(1)
+        self.arrivals = itertools.count()
+        self.pending = PendingJobs()
+        self.active = set()  # Jobs en cours de transfert
+        self.running_per_host = collections.Counter()
+        self.running = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.workers = []
+        self.probers = []
+
+    def add(
+        self,
+        url,
+        folder,
+        filename=None,
+        mirrors=(),
+        checksum=None,
+        priority=0,
+        deadline=None,
+    ):
+        """
+        Ajoute une URL (et ses miroirs, sa somme de contrôle éventuels) à la
+        file et retourne le job créé. priority: plus grand passe avant (0 par
+        défaut); deadline: horodatage Unix souhaité pour la fin, ou None.
+        """
+        job = DownloadJob(
+            url,
+            folder,
+            filename,
+            mirrors=mirrors,
+            checksum=checksum,
+            priority=priority,
+            deadline=deadline,
+        )
+        if self.closed:
+            raise RuntimeError("La file d'attente est fermée")
+        if self.store is not None:
+            job.id = self.store.add(
+                url,
+                folder,
+                filename,
+                mirrors,
+                checksum,
+                priority=priority,
+                deadline=deadline,
+            )
+        else:
+            job.id = next(self.ids)
+        return self._enqueue(job)
+
+    def restore(self):
+        """Remet en file les jobs inachevés du JobStore (lancement précédent)"""
+        if self.store is None:
+            return []
+        jobs = []
+        for stored in self.store.unfinished():
+            # Même fichier cible qu'avant l'interruption: son journal permet la reprise
+            filename = stored.filename
+            if filename is None and stored.file_path:
+                filename = os.path.basename(stored.file_path)
+            job = DownloadJob(
+                stored.url,
+                stored.folder,
+                filename,
+                mirrors=stored.mirrors,
+                checksum=stored.checksum,
+                id=stored.id,
+                priority=stored.priority,
+                deadline=stored.deadline,
+            )
+            # Taille et progression du lancement précédent: classement sans attendre
+            # la sonde
+            job.size, job.downloaded = stored.total_size, stored.downloaded
+            jobs.append(self._enqueue(job))
+        return jobs
+
+    def _enqueue(self, job):
+        job.manager = DownloadManager(
+            session=self.session,
+            segments=self.segments,
+            on_status=self._job_callback(job, self.on_status),
+            rate_limit=self.per_download_rate,
+            shared_bucket=self.bucket,
+            cache=self.cache,
+            skip_head=self.skip_head,
+            retry_policy=self.retry_policy,
+            extract=self.extract,
+            write_policy=self.write_policy,
+        )
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("La file d'attente est fermée")
+            job.seq = next(self.arrivals)
+            self.jobs.append(job)
+            self.by_id[job.id] = job
+            self.pending.push(job)
+            if self.probers:
+                # Un worker et les threads de sonde
+                self.condition.notify_all()
+            else:
+                self.condition.notify()
+            victim = self._preemption_victim(job)
+        self._interrupt(victim)
+        if self.on_job_added is not None:
+            self.on_job_added(job)
+        return job
+
+    def get(self, job_id):
+        """Job d'identifiant job_id, ou None"""
+        return self.by_id.get(job_id)
+
+    def add_many(self, urls, folder, priority=0, deadline=None):
+        """Ajoute plusieurs URL à la file"""
+        return [
+            self.add(url, folder, priority=priority, deadline=deadline) for url in urls
+        ]
+
+    def add_from_file(self, path, folder):
+        """Ajoute toutes les URL d'un fichier texte à la file"""
+        return self.add_many(read_url_file(path), folder)
+
+    @staticmethod
+    def _job_callback(job, callback):
+        if callback is None:
+            return None
+        return lambda *args: callback(job, *args)
+
+    def start(self):
+        """Démarre les threads de travail"""
+        if self.ticker is not None:
+            self.ticker.start()
+        with self.condition:
+            missing = self.max_concurrent - len(self.workers)
+            for _ in range(missing):
+                worker = threading.Thread(target=self._worker)
+                worker.daemon = True
+                self.workers.append(worker)
+                worker.start()
+            for _ in range(
+                min(self.probe_ahead, MAX_PROBE_THREADS) - len(self.probers)
+            ):
+                prober = threading.Thread(target=self._prober)
+                prober.daemon = True
+                self.probers.append(prober)
+                prober.start()
+
+    def close(self):
+        """N'accepte plus de jobs; les workers s'arrêtent une fois la file vide"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def join(self, timeout=None):
+        """Attend la fin de tous les jobs ajoutés. Retourne True si la file est vide"""
+        with self.condition:
+            idle = self.condition.wait_for(
+                lambda: not self.pending and self.running == 0, timeout
+            )
+            finished = idle and self.closed
+        if finished and self.ticker is not None:
+            self.ticker.stop()
+        return idle
+
+    def run(self, urls=(), folder="."):
+        """Ajoute les URL, exécute toute la file et retourne la liste des jobs"""
+        self.add_many(urls, folder)
+        self.start()
+        self.close()
+        self.join()
+        return list(self.jobs)
+
+    def set_rate_limit(self, rate, job=None):
+        """Change la limite globale, ou celle d'un job (octets/s, None: illimité)"""
+        if job is None:
+            self.bucket.set_rate(rate)
+        else:
+            job.manager.set_rate_limit(rate)
+
+    def set_priority(self, job, priority, deadline=None):
+        """Change la priorité et l'échéance (horodatage Unix, None: aucune) d'un job"""
+        with self.condition:
+            job.priority = priority
+            job.deadline = deadline
+            self.pending.update(job)
+            victim = self._preemption_victim(job)
+        if self.store is not None and job.id is not None:
+            self.store.set_priority(job.id, priority, deadline)
+        self._interrupt(victim)
+
+    def pause(self, job):
+        job.manager.pause()
+
+    def resume(self, job):
+        job.manager.resume()
+
+    def cancel(self, job, remove_partial=True):
+        """Annule un job, qu'il soit en attente ou en cours"""
+        with self.condition:
+            was_pending = job.status == PENDING and job in self.pending
+            if was_pending:
+                self.pending.remove(job)
+                self._finish(job, CANCELLED)
+            else:
+                # Sous le verrou: le worker ne peut plus le remettre en file
+                job.manager.cancel(remove_partial=remove_partial)
+            # Annulé pour de bon, même si une préemption est en cours
+            job.preempted = False
+
+        if was_pending:
+            if remove_partial:
+                # Fichier partiel d'un transfert préempté
+                job.manager.discard_partial()
+            self._store_status(job, CANCELLED, remove_partial)
+            self._job_done(job)
+
+    def cancel_all(self, remove_partial=True):
+        """Annule tous les jobs en attente et en cours"""
+        for job in list(self.jobs):
+            if job.status in (PENDING, RUNNING):
+                self.cancel(job, remove_partial=remove_partial)
+
+    def _next_job(self):
+        """Job en attente le plus urgent dont l'hôte est sous sa limite (verrou tenu)"""
+        return self.pending.pop(
+            lambda job: self.running_per_host[job.host] < self.max_per_host
+        )
+
+    def _preemptible(self, job):
+        """job en cours peut-il être interrompu et repris plus tard sans perte ?"""
+        manager = job.manager
+        remaining = job.remaining_size()
+        return (
+            not job.preempted
+            and not manager.is_paused
+            and not manager.is_cancelled
+            and manager.accepts_ranges
+            and manager.journal is not None
+            and remaining is not None
+            and remaining >= PREEMPT_MIN_REMAINING
+        )
+
+    def _preemption_victim(self, job):
+        """
+        Job en cours à interrompre pour que job, en attente et plus urgent,
+        démarre sans attendre, ou None (verrou tenu). Le job retenu est
+        marqué préempté: sa place reste comptée jusqu'à sa remise en file.
+        """
+        if not self.preempt or not self.workers or job not in self.pending:
+            return None
+        host_full = self.running_per_host[job.host] >= self.max_per_host
+        if not host_full and self.running < self.max_concurrent:
+            return None  # Place libre: un worker va le prendre
+        rank = job.rank()
+        candidates = [
+            running
+            for running in self.active
+            # Hôte saturé: seul un job du même hôte libère une place utile
+            if (not host_full or running.host == job.host)
+            and self._preemptible(running)
+            and rank < running.rank()
+        ]
+        if not candidates:
+            return None
+        victim = max(candidates, key=DownloadJob.rank)
+        victim.preempted = True
+        return victim
+
+    def _interrupt(self, victim):
+        """Interrompt un job préempté, fichier partiel conservé (hors verrou)"""
+        if victim is None:
+            return
+        with self.condition:
+            if not victim.preempted:
+                return  # Annulé entre-temps par l'utilisateur
+            victim.manager.cancel(remove_partial=False)
+        victim.manager.report_status(
+            "⏸️ Interrompu au profit d'un téléchargement plus urgent, reprise plus tard"
+        )
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                job = None
+                while job is None:
+                    job = self._next_job()
+                    if job is None:
+                        if self.closed and not self.pending:
+                            return
+                        self.condition.wait()
+                job.status = RUNNING
+                self.running += 1
+                self.running_per_host[job.host] += 1
+                self.active.add(job)
+                probe, job.probe = job.probe, None
+
+            if probe is not None and time.monotonic() - probe[0] <= PROBE_MAX_AGE:
+                job.manager.prefetched = (job.url, probe[1])
+            self.progress.track(job, job.manager)
+            status = FAILED
+            try:
+                # Dans le try: une base en erreur fait échouer le job, pas le worker
+                if self.store is not None and job.id is not None:
+                    self.store.set_status(job.id, RUNNING)
+                    self.store.track(job.id, job.manager)
+                completed = job.manager.download(
+                    job.url, job.folder, job.filename, job.mirrors, job.checksum
+                )
+                status = COMPLETED if completed else CANCELLED
+            except Exception as e:
+                job.error = e
+            self.progress.untrack(job)
+
+            if job.preempted and status == CANCELLED:
+                # Enregistré avant la remise en file et hors verrou: un autre
+                # worker peut reprendre le job dès qu'il est en file. Si
+                # l'utilisateur l'annule entre-temps, l'état final écrit
+                # plus bas remplace celui-ci.
+                self._store_status(job, PENDING)
+            with self.condition:
+                # Constat et remise en file sous le verrou: une annulation par
+                # l'utilisateur passe avant ou après, jamais entre les deux
+                preempted = job.preempted and status == CANCELLED
+                job.preempted = False
+                if preempted:
+                    self._requeue(job)
+            if preempted:
+                continue
+            if status == CANCELLED and job.manager.remove_partial:
+                # Annulé par l'utilisateur après la fin d'un transfert préempté
+                job.manager.discard_partial()
+            self._store_status(job, status, job.manager.remove_partial)
+
+            # Prévenir l'appelant avant que join() ne puisse rendre la main
+            job.status = status
+            self._job_done(job)
+
+            with self.condition:
+                self.running -= 1
+                self.running_per_host[job.host] -= 1
+                self.active.discard(job)
+                self._finish(job, status)
+
+    def _requeue(self, job):
+        """Remet en file un job préempté, repris depuis son journal (verrou tenu)"""
+        manager = job.manager
+        file_path = manager.file_path
+        job.size, job.downloaded = manager.total_size, manager.downloaded_size
+        if job.filename is None and file_path:
+            # Même fichier cible à la reprise, comme restore()
+            job.filename = os.path.basename(file_path)
+        manager.reset()
+        # Fichier partiel connu: cancel() le supprime si le job n'est pas repris
+        manager.file_path = file_path
+        self.running -= 1
+        self.running_per_host[job.host] -= 1
+        self.active.discard(job)
+        job.status = PENDING
+        self.pending.push(job)
+        self.condition.notify_all()
+
+    def _next_probe(self):
+        """Job en attente le plus urgent encore à sonder, ou None (verrou tenu)"""
+        while True:
+            job = self.pending.next_unprobed()
+            if job is None:
+                return None
+            job.probed = True
+            # Miroirs: sondés ensemble par le worker, pour les comparer
+            if not job.mirrors:
+                return job
+
+    def _prober(self):
+        while True:
+            with self.condition:
+                job = None
+                while job is None:
+                    if self.closed and not self.pending:
+                        return
+                    job = self._next_probe()
+                    if job is None:
+                        self.condition.wait()
+
+            # Fichier en cache: le worker enverra un HEAD conditionnel
+            if self.cache is not None and self.cache.lookup(job.url) is not None:
+                continue
+            try:
+                response = job.manager.head(job.url, job.manager.get_headers())
+            except Exception:
+                # Le worker refera la sonde, avec ses nouvelles tentatives
+                continue
+            with self.condition:
+                if job.status == PENDING:
+                    job.probe = (time.monotonic(), response)
+                    # Taille connue: le job se range parmi les plus courts
+                    job.size = response_total_size(response)
+                    self.pending.update(job)
+                    victim = self._preemption_victim(job)
+                else:
+                    victim = None
+            self._interrupt(victim)
+
+    def _finish(self, job, status):
+        """Marque un job terminé et réveille les workers en attente (verrou tenu)"""
+        job.status = status
+        job.done.set()
+        self.condition.notify_all()
+
+    def _store_status(self, job, status, remove_partial=True):
+        """Enregistre l'état final d'un job; interrompu sans perte, il sera repris"""
+        if self.store is None or job.id is None:
+            return
+        if status == CANCELLED and not remove_partial:
+            status = PENDING
+        self.store.untrack(job.id)
+        error = str(job.error) if job.error is not None else None
+        self.store.set_status(job.id, status, error, manager=job.manager)
+
+    def _job_done(self, job):
+        """Prévient l'appelant, hors verrou, qu'un job est terminé"""
+        if self.on_job_done is not None:
+            self.on_job_done(job)
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Téléchargement segmenté par requêtes HTTP Range
+"""
+
+import functools
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from .output import PartFile
+from .streaming import (
+    CoalescingWriter,
+    ConnectionReleased,
+    CpuTimer,
+    IncompleteTransferError,
+    iter_adaptive,
+)
+
+# Taille minimale d'un segment et nombre de segments par défaut
+MIN_SEGMENT_SIZE = 1024 * 1024
+DEFAULT_SEGMENTS = 4
+
+
+class RangeNotSupportedError(Exception):
+    """Le serveur n'a pas répondu 206 à une requête Range"""
+
+
+class Piece:
+    """
+    Plage [start, end] confiée à une connexion. Un autre thread peut en céder
+    la fin (split()): la connexion réserve chaque bloc par take(), sous le
+    même verrou, pour qu'aucun octet ne soit reçu ni compté deux fois.
+    """
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.position = start  # Prochain octet à écrire
+        self.lock = threading.Lock()
+
+    @property
+    def remaining(self):
+        return self.end + 1 - self.position
+
+    def take(self, size):
+        """Réserve jusqu'à size octets depuis position; retourne le nombre réservé"""
+        with self.lock:
+            size = max(min(size, self.end + 1 - self.position), 0)
+            self.position += size
+            return size
+
+    def split(self, min_size):
+        """
+        Cède la seconde moitié du reste (Piece), ou None s'il reste moins de
+        2 * min_size octets
+        """
+        with self.lock:
+            remaining = self.end + 1 - self.position
+            if remaining < 2 * min_size:
+                return None
+            middle = self.position + remaining // 2
+            stolen = Piece(middle, self.end)
+            self.end = middle - 1
+            return stolen
+
+
+class SegmentedDownloader:
+    """
+    Téléchargement segmenté: le fichier est découpé en plages d'octets
+    récupérées en parallèle, chacune écrite à sa position dans un fichier
+    préalloué (``<fichier>.part``, renommé à la fin).
+
+    Avec un ResumeJournal, chaque écriture y est consignée et seules les
+    plages manquantes sont demandées, protégées par If-Range.
+    """
+
+    def __init__(
+        self, download_manager, url, headers, total_size, segments=DEFAULT_SEGMENTS
+    ):
+        self.download_manager = download_manager
+        self.url = url
+        self.headers = dict(headers)
+        # Les plages portent sur la représentation brute: pas de compression
+        self.headers["Accept-Encoding"] = "identity"
+        self.total_size = total_size
+        self.segments = segments
+        self.failed = threading.Event()
+        # Octets reçus par segment: un compteur par thread, donc sans verrou
+        self.received = []
+
+    @staticmethod
+    def split_ranges(total_size, segments):
+        """Découpe le fichier en plages (début, fin) inclusives"""
+        return SegmentedDownloader.split_missing([(0, total_size - 1)], segments)
+
+    @staticmethod
+    def split_missing(missing, segments):
+        """
+        Redécoupe des plages (début, fin) inclusives pour occuper environ
+        `segments` connexions, sans descendre sous MIN_SEGMENT_SIZE.
+        """
+        remaining = sum(end - start + 1 for start, end in missing)
+        size = max(MIN_SEGMENT_SIZE, -(-remaining // max(segments, 1)))
+        ranges = []
+        for start, end in missing:
+            count = max(1, (end - start + 1) // size)
+            step = (end - start + 1) // count
+            for i in range(count):
+                part_start = start + i * step
+                part_end = end if i == count - 1 else part_start + step - 1
+                ranges.append((part_start, part_end))
+        return ranges
+
+    def fetch_segment(self, part, start, end, journal=None, slot=0):
+        """
+        Télécharge une plage et l'écrit à son offset dans le PartFile part.
+        Une connexion perdue ou libérée en pause est rouverte à partir du
+        dernier octet écrit.
+        """
+        manager = self.download_manager
+        segment = Piece(start, end)
+        failures = 0
+        while segment.remaining > 0 and not (
+            manager.is_cancelled or self.failed.is_set()
+        ):
+            position = segment.position
+            try:
+                self._fetch_range(part, segment, journal, slot)
+            except ConnectionReleased:
+                continue
+            except Exception as e:
+                if segment.position > position:
+                    failures = 0  # Le compteur ne porte que sur les échecs sans progrès
+                if self.failed.is_set() or not manager.retry_wait(
+                    e, failures, self.url
+                ):
+                    raise
+                failures += 1
+                continue
+            if segment.remaining > 0 and not (
+                manager.is_cancelled or self.failed.is_set()
+            ):
+                error = IncompleteTransferError(
+                    f"Segment {start}-{end} incomplet "
+                    f"({segment.position - start} octets reçus)"
+                )
+                if not manager.retry_wait(error, failures, self.url):
+                    raise error
+                failures += 1
+
+    def _fetch_range(self, part, segment, journal, slot):
+        """Requête Range pour le reste de segment; segment.position suit chaque bloc"""
+        manager = self.download_manager
+        start, end = segment.position, segment.end
+        headers = dict(self.headers)
+        headers["Range"] = f"bytes={start}-{end}"
+        if journal is not None and journal.if_range():
+            headers["If-Range"] = journal.if_range()
+
+        response = manager.session.get(
+            self.url, headers=headers, stream=True, timeout=30
+        )
+        try:
+            response.raise_for_status()
+            content_range = response.headers.get("content-range", "")
+            if response.status_code != 206 or not content_range.startswith(
+                f"bytes {start}-"
+            ):
+                raise RangeNotSupportedError(
+                    f"Réponse {response.status_code} pour la plage {start}-{end}"
+                )
+
+            # Écritures positionnelles (pwrite), par l'étage d'écriture du
+            # PartFile s'il y en a un: le journal ne consigne que des octets
+            # déjà transmis au système. Le writer est vidé avant toute
+            # exception: segment.position reste exact pour une reprise
+            with CpuTimer(manager.stats) as timer:
+                writer = CoalescingWriter(
+                    part.at(start),
+                    start,
+                    on_flush=manager.written if journal is not None else None,
+                    stats=manager.stats,
+                    disk_writer=part.disk_writer,
+                )
+                try:
+                    for chunk in iter_adaptive(
+                        response, limiter=manager.limiter, stats=manager.stats
+                    ):
+                        # Ne jamais déborder sur le segment suivant
+                        if len(chunk) > segment.remaining:
+                            chunk = chunk[: segment.remaining]
+                        writer.write(chunk)
+                        segment.position += len(chunk)
+                        timer.nbytes += len(chunk)
+                        self.received[slot] += len(chunk)
+                        if segment.remaining <= 0 or self.failed.is_set():
+                            break
+                        if not manager.checkpoint(response):
+                            break
+                finally:
+                    writer.flush()
+        finally:
+            response.close()
+
+    def tasks(self, part, missing, journal):
+        """Travaux à exécuter en parallèle, un par segment (slot: indice du compteur)"""
+        ranges = self.split_missing(missing, self.segments)
+        return [
+            functools.partial(self.fetch_segment, part, start, end, journal, slot)
+            for slot, (start, end) in enumerate(ranges)
+        ]
+
+    def run(self, file_path, journal=None):
+        """
+        Lance le téléchargement segmenté.
+
+        Retourne True si le fichier est complet, False si annulé.
+        Lève RangeNotSupportedError si le serveur ignore les requêtes Range.
+        En cas d'erreur, le fichier partiel et le journal sont conservés
+        pour une reprise ultérieure.
+        """
+        manager = self.download_manager
+        missing = (
+            journal.missing_ranges()
+            if journal is not None
+            else [(0, self.total_size - 1)]
+        )
+        manager.downloaded_size = self.total_size - sum(
+            end - start + 1 for start, end in missing
+        )
+        resumed_size = manager.downloaded_size
+        error = None
+
+        # Un seul descripteur préalloué, partagé par tous les segments; le
+        # contenu d'un fichier à reprendre est conservé
+        with PartFile(
+            file_path,
+            self.total_size,
+            resume=resumed_size > 0,
+            write_policy=manager.write_policy,
+            stats=manager.stats,
+        ) as part, ThreadPoolExecutor(max_workers=self.segments) as pool:
+            tasks = self.tasks(part, missing, journal)
+            self.received = [0] * len(tasks)
+            pending = {pool.submit(task) for task in tasks}
+            try:
+                while pending:
+                    done, pending = wait(
+                        pending, timeout=0.1, return_when=FIRST_EXCEPTION
+                    )
+                    for future in done:
+                        if future.exception() is not None and error is None:
+                            error = future.exception()
+                            self.failed.set()
+                    # Seul ce thread écrit downloaded_size; l'affichage l'échantillonne
+                    manager.downloaded_size = resumed_size + sum(self.received)
+            except BaseException:
+                # Interruption (Ctrl+C...): arrêter les workers avant de sortir
+                self.failed.set()
+                raise
+
+        if error is not None or manager.is_cancelled:
+            if journal is not None:
+                journal.save(force=True)
+            if error is not None:
+                raise error
+            return False
+
+        if journal is not None:
+            # Vérification éventuelle, renommage et suppression du journal
+            return manager.finish_part()
+        os.replace(part.path, file_path)
+        return True
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+Boucle de transfert: lectures adaptatives et écritures regroupées
+
+- AdaptiveChunkSize fait grandir la taille de lecture avec le débit observé
+  (64 Ko à 4 Mo), pour limiter le coût Python par bloc sur les liens rapides
+  tout en gardant pause/annulation réactives sur les liens lents.
+- CoalescingWriter regroupe les blocs reçus dans un bytearray réutilisé et
+  ne l'écrit qu'une fois plein: peu d'appels système, aucune allocation par
+  écriture.
+- TransferStats mesure le temps CPU des threads de transfert, rapporté au Go,
+  et sépare l'attente réseau du temps d'écriture disque (aussi transmis à
+  METRICS, voir metrics.py).
+"""
+
+import threading
+import time
+
+from requests.exceptions import ChunkedEncodingError, ConnectionError
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+from .metrics import METRICS, ReadTimer
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Durée visée pour une lecture: au-delà, pause et progression traînent
+TARGET_READ_INTERVAL = 0.05
+
+
+class ConnectionReleased(Exception):
+    """La connexion a été fermée pendant une longue pause et doit être rouverte"""
+
+
+class IncompleteTransferError(IOError):
+    """Le flux s'est terminé avant la fin de la plage demandée"""
+
+
+class MissingRangesError(IncompleteTransferError):
+    """Transfert terminé, mais des plages manquent au journal du fichier partiel"""
+
+
+def check_part_complete(journal):
+    """
+    MissingRangesError si le journal a encore des plages manquantes, avant de
+    renommer le fichier partiel: un morceau confié à l'étage d'écriture dont
+    l'écriture a échoué n'y figure pas. Fichier partiel et journal sont
+    conservés pour la reprise.
+    """
+    if journal is None:
+        return
+    missing = journal.missing_ranges()
+    if missing:
+        journal.save(force=True)
+        raise MissingRangesError(
+            f"Fichier partiel incomplet: {len(missing)} plage(s) manquante(s), "
+            f"{sum(end - start + 1 for start, end in missing)} octets"
+        )
+
+
+def write_all(file, data):
+    """Écrit data en entier dans un fichier ouvert sans buffer (buffering=0)"""
+    view = memoryview(data)
+    while view:
+        written = file.write(view)
+        view = view[written:]
+
+
+class AdaptiveChunkSize:
+    """Taille de lecture ajustée pour qu'une lecture dure environ target_interval"""
+
+    def __init__(
+        self,
+        initial=MIN_CHUNK_SIZE,
+        minimum=MIN_CHUNK_SIZE,
+        maximum=MAX_CHUNK_SIZE,
+        target_interval=TARGET_READ_INTERVAL,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_interval = target_interval
+        self.size = max(minimum, min(initial, maximum))
+
+    def update(self, nbytes, elapsed):
+        """Ajuste la taille d'après la dernière lecture (octets, secondes)"""
+        if nbytes < self.size:
+            # Lecture courte (fin de flux): rien à apprendre
+            return self.size
+        ideal = nbytes / elapsed * self.target_interval if elapsed > 0 else self.maximum
+        if ideal >= self.size * 2 and self.size < self.maximum:
+            self.size = min(self.size * 2, self.maximum)
+        elif ideal < self.size / 4 and self.size > self.minimum:
+            self.size = max(self.size // 2, self.minimum)
+        return self.size
+
+
+def iter_adaptive(response, chunk_size=None, limiter=None, stats=None):
+    """
+    Itère sur le corps d'une réponse requests (stream=True) avec une taille
+    de lecture adaptative. Équivalent de response.iter_content(), erreurs
+    comprises, sans décoder le Content-Encoding (fichier enregistré tel
+    qu'envoyé). limiter (RateLimiter) borne les lectures et les cadence;
+    l'attente réseau et les blocages sont comptés dans stats (TransferStats).
+    """
+    chunk_size = chunk_size or AdaptiveChunkSize()
+    raw = response.raw
+    timer = ReadTimer(stats.host, stats) if stats is not None else None
+    try:
+        while True:
+            size = chunk_size.size
+            if limiter is not None:
+                size = min(size, limiter.max_read() or size)
+            started = time.perf_counter()
+            # Octets tels qu'envoyés: Content-Length et plages portent sur eux
+            chunk = raw.read(size, decode_content=False)
+            elapsed = time.perf_counter() - started
+            if timer is not None:
+                timer.add(elapsed)
+            if not chunk:
+                break
+            chunk_size.update(len(chunk), elapsed)
+            if limiter is not None:
+                limiter.throttle(len(chunk))
+            yield chunk
+    except ProtocolError as e:
+        raise ChunkedEncodingError(e)
+    except ReadTimeoutError as e:
+        raise ConnectionError(e)
+    finally:
+        if timer is not None:
+            timer.flush()
+        response.close()
+
+
+class CoalescingWriter:
+    """
+    Regroupe les écritures dans un tampon réutilisé.
+
+    on_flush(offset, data) est appelé après chaque écriture réelle, une
+    fois les octets transmis au système: c'est là qu'il faut les consigner
+    dans le journal de reprise (et les vérifier). data n'est valable que
+    pendant l'appel. Ne pas oublier flush() en fin de transfert. Le temps
+    passé dans les écritures est compté dans stats (TransferStats).
+
+    disk_writer: DiskWriter (download.output) à qui confier les écritures,
+    faites alors hors du thread appelant; les blocs passés à write() ne
+    doivent plus être modifiés. on_flush est appelé par le thread
+    d'écriture, stats est celui du DiskWriter.
+    """
+
+    def __init__(
+        self,
+        file,
+        offset=0,
+        buffer_size=WRITE_BUFFER_SIZE,
+        on_flush=None,
+        stats=None,
+        disk_writer=None,
+    ):
+        self.file = file
+        self.offset = offset
+        self.disk_writer = disk_writer
+        self.buffer = (
+            bytearray(buffer_size)
+            if disk_writer is None
+            else disk_writer.buffer(buffer_size)
+        )
+        self.view = memoryview(self.buffer)
+        self.used = 0
+        self.on_flush = on_flush
+        self.stats = stats
+
+    def write(self, data):
+        size = len(data)
+        if self.used == 0 and size >= len(self.buffer):
+            # Bloc déjà assez gros: écriture directe, sans copie
+            self._write(data, size)
+            return
+        position = 0
+        while position < size:
+            count = min(size - position, len(self.buffer) - self.used)
+            self.view[self.used : self.used + count] = data[position : position + count]
+            self.used += count
+            position += count
+            if self.used == len(self.buffer):
+                self.flush()
+
+    def flush(self):
+        """Écrit le contenu du tampon"""
+        if self.used:
+            used = self.used
+            self.used = 0
+            if self.disk_writer is None:
+                self._write(self.view[:used], used)
+                return
+            # Le tampon plein part vers le thread d'écriture, un autre prend sa place
+            buffer = self.buffer
+            self.view.release()
+            self.buffer = self.disk_writer.buffer(len(buffer))
+            self.view = memoryview(self.buffer)
+            self.disk_writer.submit(
+                self.offset, buffer, used, self.on_flush, recycle=True
+            )
+            self.offset += used
+
+    def _write(self, data, size):
+        if self.disk_writer is not None:
+            self.disk_writer.submit(self.offset, data, size, self.on_flush)
+            self.offset += size
+            return
+        started = time.perf_counter()
+        write_all(self.file, data)
+        if self.stats is not None:
+            self.stats.add_disk(size, time.perf_counter() - started)
+        offset = self.offset
+        self.offset += size
+        if self.on_flush is not None:
+            self.on_flush(offset, data)
+
+
+class TransferStats:
+    """Octets, durée et temps CPU d'un transfert (tous threads confondus)"""
+
+    def __init__(self, host=None):
+        self.host = host or ""
+        self.bytes = 0
+        self.cpu_seconds = 0.0
+        self.retries = 0
+        self.decoded_bytes = 0  # Octets produits par la décompression
+        self.encoded_bytes = 0  # Octets compressés qu'elle a lus
+        self.decode_seconds = 0.0
+        self.network_seconds = 0.0  # Attente des lectures réseau
+        self.disk_seconds = 0.0  # Écritures dans le fichier partiel
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self.started = time.perf_counter()
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def add(self, nbytes, cpu_seconds):
+        """Ajoute le travail d'un thread de transfert"""
+        with self.lock:
+            self.bytes += nbytes
+            self.cpu_seconds += cpu_seconds
+
+    def add_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def add_decoded(self, nbytes, encoded_bytes, seconds):
+        """Ajoute le travail de la décompression (octets produits, octets lus, durée)"""
+        with self.lock:
+            self.decoded_bytes += nbytes
+            self.encoded_bytes += encoded_bytes
+            self.decode_seconds += seconds
+
+    def add_network(self, seconds, stalls=0, stall_seconds=0.0):
+        """Ajoute l'attente réseau (et les blocages) d'un thread de transfert"""
+        with self.lock:
+            self.network_seconds += seconds
+            self.stalls += stalls
+            self.stall_seconds += stall_seconds
+
+    def add_disk(self, nbytes, seconds):
+        """Ajoute une écriture de nbytes octets sur disque"""
+        with self.lock:
+            self.disk_seconds += seconds
+        METRICS.disk_write(self.host, nbytes, seconds)
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def wall_seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def cpu_per_gb(self):
+        """Secondes CPU par Go transféré"""
+        if not self.bytes:
+            return 0.0
+        return self.cpu_seconds / (self.bytes / (1024**3))
+
+    def to_dict(self):
+        """Mesures du transfert, pour le journal JSON lines"""
+        return {
+            "bytes": self.bytes,
+            "seconds": round(self.wall_seconds, 3),
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "network_seconds": round(self.network_seconds, 3),
+            "disk_seconds": round(self.disk_seconds, 3),
+            "stalls": self.stalls,
+            "stall_seconds": round(self.stall_seconds, 3),
+            "retries": self.retries,
+            "decoded_bytes": self.decoded_bytes,
+        }
+
+    def summary(self):
+        mb = self.bytes / (1024 * 1024)
+        speed = mb / self.wall_seconds if self.wall_seconds > 0 else 0
+        summary = (
+            f"{mb:.2f} MB en {self.wall_seconds:.2f} s ({speed:.2f} MB/s), "
+            f"CPU {self.cpu_seconds:.2f} s ({self.cpu_per_gb:.2f} s/Go)"
+        )
+        if self.decoded_bytes:
+            decoded = self.decoded_bytes / (1024 * 1024)
+            ratio = self.decoded_bytes / self.encoded_bytes if self.encoded_bytes else 0
+            decoded_speed = decoded / self.wall_seconds if self.wall_seconds > 0 else 0
+            summary += (
+                f", {decoded:.2f} MB décompressés "
+                f"(x{ratio:.2f}, {decoded_speed:.2f} MB/s)"
+            )
+        if self.network_seconds or self.disk_seconds:
+            summary += (
+                f", attente réseau {self.network_seconds:.2f} s, "
+                f"disque {self.disk_seconds:.2f} s"
+            )
+        if self.stalls:
+            summary += f", {self.stalls} blocage(s) ({self.stall_seconds:.1f} s)"
+        if self.retries:
+            summary += f", {self.retries} nouvelle(s) tentative(s)"
+        return summary
+
+
+class CpuTimer:
+    """Mesure le temps CPU du thread courant pendant un bloc with"""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.nbytes = 0
+
+    def __enter__(self):
+        self.started = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        if self.stats is not None:
+            self.stats.add(self.nbytes, time.thread_time() - self.started)
+        return False
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Couche de transport HTTP partagée
+
+Une seule session requests par file de téléchargements: ses connexions
+keep-alive sont réutilisées d'un job à l'autre au lieu de refaire TCP+TLS
+pour chaque fichier. Le pool par hôte est dimensionné pour tous les
+segments simultanés (au-delà, urllib3 fermerait les connexions rendues).
+
+S'y ajoutent un cache DNS optionnel (install_dns_cache(): résolutions
+gardées ttl secondes, pour tout le processus) et une sonde
+GET ``Range: bytes=0-`` qui remplace la requête HEAD: taille et support des
+plages sont connus dès la première réponse, dont le corps sert ensuite de
+flux de téléchargement.
+
+Chaque session mesure pour METRICS la durée des connexions (TCP + TLS),
+le délai jusqu'aux en-têtes de réponse (TTFB) et les codes reçus.
+"""
+
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .metrics import METRICS
+
+# Connexions gardées ouvertes par hôte, et hôtes distincts gardés en pool
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_HOSTS = 10
+
+# Durée de vie d'une résolution DNS en cache, en secondes (cache activé à la demande)
+DNS_CACHE_TTL = 300.0
+
+
+class TimedConnectionMixin:
+    """Connexion urllib3 dont l'établissement est mesuré dans METRICS"""
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        host = (
+            self.host
+            if self.port in (None, self.default_port)
+            else f"{self.host}:{self.port}"
+        )
+        METRICS.connected(host, time.perf_counter() - started)
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter dont les pools mesurent la durée des connexions"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def record_response(response, *args, **kwargs):
+    """Hook requests: code de réponse et TTFB (response.elapsed) dans METRICS"""
+    METRICS.response(
+        urlparse(response.url).netloc,
+        response.status_code,
+        response.elapsed.total_seconds(),
+    )
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, pool_hosts=DEFAULT_POOL_HOSTS):
+    """Session requests avec pool_size connexions réutilisables par hôte"""
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.hooks["response"].append(record_response)
+    return session
+
+
+class DNSCache:
+    """
+    Cache des résultats de socket.getaddrinfo, pour tous les clients HTTP
+    du processus (requests et httpx). Les échecs ne sont pas mis en cache.
+    """
+
+    def __init__(self, ttl=DNS_CACHE_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.resolve = socket.getaddrinfo
+
+    def getaddrinfo(self, *args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        result = self.resolve(*args, **kwargs)
+        with self.lock:
+            self.entries[key] = (now + self.ttl, result)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_dns_cache = None
+
+
+def install_dns_cache(ttl=DNS_CACHE_TTL):
+    """
+    Active le cache DNS pour tout le processus (remplace socket.getaddrinfo):
+    à réserver aux programmes dont c'est le seul usage du réseau, jamais
+    activé implicitement. Un second appel change seulement la durée de vie.
+    Retourne le DNSCache.
+    """
+    global _dns_cache
+    if _dns_cache is None:
+        _dns_cache = DNSCache(ttl)
+        socket.getaddrinfo = _dns_cache.getaddrinfo
+    else:
+        _dns_cache.ttl = ttl
+    return _dns_cache
+
+
+def uninstall_dns_cache():
+    """Rétablit la résolution DNS d'origine"""
+    global _dns_cache
+    if _dns_cache is not None:
+        socket.getaddrinfo = _dns_cache.resolve
+        _dns_cache = None
+
+
+def probe_get(session, url, headers, timeout=30):
+    """
+    Sonde url par un GET ``Range: bytes=0-`` (corps non lu): même
+    information qu'un HEAD, sans aller-retour supplémentaire puisque la
+    réponse peut servir de flux pour télécharger le fichier depuis le début.
+    """
+    headers = dict(headers)
+    headers["Range"] = "bytes=0-"
+    return session.get(
+        url, headers=headers, stream=True, allow_redirects=True, timeout=timeout
+    )
+
+
+def response_total_size(response):
+    """
+    Taille de la ressource: Content-Range d'une réponse 206, sinon
+    Content-Length; 0 (inconnue) si l'en-tête manque ou est illisible
+    """
+    if response.status_code == 206:
+        total = response.headers.get("content-range", "").rpartition("/")[2]
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get("content-length", "").strip()
+    return int(length) if length.isdigit() else 0
+
+
+def response_accepts_ranges(response):
+    """Le serveur accepte-t-il les Range (réponse 206 ou Accept-Ranges: bytes) ?"""
+    return (
+        response.status_code == 206
+        or response.headers.get("accept-ranges", "").lower() == "bytes"
+    )
@@ -3,7 +3,7 @@
 """
 PytDm - Python Download Manager
 Interface graphique de téléchargement avec tkinter
-Fonctionnalités: pause/reprendre, sélection de dossier, barre de progression
+Fonctionnalités: file de téléchargements, pause/reprendre, sélection de dossier, progression
 
 Author: Docteur-Parfait
 Repository: https://github.com/Docteur-Parfait/PytDm
@@ -12,31 +12,136 @@ License: MIT
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import requests
+import collections
 import os
-import threading
-import time
-from urllib.parse import urlparse
 from pathlib import Path
-import subprocess
-import platform
+import sqlite3
+import sys
 
-class DownloadManager:
-    def __init__(self):
-        self.download_thread = None
-        self.is_paused = False
-        self.is_cancelled = False
-        self.downloaded_size = 0
-        self.total_size = 0
-        self.file_path = None
-        self.response = None
-        self.session = requests.Session()  # Session pour maintenir les cookies
+from download import Checksum, describe_error
+from download.extract import EXTRACT
+from download.jobstore import JobStore
+from download.scheduler import CANCELLED, COMPLETED, FAILED, PENDING, RUNNING, DownloadQueue, read_url_file
+from download.progress import PROGRESS_INTERVAL, format_eta
+
+# Lignes de la liste des téléchargements réellement créées (recyclées au défilement)
+VISIBLE_ROWS = 10
+
+class DownloadListView(tk.Frame):
+    """
+    Liste des téléchargements à défilement virtuel
+
+    Seules rows lignes de widgets existent, quel que soit le nombre
+    d'éléments: au défilement, elles sont réaffectées aux éléments visibles.
+    set_state() ne fait que mémoriser l'état d'un élément; render() ne
+    reconfigure que les lignes dont l'élément ou l'état affiché a changé.
+    État d'un élément: (nom, pourcentage ou None, texte).
+    """
+    
+    BACKGROUND = '#f0f0f0'
+    SELECTED_BACKGROUND = '#d6eaf8'
+    
+    def __init__(self, parent, rows=VISIBLE_ROWS, on_select=None):
+        super().__init__(parent, bg=self.BACKGROUND)
+        self.on_select = on_select
+        self.items = []
+        self.states = {}
+        self.first = 0  # Indice du premier élément visible
+        self.selected = None
+        self.drawn = [None] * rows  # (élément, état, sélectionné) affiché par chaque ligne
+        self.scrolled = None  # (premier, nombre d'éléments) transmis à la barre de défilement
+        
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side='right', fill='y')
+        body = tk.Frame(self, bg=self.BACKGROUND)
+        body.pack(side='left', fill='both', expand=True)
+        self.rows = [self._create_row(body, index) for index in range(rows)]
+    
+    def _create_row(self, parent, index):
+        row = tk.Frame(parent, bg=self.BACKGROUND)
+        row.pack(fill='x', pady=1)
+        # Largeurs fixes: un changement de texte ne redimensionne pas la fenêtre
+        name = tk.Label(row, width=24, anchor='w', font=('Arial', 9), bg=self.BACKGROUND)
+        name.pack(side='left', padx=(5, 5))
+        bar = ttk.Progressbar(row, length=110, maximum=100, mode='determinate')
+        bar.pack(side='left')
+        info = tk.Label(row, width=28, anchor='w', font=('Arial', 9), bg=self.BACKGROUND, fg='#7f8c8d')
+        info.pack(side='left', padx=5, fill='x', expand=True)
+        for widget in (row, name, bar, info):
+            widget.bind('<Button-1>', lambda e, index=index: self.select_row(index))
+            # La molette fait défiler la liste et non la fenêtre
+            widget.bind('<MouseWheel>', self._on_mousewheel)
+            widget.bind('<Button-4>', self._on_mousewheel)
+            widget.bind('<Button-5>', self._on_mousewheel)
+        return row, name, bar, info
+    
+    def _on_mousewheel(self, event):
+        self.scroll_to(self.first + (-3 if event.num == 4 or event.delta > 0 else 3))
+        return "break"
+    
+    def add(self, item, state):
+        """Ajoute un élément en fin de liste"""
+        self.items.append(item)
+        self.states[item] = state
+    
+    def set_state(self, item, state):
+        """Mémorise l'état affiché d'un élément (dessiné au prochain render())"""
+        self.states[item] = state
+    
+    def yview(self, *args):
+        """Commandes de la barre de défilement: ('moveto', fraction) ou ('scroll', n, 'units' | 'pages')"""
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.items)))
+        elif args[0] == 'scroll':
+            step = len(self.rows) if args[2] == 'pages' else 1
+            self.scroll_to(self.first + int(args[1]) * step)
+    
+    def scroll_to(self, first):
+        """Affiche les éléments à partir de l'indice first"""
+        first = min(max(first, 0), max(len(self.items) - len(self.rows), 0))
+        if first != self.first:
+            self.first = first
+            self.render()
+    
+    def select_row(self, index):
+        position = self.first + index
+        if position >= len(self.items):
+            return
+        self.selected = self.items[position]
+        self.render()
+        if self.on_select is not None:
+            self.on_select(self.selected)
+    
+    def render(self):
+        """Redessine les lignes dont le contenu a changé et retourne leur nombre"""
+        redrawn = 0
+        for index, (row, name, bar, info) in enumerate(self.rows):
+            position = self.first + index
+            item = self.items[position] if position < len(self.items) else None
+            drawn = (item, self.states.get(item), item is not None and item is self.selected)
+            if drawn == self.drawn[index]:
+                continue
+            self.drawn[index] = drawn
+            redrawn += 1
+            label, percent, text = drawn[1] or ("", None, "")
+            background = self.SELECTED_BACKGROUND if drawn[2] else self.BACKGROUND
+            for widget in (row, name, info):
+                widget.config(bg=background)
+            name.config(text=label)
+            bar.config(value=percent or 0)
+            info.config(text=text)
+        scrolled = (self.first, len(self.items))
+        if scrolled != self.scrolled:
+            self.scrolled = scrolled
+            count = max(len(self.items), 1)
+            self.scrollbar.set(self.first / count, min(self.first + len(self.rows), count) / count)
+        return redrawn
 
 class DownloadGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("PytDm - Python Download Manager")
-        self.root.geometry("600x500")
+        self.root.geometry("600x600")
         self.root.minsize(500, 400)  # Taille minimale
         self.root.resizable(True, True)
         
@@ -44,11 +149,31 @@ class DownloadGUI:
         self.root.configure(bg='#f0f0f0')
         
         # Variables
-        self.download_manager = DownloadManager()
         self.download_folder = tk.StringVar(value=str(Path.home() / "Downloads"))
+        self.extract_var = tk.BooleanVar(value=False)
+        
+        # Jobs persistants: les téléchargements interrompus (fermeture, plantage) reprennent au lancement suivant
+        try:
+            self.store = JobStore()
+        except (OSError, sqlite3.Error):
+            self.store = None
+        
+        # Les threads de travail ne touchent jamais aux widgets: ils empilent
+        # les jobs à redessiner, relus par l'unique minuterie de refresh()
+        self.events = collections.deque()
+        self.messages = {}  # job -> dernier message d'état
+        self.queue = DownloadQueue(store=self.store, on_status=self.job_status, on_job_done=self.events.append)
+        self.queue.start()
+        self.refresh_job = None
+        self.active = None  # Nombre de jobs échantillonnés au dernier refresh
+        self.speed_text = None
+        self.buttons = None  # État des boutons pause/annuler déjà appliqué
         
         self.setup_ui()
-        self.reset_buttons()  # Initialiser l'état des boutons
+        self.update_summary()
+        self.update_buttons()
+        self.refresh()
+        self.root.after(0, self.resume_unfinished)
         
     def setup_ui(self):
         """Configure l'interface utilisateur"""
@@ -58,6 +183,7 @@ class DownloadGUI:
         scrollbar = ttk.Scrollbar(self.root, orient="vertical", command=canvas.yview)
         scrollable_frame = tk.Frame(canvas, bg='#f0f0f0')
         
+        # Seul un changement de taille du contenu recalcule la zone de défilement
         scrollable_frame.bind(
             "<Configure>",
             lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
@@ -84,13 +210,28 @@ class DownloadGUI:
         main_frame.pack(pady=20, padx=20, fill='both', expand=True)
         
         # Section URL
-        url_frame = tk.LabelFrame(main_frame, text="🔗 URL du fichier", font=('Arial', 10, 'bold'), bg='#f0f0f0')
+        url_frame = tk.LabelFrame(main_frame, text="🔗 URL du fichier (miroirs éventuels séparés par des espaces)", font=('Arial', 10, 'bold'), bg='#f0f0f0')
         url_frame.pack(fill='x', pady=(0, 15))
         
-        self.url_entry = tk.Entry(url_frame, font=('Arial', 10))
-        self.url_entry.pack(pady=10, padx=10, fill='x')
+        url_inner_frame = tk.Frame(url_frame, bg='#f0f0f0')
+        url_inner_frame.pack(fill='x', pady=10, padx=10)
+        
+        self.url_entry = tk.Entry(url_inner_frame, font=('Arial', 10))
+        self.url_entry.pack(side='left', fill='x', expand=True)
         self.url_entry.bind('<Return>', lambda e: self.start_download())
         
+        import_btn = tk.Button(
+            url_inner_frame,
+            text="📥 Importer une liste",
+            command=self.import_urls,
+            bg='#3498db',
+            fg='white',
+            font=('Arial', 8, 'bold'),
+            relief='flat',
+            padx=10
+        )
+        import_btn.pack(side='right', padx=(5, 0))
+        
         # Section dossier de téléchargement
         folder_frame = tk.LabelFrame(main_frame, text="📁 Dossier de téléchargement", font=('Arial', 10, 'bold'), bg='#f0f0f0')
         folder_frame.pack(fill='x', pady=(0, 15))
@@ -120,19 +261,30 @@ class DownloadGUI:
         self.filename_entry = tk.Entry(filename_frame, font=('Arial', 10))
         self.filename_entry.pack(pady=10, padx=10, fill='x')
         
-        # Section progression
-        progress_frame = tk.LabelFrame(main_frame, text="📊 Progression", font=('Arial', 10, 'bold'), bg='#f0f0f0')
-        progress_frame.pack(fill='x', pady=(0, 15))
+        # Section somme de contrôle (optionnelle)
+        checksum_frame = tk.LabelFrame(main_frame, text="🔐 Somme de contrôle (optionnel: sha256:..., URL .sha256 ou .meta4)", font=('Arial', 10, 'bold'), bg='#f0f0f0')
+        checksum_frame.pack(fill='x', pady=(0, 15))
         
-        # Barre de progression
-        self.progress_var = tk.DoubleVar()
-        self.progress_bar = ttk.Progressbar(
-            progress_frame, 
-            variable=self.progress_var, 
-            maximum=100,
-            mode='determinate'
+        self.checksum_entry = tk.Entry(checksum_frame, font=('Arial', 10))
+        self.checksum_entry.pack(pady=10, padx=10, fill='x')
+        
+        # Décompression / extraction des archives au fil du téléchargement
+        extract_check = tk.Checkbutton(
+            main_frame,
+            text="📦 Décompresser / extraire les archives (.gz, .xz, .zst, .tar...) pendant le téléchargement",
+            variable=self.extract_var,
+            font=('Arial', 9),
+            bg='#f0f0f0',
+            anchor='w'
         )
-        self.progress_bar.pack(pady=15, padx=10, fill='x')
+        extract_check.pack(fill='x', pady=(0, 15))
+        
+        # Section téléchargements: liste virtuelle, quel que soit le nombre de jobs
+        progress_frame = tk.LabelFrame(main_frame, text="📊 Téléchargements", font=('Arial', 10, 'bold'), bg='#f0f0f0')
+        progress_frame.pack(fill='x', pady=(0, 15))
+        
+        self.list_view = DownloadListView(progress_frame, on_select=lambda job: self.update_buttons())
+        self.list_view.pack(pady=(10, 5), padx=10, fill='x')
         
         # Labels d'information
         self.status_label = tk.Label(
@@ -238,12 +390,6 @@ class DownloadGUI:
         canvas.bind_all("<Button-4>", _on_mousewheel_linux)
         canvas.bind_all("<Button-5>", _on_mousewheel_linux)
         
-        # Gérer le redimensionnement de la fenêtre
-        def on_window_resize(event):
-            canvas.configure(scrollregion=canvas.bbox("all"))
-        
-        self.root.bind('<Configure>', on_window_resize)
-        
         # Stocker les références pour le nettoyage
         self.canvas = canvas
         self.scrollbar = scrollbar
@@ -254,294 +400,214 @@ class DownloadGUI:
         if folder:
             self.download_folder.set(folder)
     
-    def get_filename_from_url(self, url):
-        """Extrait le nom du fichier à partir de l'URL"""
-        parsed_url = urlparse(url)
-        filename = os.path.basename(parsed_url.path)
-        
-        if not filename or '.' not in filename:
-            filename = "fichier_telecharge"
-        
-        return filename
+    def import_urls(self):
+        """Ajoute à la file toutes les URL d'un fichier texte (une par ligne)"""
+        path = filedialog.askopenfilename(
+            title="Liste d'URL",
+            filetypes=[("Fichiers texte", "*.txt"), ("Tous les fichiers", "*")]
+        )
+        if not path:
+            return
+        try:
+            urls = read_url_file(path)
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("Erreur", str(e))
+            return
+        urls = [url for url in urls if url.startswith(('http://', 'https://'))]
+        if not urls:
+            messagebox.showerror("Erreur", "Aucune URL http:// ou https:// dans ce fichier")
+            return
+        self.queue.extract = EXTRACT if self.extract_var.get() else None
+        for url in urls:
+            self.add_job(self.queue.add(url, self.download_folder.get()))
+        self.update_summary()
     
-    def update_progress(self, downloaded, total, speed=0):
-        """Met à jour la barre de progression et les labels"""
-        if total > 0:
-            percentage = (downloaded / total) * 100
-            self.progress_var.set(percentage)
-            
-            # Formatage des tailles
-            downloaded_mb = downloaded / (1024 * 1024)
-            total_mb = total / (1024 * 1024)
-            
-            status_text = f"Téléchargé: {downloaded_mb:.2f} MB / {total_mb:.2f} MB ({percentage:.1f}%)"
-            self.status_label.config(text=status_text)
-            
-            if speed > 0:
-                speed_text = f"Vitesse: {speed:.2f} MB/s"
-                self.speed_label.config(text=speed_text)
+    def add_job(self, job):
+        """Affiche un job de la file dans la liste"""
+        self.list_view.add(job, self.job_state(job))
+        self.list_view.render()
+    
+    def job_status(self, job, message):
+        """Message d'état d'un job (depuis un thread de travail)"""
+        self.messages[job] = message
+        self.events.append(job)
+    
+    def job_state(self, job, snapshot=None):
+        """(nom, pourcentage ou None, texte) affiché pour un job"""
+        if job.file_path:
+            name = os.path.basename(job.file_path)
+        else:
+            name = job.filename or job.url.rstrip('/').rsplit('/', 1)[-1] or job.url
+        if job.status == PENDING:
+            return name, None, "⏳ En attente"
+        if job.status == COMPLETED:
+            return name, 100, "✅ Terminé"
+        if job.status == CANCELLED:
+            return name, None, "❌ Annulé"
+        if job.status == FAILED:
+            return name, None, f"❌ {describe_error(job.error)}"
+        
+        percentage = None
+        if snapshot is not None and snapshot.total > 0:
+            # Arrondi: une ligne n'est redessinée que si son texte change
+            percentage = round(snapshot.downloaded / snapshot.total * 100, 1)
+        if job.manager.is_paused:
+            return name, percentage, "⏸️ En pause"
+        if snapshot is None or not snapshot.downloaded:
+            return name, None, self.messages.get(job, "🚀 Démarrage...")
+        if percentage is None:
+            downloaded_mb = snapshot.downloaded / (1024 * 1024)
+            return name, None, f"{downloaded_mb:.2f} MB - {snapshot.speed:.2f} MB/s"
+        return name, percentage, f"{percentage:.1f}% - {snapshot.speed:.2f} MB/s - {format_eta(snapshot.eta)}"
+    
+    def refresh(self):
+        """
+        Unique minuterie de l'interface: échantillonne la progression des jobs
+        en cours, applique les événements des threads de travail et ne
+        redessine que les lignes visibles qui ont changé
+        """
+        snapshots = dict(self.queue.progress.sample())
+        changed = bool(self.events) or len(snapshots) != self.active
+        while self.events:
+            job = self.events.popleft()
+            self.list_view.set_state(job, self.job_state(job, snapshots.get(job)))
+        for job, snapshot in snapshots.items():
+            self.list_view.set_state(job, self.job_state(job, snapshot))
+        self.list_view.render()
+        
+        if changed:
+            self.active = len(snapshots)
+            self.update_summary()
+            self.update_buttons()
+        speed_text = ""
+        if snapshots:
+            speed_text = f"Vitesse totale: {sum(snapshot.speed for snapshot in snapshots.values()):.2f} MB/s"
+        if speed_text != self.speed_text:
+            self.speed_text = speed_text
+            self.speed_label.config(text=speed_text)
+        self.refresh_job = self.root.after(int(PROGRESS_INTERVAL * 1000), self.refresh)
+    
+    def update_summary(self):
+        """Résumé de la file: nombre de jobs par état"""
+        jobs = self.queue.jobs
+        if not jobs:
+            self.status_label.config(text="Prêt à télécharger")
+            return
+        counts = collections.Counter(job.status for job in jobs)
+        self.status_label.config(
+            text=f"{len(jobs)} téléchargement(s): {counts[RUNNING]} en cours, {counts[PENDING]} en attente, "
+                 f"{counts[COMPLETED]} terminé(s), {counts[FAILED]} en échec"
+        )
+    
+    def update_buttons(self):
+        """Active pause/annuler selon l'état du job sélectionné"""
+        job = self.list_view.selected
+        running = job is not None and job.status == RUNNING
+        paused = running and job.manager.is_paused
+        cancellable = job is not None and job.status in (PENDING, RUNNING)
+        buttons = (running, paused, cancellable)
+        if buttons == self.buttons:
+            return
+        self.buttons = buttons
+        self.pause_btn.config(
+            state='normal' if running else 'disabled',
+            text="▶️ Reprendre" if paused else "⏸️ Pause"
+        )
+        self.cancel_btn.config(state='normal' if cancellable else 'disabled')
+    
+    def resume_unfinished(self):
+        """Remet en file les téléchargements inachevés d'une session précédente"""
+        jobs = self.queue.restore()
+        for job in jobs:
+            self.list_view.add(job, self.job_state(job))
+        if jobs:
+            self.list_view.render()
+            self.update_summary()
     
-    def reset_buttons(self):
-        """Réinitialise l'état des boutons"""
-        self.download_btn.config(state='normal')
-        self.pause_btn.config(state='disabled')
-        self.cancel_btn.config(state='disabled')
-        self.progress_var.set(0)
-        self.status_label.config(text="Prêt à télécharger")
-        self.speed_label.config(text="")
-
     def start_download(self):
-        """Démarre le téléchargement"""
-        url = self.url_entry.get().strip()
+        """Ajoute l'URL saisie (et ses miroirs) à la file de téléchargement"""
+        # Plusieurs URL: la première est la source principale, les autres des miroirs
+        urls = self.url_entry.get().split()
         
-        if not url:
+        if not urls:
             messagebox.showerror("Erreur", "Veuillez entrer une URL valide")
             return
         
-        if not url.startswith(('http://', 'https://')):
+        if not all(url.startswith(('http://', 'https://')) for url in urls):
             messagebox.showerror("Erreur", "L'URL doit commencer par http:// ou https://")
             return
+        url, mirrors = urls[0], urls[1:]
         
-        # Désactiver les boutons
-        self.download_btn.config(state='disabled')
-        self.pause_btn.config(state='normal')
-        self.cancel_btn.config(state='normal')
+        checksum = self.checksum_entry.get().strip() or None
+        if checksum and not checksum.startswith(('http://', 'https://')):
+            try:
+                Checksum.parse(checksum)
+            except ValueError as e:
+                messagebox.showerror("Erreur", str(e))
+                return
         
-        # Réinitialiser les variables
-        self.download_manager.is_paused = False
-        self.download_manager.is_cancelled = False
-        self.download_manager.downloaded_size = 0
+        filename = self.filename_entry.get().strip() or None
+        self.queue.extract = EXTRACT if self.extract_var.get() else None
+        self.add_job(self.queue.add(url, self.download_folder.get(), filename, mirrors, checksum))
+        self.update_summary()
         
-        # Démarrer le téléchargement dans un thread séparé
-        self.download_manager.download_thread = threading.Thread(target=self.download_file)
-        self.download_manager.download_thread.daemon = True
-        self.download_manager.download_thread.start()
-    
-    def get_headers(self):
-        """Retourne les en-têtes HTTP pour simuler un navigateur"""
-        return {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'fr-FR,fr;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Cache-Control': 'max-age=0',
-        }
-
-    def download_file(self):
-        """Fonction de téléchargement dans un thread séparé"""
-        try:
-            url = self.url_entry.get().strip()
-            headers = self.get_headers()
-            
-            # Obtenir les informations du fichier
-            self.root.after(0, lambda: self.status_label.config(text="🔍 Vérification du fichier..."))
-            
-            head_response = self.download_manager.session.head(url, headers=headers, allow_redirects=True, timeout=10)
-            head_response.raise_for_status()
-            
-            self.download_manager.total_size = int(head_response.headers.get('content-length', 0))
-            
-            if self.download_manager.total_size == 0:
-                self.root.after(0, lambda: self.status_label.config(text="⚠️ Taille inconnue - téléchargement sans progression"))
-                self.download_without_progress(url)
-                return
-            
-            # Obtenir le nom du fichier
-            filename = self.filename_entry.get().strip()
-            if not filename:
-                content_disposition = head_response.headers.get('content-disposition', '')
-                if 'filename=' in content_disposition:
-                    filename = content_disposition.split('filename=')[1].strip('"')
-                else:
-                    filename = self.get_filename_from_url(url)
-            
-            # Chemin complet du fichier
-            self.download_manager.file_path = os.path.join(self.download_folder.get(), filename)
-            
-            # Vérifier si le fichier existe déjà (pour reprendre)
-            resume_pos = 0
-            if os.path.exists(self.download_manager.file_path):
-                resume_pos = os.path.getsize(self.download_manager.file_path)
-                if resume_pos < self.download_manager.total_size:
-                    self.root.after(0, lambda: self.status_label.config(text=f"📥 Reprise du téléchargement à {resume_pos / (1024*1024):.2f} MB"))
-                else:
-                    self.root.after(0, lambda: self.status_label.config(text="✅ Fichier déjà téléchargé"))
-                    self.download_complete()
-                    return
-            
-            # Téléchargement avec reprise
-            self.download_with_resume(url, resume_pos)
-            
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 403:
-                self.root.after(0, lambda: self.show_error("❌ Accès interdit (403 Forbidden)\n\nLe serveur bloque les téléchargements automatiques.\nEssayez de copier le lien directement depuis votre navigateur."))
-            elif e.response.status_code == 404:
-                self.root.after(0, lambda: self.show_error("❌ Fichier non trouvé (404)\n\nVérifiez que l'URL est correcte."))
-            else:
-                self.root.after(0, lambda: self.show_error(f"❌ Erreur HTTP {e.response.status_code}: {str(e)}"))
-        except requests.exceptions.RequestException as e:
-            self.root.after(0, lambda: self.show_error(f"❌ Erreur de connexion: {str(e)}"))
-        except Exception as e:
-            self.root.after(0, lambda: self.show_error(f"❌ Erreur inattendue: {str(e)}"))
-    
-    def download_with_resume(self, url, resume_pos):
-        """Téléchargement avec possibilité de reprise"""
-        headers = self.get_headers()
-        if resume_pos > 0:
-            headers['Range'] = f'bytes={resume_pos}-'
-        
-        response = self.download_manager.session.get(url, headers=headers, stream=True, timeout=30)
-        response.raise_for_status()
-        
-        self.download_manager.response = response
-        
-        mode = 'ab' if resume_pos > 0 else 'wb'
-        downloaded = resume_pos
-        start_time = time.time()
-        last_update = start_time
-        
-        with open(self.download_manager.file_path, mode) as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if self.download_manager.is_cancelled:
-                    break
-                
-                # Gestion de la pause
-                while self.download_manager.is_paused and not self.download_manager.is_cancelled:
-                    time.sleep(0.1)
-                
-                if self.download_manager.is_cancelled:
-                    break
-                
-                if chunk:
-                    file.write(chunk)
-                    downloaded += len(chunk)
-                    self.download_manager.downloaded_size = downloaded
-                    
-                    # Mise à jour de l'interface (limiter la fréquence)
-                    current_time = time.time()
-                    if current_time - last_update >= 0.1:  # Mise à jour toutes les 100ms
-                        speed = (downloaded - resume_pos) / (current_time - start_time) / (1024 * 1024)
-                        self.root.after(0, lambda: self.update_progress(downloaded, self.download_manager.total_size, speed))
-                        last_update = current_time
-        
-        if not self.download_manager.is_cancelled:
-            self.root.after(0, self.download_complete)
-        else:
-            self.root.after(0, self.download_cancelled)
-    
-    def download_without_progress(self, url):
-        """Téléchargement sans barre de progression (taille inconnue)"""
-        try:
-            headers = self.get_headers()
-            response = self.download_manager.session.get(url, headers=headers, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            filename = self.filename_entry.get().strip()
-            if not filename:
-                filename = self.get_filename_from_url(url)
-            
-            self.download_manager.file_path = os.path.join(self.download_folder.get(), filename)
-            
-            with open(self.download_manager.file_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if self.download_manager.is_cancelled:
-                        break
-                    
-                    while self.download_manager.is_paused and not self.download_manager.is_cancelled:
-                        time.sleep(0.1)
-                    
-                    if self.download_manager.is_cancelled:
-                        break
-                    
-                    if chunk:
-                        file.write(chunk)
-            
-            if not self.download_manager.is_cancelled:
-                self.root.after(0, self.download_complete)
-            else:
-                self.root.after(0, self.download_cancelled)
-                
-        except Exception as e:
-            self.root.after(0, lambda: self.show_error(f"Erreur: {str(e)}"))
+        # Champs vidés pour le téléchargement suivant
+        self.url_entry.delete(0, 'end')
+        self.filename_entry.delete(0, 'end')
+        self.checksum_entry.delete(0, 'end')
     
     def toggle_pause(self):
-        """Bascule entre pause et reprise"""
-        if self.download_manager.is_paused:
-            self.download_manager.is_paused = False
-            self.pause_btn.config(text="⏸️ Pause")
-            self.status_label.config(text="▶️ Reprise du téléchargement...")
+        """Bascule entre pause et reprise du job sélectionné"""
+        job = self.list_view.selected
+        if job is None or job.status != RUNNING:
+            return
+        if job.manager.is_paused:
+            self.queue.resume(job)
         else:
-            self.download_manager.is_paused = True
-            self.pause_btn.config(text="▶️ Reprendre")
-            self.status_label.config(text="⏸️ Téléchargement en pause...")
+            self.queue.pause(job)
+        self.events.append(job)
+        self.update_buttons()
     
     def cancel_download(self):
-        """Annule le téléchargement"""
-        self.download_manager.is_cancelled = True
-        self.download_manager.is_paused = False
-        
-        # Supprimer le fichier partiellement téléchargé
-        if self.download_manager.file_path and os.path.exists(self.download_manager.file_path):
-            try:
-                os.remove(self.download_manager.file_path)
-            except:
-                pass
-        
-        self.download_cancelled()
-    
-    def download_complete(self):
-        """Appelé quand le téléchargement est terminé"""
-        self.status_label.config(text="✅ Téléchargement terminé!")
-        self.speed_label.config(text="")
-        self.progress_var.set(100)
-        
-        # Réactiver les boutons
-        self.reset_buttons()
-        
-        # Message de succès
-        messagebox.showinfo("Succès", f"Fichier téléchargé avec succès!\n\nEmplacement: {self.download_manager.file_path}")
-    
-    def download_cancelled(self):
-        """Appelé quand le téléchargement est annulé"""
-        self.status_label.config(text="❌ Téléchargement annulé")
-        self.speed_label.config(text="")
-        
-        # Réactiver les boutons
-        self.reset_buttons()
-    
-    def show_error(self, message):
-        """Affiche une erreur"""
-        self.status_label.config(text=f"❌ {message}")
-        self.speed_label.config(text="")
-        
-        # Réactiver les boutons
-        self.reset_buttons()
-        
-        messagebox.showerror("Erreur", message)
+        """Annule le job sélectionné (supprime aussi son fichier partiel)"""
+        job = self.list_view.selected
+        if job is None or job.status not in (PENDING, RUNNING):
+            return
+        self.queue.cancel(job)
     
     def open_download_folder(self):
         """Ouvre le dossier de téléchargement dans l'explorateur de fichiers"""
         folder_path = self.download_folder.get()
         if os.path.exists(folder_path):
-            if platform.system() == "Windows":
+            # subprocess n'est importé qu'ici: démarrage plus rapide
+            if sys.platform == "win32":
                 os.startfile(folder_path)
-            elif platform.system() == "Darwin":  # macOS
+            elif sys.platform == "darwin":  # macOS
+                import subprocess
                 subprocess.run(["open", folder_path])
             else:  # Linux
+                import subprocess
                 subprocess.run(["xdg-open", folder_path])
         else:
             messagebox.showerror("Erreur", "Le dossier de téléchargement n'existe pas")
+    
+    def close(self):
+        """Ferme la fenêtre; les téléchargements en cours ou en attente resteront à reprendre"""
+        self.queue.cancel_all(remove_partial=False)
+        self.queue.close()
+        # Les workers enregistrent l'état de leur job avant la fermeture de la base
+        self.queue.join(timeout=5)
+        if self.refresh_job is not None:
+            self.root.after_cancel(self.refresh_job)
+        if self.store is not None:
+            self.store.close()
+        self.root.destroy()
 
 def main():
     """Fonction principale"""
     root = tk.Tk()
     app = DownloadGUI(root)
+    root.protocol("WM_DELETE_WINDOW", app.close)
     
     # Centrer la fenêtre
     root.update_idletasks()
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PytDm - téléchargement en ligne de commande, sans tkinter
+
+Usage: PytDm-cli.py URL [URL ...] [-o DOSSIER] [-n NOM] [-s SEGMENTS] [-q]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download.cli import main  # noqa: E402
+
+if __name__ == "__main__":
+    sys.exit(main())
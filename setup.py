@@ -40,8 +40,8 @@ setup(
         "Source": "https://github.com/Docteur-Parfait/PytDm",
         "Documentation": "https://github.com/Docteur-Parfait/PytDm#readme",
     },
-    packages=find_packages(),
-    py_modules=["download"],
+    packages=find_packages(exclude=["tests", "tests.*"]),
+    py_modules=["main"],
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: End Users/Desktop",
@@ -84,7 +84,7 @@ setup(
             "PytDm=download:main",
         ],
         "gui_scripts": [
-            "PytDm-gui=download:main",
+            "PytDm-gui=main:main",
         ],
     },
     keywords=[
@@ -97,7 +97,6 @@ setup(
     license="MIT",
     # Métadonnées additionnelles
     download_url="https://github.com/Docteur-Parfait/PytDm/archive/v{}.tar.gz".format(get_version()),
-    keywords="download manager gui tkinter python http files progress resume pause",
     # Configuration pour les tests
     test_suite="tests",
     tests_require=[
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures communes: serveurs HTTP locaux (aucun accès au réseau)
+
+bench: serveur de benchmarks/server.py (contenu généré de toute taille,
+débit, pannes, sans Range...); files: petit serveur de contenus fixés par
+les tests (archives, fichiers de sommes, Metalink), avec Range et ETag.
+"""
+
+import hashlib
+import http.server
+import os
+import re
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from server import BenchServer, payload  # noqa: E402
+
+from download.retry import RetryPolicy  # noqa: E402
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d+)-(\d*)$")
+
+# Nouvelles tentatives sans attente notable
+FAST_RETRY = RetryPolicy(max_retries=3, backoff=0.01, max_backoff=0.05)
+
+
+def content(size, offset=0):
+    """Contenu servi par bench pour un fichier de size octets"""
+    return b"".join(payload(offset, size))
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class FileHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        self.server.requests.append((self.command, self.path))
+        entry = self.server.files.get(self.path.split("?")[0])
+        if entry is None:
+            self.send_error(404)
+            return
+        data, headers = entry
+        etag = '"%s"' % sha256(data)[:16]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end = 0, len(data) - 1
+        requested = RANGE_PATTERN.match(self.headers.get("Range", ""))
+        if requested is not None and data:
+            start = int(requested.group(1))
+            end = min(int(requested.group(2)), end) if requested.group(2) else end
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data[start : end + 1])
+
+
+class FileServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FileHandler)
+        self.files = {}
+        self.requests = []
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def add(self, path, data, **headers):
+        """Sert data à path (en-têtes: Content_Disposition=...) et retourne l'URL"""
+        self.files[path] = (
+            data,
+            {name.replace("_", "-"): value for name, value in headers.items()},
+        )
+        return self.base_url + path
+
+
+@pytest.fixture(scope="session")
+def bench():
+    server = BenchServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="session")
+def files():
+    server = FileServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
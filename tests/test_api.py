@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""API de contrôle: ajout, liste, commandes, validation, jeton, événements"""
+
+import http.client
+import json
+import threading
+
+import pytest
+import requests
+
+from download import DownloadQueue
+from download.api import ControlServer, EventBroker
+from download.scheduler import CANCELLED, PENDING
+
+
+@pytest.fixture
+def api(tmp_path):
+    """(URL de base, file) d'une API servie sur un port libre, file non démarrée"""
+    events = EventBroker()
+    queue = DownloadQueue(
+        max_concurrent=1,
+        probe_ahead=0,
+        on_job_added=events.job_added,
+        on_job_done=events.job_done,
+    )
+    server = ControlServer(queue, events, port=0, folder=str(tmp_path)).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", queue
+    server.stop()
+
+
+def post(url, body, **options):
+    return requests.post(url, json=body, timeout=5, **options)
+
+
+def test_add_and_list_jobs(api, tmp_path):
+    base, queue = api
+    response = post(
+        f"{base}/jobs", {"url": "http://x/a.bin", "priority": 3, "filename": "b.bin"}
+    )
+    assert response.status_code == 201
+    [added] = response.json()["jobs"]
+    assert (
+        added["url"] == "http://x/a.bin"
+        and added["status"] == PENDING
+        and added["priority"] == 3
+    )
+    job = queue.get(added["id"])
+    assert (job.folder, job.filename) == (str(tmp_path), "b.bin")
+
+    response = post(
+        f"{base}/jobs",
+        {"urls": ["http://x/c", "http://x/d"], "folder": str(tmp_path / "o")},
+    )
+    assert [job["url"] for job in response.json()["jobs"]] == [
+        "http://x/c",
+        "http://x/d",
+    ]
+    assert post(f"{base}/jobs", [{"url": "http://x/e"}]).status_code == 201
+
+    listing = requests.get(f"{base}/jobs?offset=1&limit=2", timeout=5).json()
+    assert listing["total"] == 4
+    assert [job["url"] for job in listing["jobs"]] == ["http://x/c", "http://x/d"]
+    assert requests.get(f"{base}/jobs?status=running", timeout=5).json() == {
+        "total": 0,
+        "jobs": [],
+    }
+    assert (
+        requests.get(f'{base}/jobs/{added["id"]}', timeout=5).json()["id"]
+        == added["id"]
+    )
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"url": "ftp://x/a"},
+        {"url": None},
+        {"url": "http://x/a", "mirrors": "http://y/a"},
+        {"url": "http://x/a", "filename": "../a"},
+        {"url": "http://x/a", "checksum": "sha256:xyz"},
+        {"url": "http://x/a", "priority": "haute"},
+        {"url": "http://x/a", "deadline": True},
+        {"urls": "http://x/a"},
+        [{"url": "http://x/a"}, "http://x/b"],
+        "http://x/a",
+    ],
+)
+def test_invalid_jobs_are_refused(api, body):
+    base, queue = api
+    response = post(f"{base}/jobs", body)
+    assert response.status_code == 400
+    assert "error" in response.json()
+    # Lot refusé en entier
+    assert queue.jobs == []
+
+
+@pytest.mark.parametrize(
+    "query", ["offset=-1", "limit=-5", "limit=x", "status=inconnu"]
+)
+def test_invalid_listing_parameters(api, query):
+    base, _ = api
+    assert requests.get(f"{base}/jobs?{query}", timeout=5).status_code == 400
+
+
+def test_invalid_requests(api):
+    base, _ = api
+    assert (
+        requests.post(
+            f"{base}/jobs", data='{"url": "http://x/a"}', timeout=5
+        ).status_code
+        == 415
+    )
+    response = requests.post(
+        f"{base}/jobs",
+        data="{",
+        headers={"Content-Type": "application/json"},
+        timeout=5,
+    )
+    assert response.status_code == 400
+    assert requests.get(f"{base}/jobs/999", timeout=5).status_code == 404
+    assert requests.get(f"{base}/jobs/abc", timeout=5).status_code == 404
+    assert requests.get(f"{base}/inconnu", timeout=5).status_code == 404
+
+
+@pytest.mark.parametrize("length", ["-1", "abc"])
+def test_invalid_content_length(api, length):
+    base, _ = api
+    connection = http.client.HTTPConnection(base.split("//")[1], timeout=5)
+    connection.putrequest("POST", "/jobs")
+    connection.putheader("Content-Type", "application/json")
+    connection.putheader("Content-Length", length)
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 400
+    assert "Content-Length invalide" in response.read().decode("utf-8")
+    connection.close()
+
+
+def test_commands(api):
+    base, queue = api
+    job_id = post(f"{base}/jobs", {"url": "http://x/a"}).json()["jobs"][0]["id"]
+    other = post(f"{base}/jobs", {"url": "http://x/b"}).json()["jobs"][0]["id"]
+
+    response = post(f"{base}/jobs/{other}/priority", {"priority": 9, "deadline": 10.5})
+    assert response.status_code == 200
+    assert (response.json()["priority"], response.json()["deadline"]) == (9, 10.5)
+    assert post(f"{base}/jobs/{other}/priority", [1]).status_code == 400
+    assert post(f"{base}/jobs/{job_id}/envoler", {}).status_code == 404
+
+    assert post(f"{base}/jobs/{job_id}/cancel", {}).json()["status"] == CANCELLED
+    assert queue.get(job_id).status == CANCELLED
+    assert post(f"{base}/jobs/{job_id}/pause", {}).status_code == 409
+
+
+def test_metrics(api):
+    base, _ = api
+    response = requests.get(f"{base}/metrics", timeout=5)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain")
+
+
+def test_events_announce_jobs_added_outside_the_api(api, tmp_path):
+    base, queue = api
+    response = requests.get(f"{base}/events", stream=True, timeout=5)
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    lines = response.iter_lines(chunk_size=1, decode_unicode=True)
+    # L'abonnement est pris avant l'envoi des en-têtes
+    threading.Timer(0.1, queue.add, ("http://x/hors-api", str(tmp_path))).start()
+    assert next(lines) == "event: added"
+    data = next(lines)
+    assert json.loads(data.split(":", 1)[1])["url"] == "http://x/hors-api"
+    response.close()
+
+
+def test_token_is_required(tmp_path):
+    events = EventBroker()
+    queue = DownloadQueue(probe_ahead=0)
+    server = ControlServer(
+        queue, events, port=0, folder=str(tmp_path), token="secret"
+    ).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert requests.get(f"{base}/jobs", timeout=5).status_code == 401
+        bad = {"Authorization": "Bearer autre"}
+        assert (
+            post(f"{base}/jobs", {"url": "http://x/a"}, headers=bad).status_code == 401
+        )
+        good = {"Authorization": "Bearer secret"}
+        assert requests.get(f"{base}/jobs", headers=good, timeout=5).status_code == 200
+    finally:
+        server.stop()
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Moteur asyncio: transferts concurrents, écritures partagées, reprise"""
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+from conftest import FAST_RETRY, content
+
+from download import ResumeJournal, async_engine, output
+from download.async_engine import AsyncDownloadQueue
+from download.journal import part_path_for
+from download.output import FSYNC_CLOSE, WritePolicy
+from download.scheduler import CANCELLED, COMPLETED, FAILED
+
+SIZE = 2 * 1024 * 1024
+
+
+def run(queue):
+    return asyncio.run(queue.run_async())
+
+
+def test_many_files_are_transferred_concurrently(bench, tmp_path):
+    queue = AsyncDownloadQueue(max_concurrent=8, max_per_host=4)
+    urls = [
+        f"{bench.base_url}/conc{index}-{1000 * (index + 1)}.bin" for index in range(20)
+    ]
+    queue.add_many(urls, str(tmp_path))
+    jobs = run(queue)
+    assert [job.status for job in jobs] == [COMPLETED] * 20
+    for index in range(20):
+        size = 1000 * (index + 1)
+        assert (tmp_path / f"conc{index}-{size}.bin").read_bytes() == content(size)
+
+
+def test_many_files_share_one_write_pool(bench, tmp_path, monkeypatch):
+    syncs = []
+    monkeypatch.setattr(output, "sync_file", syncs.append)
+    queue = AsyncDownloadQueue(
+        max_concurrent=4,
+        max_per_host=2,
+        write_policy=WritePolicy(2, max_pending=1 << 20, fsync=FSYNC_CLOSE),
+    )
+    urls = [
+        f"{bench.base_url}/many{index}-{SIZE // (index + 1)}.bin" for index in range(6)
+    ]
+    queue.add_many(urls, str(tmp_path))
+    threads = threading.active_count()
+    jobs = run(queue)
+    assert [job.status for job in jobs] == [COMPLETED] * 6
+    for index in range(6):
+        assert (
+            tmp_path / f"many{index}-{SIZE // (index + 1)}.bin"
+        ).read_bytes() == content(SIZE // (index + 1))
+    assert len(syncs) == 6
+    # Pool partagé fermé à la fin de run_async()
+    assert queue.write_pool is None
+    assert threading.active_count() <= threads
+
+
+def test_loop_stays_responsive_while_writing(bench, tmp_path, monkeypatch):
+    original = output.PartFile.pwrite
+
+    def slow(self, data, offset):
+        time.sleep(0.002)
+        return original(self, data, offset)
+
+    monkeypatch.setattr(output.PartFile, "pwrite", slow)
+    queue = AsyncDownloadQueue(write_policy=WritePolicy(1, max_pending=256 * 1024))
+    queue.add(f"{bench.base_url}/lag-{SIZE}.bin", str(tmp_path))
+    lags = []
+
+    async def scenario():
+        async def probe():
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lags.append(time.perf_counter() - started - 0.01)
+
+        prober = asyncio.ensure_future(probe())
+        jobs = await queue.run_async()
+        prober.cancel()
+        return jobs
+
+    [job] = asyncio.run(scenario())
+    assert job.status == COMPLETED
+    assert max(lags) < 0.2
+
+
+@pytest.mark.parametrize("threads", [0, 2])
+def test_disk_io_stays_off_the_loop(bench, tmp_path, monkeypatch, threads):
+    loop_threads = set()
+    touched = []
+
+    def record(function):
+        def wrapper(*args, **kwargs):
+            touched.append(threading.current_thread())
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    for name in ("pwrite", "preallocate"):
+        monkeypatch.setattr(
+            output.PartFile, name, record(getattr(output.PartFile, name))
+        )
+    monkeypatch.setattr(
+        async_engine, "check_free_space", record(async_engine.check_free_space)
+    )
+    monkeypatch.setattr(ResumeJournal, "load", record(ResumeJournal.load))
+    queue = AsyncDownloadQueue(write_policy=WritePolicy(threads))
+    queue.add_many(
+        [f"{bench.base_url}/offloop{i}-{SIZE}.bin" for i in range(3)], str(tmp_path)
+    )
+
+    async def scenario():
+        loop_threads.add(threading.current_thread())
+        return await queue.run_async()
+
+    jobs = asyncio.run(scenario())
+    assert [job.status for job in jobs] == [COMPLETED] * 3
+    assert touched and loop_threads.isdisjoint(touched)
+
+
+def test_interrupted_transfer_resumes_from_journal(bench, tmp_path):
+    url = f"{bench.base_url}/async-cut-{SIZE}.bin?rate=4000000"
+    queue = AsyncDownloadQueue()
+    job = queue.add(url, str(tmp_path))
+
+    def cancel_when_started():
+        while job.manager.downloaded_size < SIZE // 4:
+            time.sleep(0.01)
+        queue.cancel(job, remove_partial=False)
+
+    threading.Thread(target=cancel_when_started, daemon=True).start()
+    run(queue)
+    assert job.status == CANCELLED
+    path = str(tmp_path / f"async-cut-{SIZE}.bin")
+    assert os.path.exists(part_path_for(path))
+    assert 0 < ResumeJournal.load(path).completed_bytes() < SIZE
+
+    statuses = []
+    queue = AsyncDownloadQueue(on_status=lambda job, message: statuses.append(message))
+    job = queue.add(url, str(tmp_path))
+    run(queue)
+    assert job.status == COMPLETED
+    assert any(message.startswith("📥 Reprise") for message in statuses)
+    assert open(path, "rb").read() == content(SIZE)
+
+
+def test_pause_and_cancel_from_another_thread(bench, tmp_path):
+    queue = AsyncDownloadQueue()
+    paused = queue.add(
+        f"{bench.base_url}/async-pause-{SIZE}.bin?rate=8000000", str(tmp_path)
+    )
+    cancelled = queue.add(
+        f"{bench.base_url}/async-gone-{SIZE}.bin?rate=2000000", str(tmp_path)
+    )
+    observed = []
+
+    def control():
+        while (
+            paused.manager.downloaded_size == 0
+            or cancelled.manager.downloaded_size == 0
+        ):
+            time.sleep(0.01)
+        paused.manager.pause()
+        queue.cancel(cancelled)
+        time.sleep(0.3)
+        before = paused.manager.downloaded_size
+        time.sleep(0.3)
+        observed.append(paused.manager.downloaded_size - before)
+        paused.manager.resume()
+
+    threading.Thread(target=control, daemon=True).start()
+    run(queue)
+    assert observed == [0]
+    assert (paused.status, cancelled.status) == (COMPLETED, CANCELLED)
+    assert sorted(os.listdir(tmp_path)) == [f"async-pause-{SIZE}.bin"]
+
+
+def test_errors_are_retried_then_reported(bench, tmp_path):
+    queue = AsyncDownloadQueue(retry_policy=FAST_RETRY)
+    retried = queue.add(
+        f"{bench.base_url}/async-fault-{SIZE}.bin?faults=2&fail_after=300000",
+        str(tmp_path),
+    )
+    failed = queue.add(
+        f"{bench.base_url}/async-down-1000.bin?faults=10&status=503", str(tmp_path)
+    )
+    run(queue)
+    assert retried.status == COMPLETED
+    assert (tmp_path / f"async-fault-{SIZE}.bin").read_bytes() == content(SIZE)
+    assert failed.status == FAILED and failed.error is not None
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        AsyncDownloadQueue(max_per_host=0)
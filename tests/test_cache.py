@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Cache de téléchargements: copies indépendantes, vérification, éviction"""
+
+import os
+import stat
+
+from conftest import content, sha256
+
+from download import DownloadCache, DownloadManager
+from download.cache import CacheEntry
+
+
+def write(path, data):
+    with open(path, "wb") as file:
+        file.write(data)
+    return str(path)
+
+
+def test_store_and_materialize_keep_user_files_independent(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    data = content(20000)
+    source = write(tmp_path / "f.bin", data)
+    entry = cache.store("http://x/f.bin", source, etag='"e"')
+    assert entry.digest == sha256(data) and entry.size == len(data)
+
+    # Le fichier de l'utilisateur reste modifiable et distinct de l'objet
+    info = os.stat(source)
+    assert info.st_mode & stat.S_IWUSR and info.st_nlink == 1
+    assert cache.lookup("http://x/f.bin").digest == entry.digest
+
+    target = str(tmp_path / "copie.bin")
+    assert cache.materialize(entry, target) in ("reflink", "copy")
+    assert open(target, "rb").read() == data
+    assert os.stat(target).st_mode & stat.S_IWUSR
+    assert not os.path.samefile(target, cache.object_path(entry.digest))
+
+
+def test_store_requires_a_validator(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    assert cache.store("http://x/f.bin", write(tmp_path / "f.bin", b"abc")) is None
+    assert cache.lookup("http://x/f.bin") is None
+
+
+def test_tampered_object_is_never_served(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    entry = cache.store(
+        "http://x/f.bin", write(tmp_path / "f.bin", b"0123456789"), etag='"e"'
+    )
+    path = cache.object_path(entry.digest)
+    os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+    write(path, b"9876543210")  # Même taille, autre contenu
+
+    target = str(tmp_path / "copie.bin")
+    assert cache.materialize(entry, target) is None
+    assert not os.path.exists(target)
+    assert not os.path.exists(path)
+    assert cache.lookup("http://x/f.bin") is None
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"), max_size=25)
+    first = cache.store("http://x/1", write(tmp_path / "1", b"a" * 10), etag='"1"')
+    os.utime(cache.object_path(first.digest), (1, 1))
+    second = cache.store("http://x/2", write(tmp_path / "2", b"b" * 10), etag='"2"')
+    assert cache.total_size == 20
+    cache.store("http://x/3", write(tmp_path / "3", b"c" * 10), etag='"3"')
+    assert not os.path.exists(cache.object_path(first.digest))
+    assert os.path.exists(cache.object_path(second.digest))
+    assert cache.total_size == 20
+    # Fichier plus gros que tout le cache: pas stocké
+    assert (
+        cache.store("http://x/4", write(tmp_path / "4", b"d" * 30), etag='"4"') is None
+    )
+
+
+def test_entry_freshness():
+    entry = CacheEntry(
+        "http://x/f",
+        "d" * 64,
+        3,
+        etag='"e"',
+        last_modified="Mon, 01 Jan 2024 00:00:00 GMT",
+    )
+    assert entry.conditional_headers() == {
+        "If-None-Match": '"e"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+
+
+def test_second_download_is_served_from_cache(files, tmp_path):
+    data = content(50000)
+    url = files.add("/cached.bin", data)
+    cache = DownloadCache(str(tmp_path / "cache"))
+    first = tmp_path / "a"
+    second = tmp_path / "b"
+    first.mkdir()
+    second.mkdir()
+    assert DownloadManager(cache=cache).download(url, str(first)) is True
+    assert cache.lookup(url) is not None
+
+    statuses = []
+    count = len(files.requests)
+    assert (
+        DownloadManager(cache=cache, on_status=statuses.append).download(
+            url, str(second)
+        )
+        is True
+    )
+    # Seule une revalidation (HEAD conditionnel) atteint le serveur
+    assert [
+        method for method, path in files.requests[count:] if path == "/cached.bin"
+    ] == ["HEAD"]
+    assert (second / "cached.bin").read_bytes() == data
+    assert any("cache" in message for message in statuses)
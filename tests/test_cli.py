@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""Ligne de commande: validation des options et routage des URL"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+from conftest import content
+
+from download import JobStore
+from download.cli import build_parser, main
+from download.output import FSYNC_NEVER
+
+SIZE = 300000
+
+
+def run(capsys, *argv):
+    """(code de sortie, stdout, stderr) de main(argv)"""
+    try:
+        code = main([str(arg) for arg in argv])
+    except SystemExit as e:
+        code = e.code
+    out, err = capsys.readouterr()
+    return code, out, err
+
+
+@pytest.mark.parametrize(
+    "argv, message",
+    [
+        ([], "aucune URL"),
+        (["http://x/a", "http://x/b", "-n", "f"], "--filename"),
+        (["http://x/a", "http://x/b", "-m", "http://y/a"], "--mirror"),
+        (["http://x/a", "-m", "ftp://y/a"], "miroirs"),
+        (["http://x/a", "-c", "sha256:xyz"], "sha256"),
+        (["http://x/a", "http://x/b", "-c", "md5:" + "0" * 32], "--checksum"),
+        (["http://x/a", "-s", "0"], "--segments"),
+        (["http://x/a", "--engine", "vite"], "--engine"),
+        (["http://x/a", "--engine", "async", "--priority", "2"], "--priority"),
+        (["http://x/a", "--limit-rate", "vite"], "--limit-rate"),
+        (["http://x/a", "--pool-size", "0"], "--pool-size"),
+        (["http://x/a", "--retries", "-1"], "--retries"),
+        (["http://x/a", "--engine", "async", "-x"], "--extract"),
+        (["http://x/a", "--engine", "async", "--job-db"], "--job-db"),
+        (["http://x/a", "--api-listen", "hôte:port"], "--api-listen"),
+        (["http://x/a", "--write-threads", "-1"], "--write-threads"),
+        (["-i", "/nonexistent/urls.txt"], "impossible de lire"),
+    ],
+)
+def test_invalid_arguments_are_refused(capsys, argv, message):
+    code, _, err = run(capsys, *argv)
+    assert code == 2
+    assert message in err
+
+
+def test_defaults():
+    args = build_parser().parse_args(["http://x/a"])
+    assert args.fsync == FSYNC_NEVER and args.engine == "threads" and args.dns_ttl == 0
+
+
+def test_single_url_with_filename(bench, tmp_path, capsys):
+    code, out, _ = run(
+        capsys,
+        f"{bench.base_url}/one-{SIZE}.bin",
+        "-o",
+        tmp_path,
+        "-n",
+        "nom.bin",
+        "-q",
+    )
+    assert code == 0
+    assert out.strip() == str(tmp_path / "nom.bin")
+    assert (tmp_path / "nom.bin").read_bytes() == content(SIZE)
+
+
+def test_several_urls_and_input_file(bench, tmp_path, capsys):
+    urls = tmp_path / "urls.txt"
+    urls.write_text(
+        f"# fichiers\n{bench.base_url}/in1-{SIZE}.bin\n{bench.base_url}/in2-1000.bin\n"
+    )
+    out_dir = tmp_path / "out"
+    code, out, err = run(
+        capsys,
+        f"{bench.base_url}/arg-2000.bin",
+        "pas-une-url",
+        "-i",
+        urls,
+        "-o",
+        out_dir,
+    )
+    # URL invalide signalée, les autres téléchargées
+    assert code == 1
+    assert "pas-une-url" in err
+    assert sorted(os.path.basename(line) for line in out.split()) == [
+        "arg-2000.bin",
+        f"in1-{SIZE}.bin",
+        "in2-1000.bin",
+    ]
+    assert (out_dir / "in2-1000.bin").read_bytes() == content(1000)
+
+
+def test_filename_applies_to_the_new_url_beside_resumed_jobs(bench, tmp_path, capsys):
+    database = str(tmp_path / "jobs.db")
+    store = JobStore(database)
+    store.add(f"{bench.base_url}/old-{SIZE}.bin", str(tmp_path))
+    store.close()
+
+    code, out, _ = run(
+        capsys,
+        f"{bench.base_url}/new-{SIZE}.bin",
+        "-n",
+        "renomme.bin",
+        "-o",
+        tmp_path,
+        "--job-db",
+        database,
+    )
+    assert code == 0
+    assert sorted(os.path.basename(line) for line in out.split()) == [
+        f"old-{SIZE}.bin",
+        "renomme.bin",
+    ]
+    assert (tmp_path / "renomme.bin").read_bytes() == content(SIZE)
+
+    store = JobStore(database)
+    assert store.unfinished() == []
+    store.close()
+    # Plus rien à reprendre
+    code, _, err = run(capsys, "-o", tmp_path, "--job-db", database)
+    assert code == 0 and "Aucun téléchargement inachevé" in err
+
+
+def test_default_job_db(tmp_path, capsys, monkeypatch):
+    database = tmp_path / "defaut.db"
+    monkeypatch.setenv("PYTDM_JOB_DB", str(database))
+    code, _, err = run(capsys, "-o", tmp_path, "--job-db")
+    assert code == 0 and "Aucun téléchargement inachevé" in err
+    assert database.exists()
+
+
+def test_import_loads_neither_sqlite_nor_archives():
+    code = (
+        "import sys; before = set(sys.modules); import download.cli; "
+        "print(sorted({'sqlite3', 'lzma', 'bz2', 'tarfile'} "
+        "& (set(sys.modules) - before)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_async_engine(bench, tmp_path, capsys):
+    code, out, _ = run(
+        capsys,
+        f"{bench.base_url}/async1-{SIZE}.bin",
+        f"{bench.base_url}/async2-1000.bin",
+        "--engine",
+        "async",
+        "-o",
+        tmp_path,
+        "--fsync",
+        "close",
+    )
+    assert code == 0
+    assert len(out.split()) == 2
+    assert (tmp_path / f"async1-{SIZE}.bin").read_bytes() == content(SIZE)
+
+
+def test_fsync_without_writer_threads(bench, tmp_path, capsys):
+    code, _, _ = run(
+        capsys,
+        f"{bench.base_url}/sync-{SIZE}.bin",
+        "-o",
+        tmp_path,
+        "--write-threads",
+        "0",
+        "--fsync",
+        "periodic",
+        "--stats",
+    )
+    assert code == 0
+    assert (tmp_path / f"sync-{SIZE}.bin").read_bytes() == content(SIZE)
+
+
+def test_failed_download_sets_exit_code(bench, tmp_path, capsys):
+    code, _, err = run(
+        capsys, f"{bench.base_url}/down-1000.bin?faults=10&status=404", "-o", tmp_path
+    )
+    assert code == 1
+    assert "404" in err
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Décompression et extraction au fil du téléchargement"""
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import time
+
+import pytest
+from conftest import content
+
+from download import DownloadManager
+from download.extract import (
+    DECOMPRESS,
+    EXTRACT,
+    ExtractionError,
+    StreamExtractor,
+    decompressed_name,
+    detect_compression,
+    extracted_name,
+    is_tar,
+)
+
+DATA = content(600000)
+
+
+def tar_bytes(members):
+    """Archive tar (non compressée) de {nom: contenu}"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "délai dépassé"
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize(
+    "filename, decompressed, extracted",
+    [
+        ("a.tar.gz", "a.tar", "a"),
+        ("a.tgz", "a.tar", "a"),
+        ("a.txt.xz", "a.txt", "a.txt.d"),
+        ("a.bin", "a.bin.out", "a.bin.d"),
+        ("a.tar", "a.tar.out", "a"),
+    ],
+)
+def test_output_names(filename, decompressed, extracted):
+    assert decompressed_name(filename) == decompressed
+    assert extracted_name(filename) == extracted
+
+
+def test_detection():
+    assert detect_compression(gzip.compress(b"x")) == "gzip"
+    assert detect_compression(lzma.compress(b"x")) == "xz"
+    assert detect_compression(bz2.compress(b"x")) == "bzip2"
+    assert detect_compression(b"texte") is None
+    assert is_tar(tar_bytes({"f": b"x"}))
+    assert not is_tar(b"\0" * 10)
+
+
+@pytest.mark.parametrize(
+    "suffix, compress",
+    [("gz", gzip.compress), ("xz", lzma.compress), ("bz2", bz2.compress)],
+)
+def test_download_is_decompressed(files, tmp_path, suffix, compress):
+    compressed = compress(DATA)
+    url = files.add(f"/data.bin.{suffix}", compressed)
+    manager = DownloadManager(extract=DECOMPRESS)
+    assert manager.download(url, str(tmp_path)) is True
+    assert manager.extracted_path == str(tmp_path / "data.bin")
+    assert (tmp_path / "data.bin").read_bytes() == DATA
+    # Le fichier téléchargé est conservé tel quel
+    assert (tmp_path / f"data.bin.{suffix}").read_bytes() == compressed
+
+
+@pytest.mark.parametrize("segments", [1, 4])
+def test_archive_is_extracted_while_downloading(files, tmp_path, segments):
+    archive = gzip.compress(tar_bytes({"dossier/a.bin": DATA, "b.txt": b"bonjour"}))
+    url = files.add(f"/archive{segments}.tar.gz", archive)
+    assert (
+        DownloadManager(extract=EXTRACT, segments=segments).download(url, str(tmp_path))
+        is True
+    )
+    folder = tmp_path / f"archive{segments}"
+    assert (folder / "dossier" / "a.bin").read_bytes() == DATA
+    assert (folder / "b.txt").read_bytes() == b"bonjour"
+
+
+def test_plain_file_is_left_alone(files, tmp_path):
+    url = files.add("/plain.txt", b"rien de compresse")
+    statuses = []
+    assert (
+        DownloadManager(extract=EXTRACT, on_status=statuses.append).download(
+            url, str(tmp_path)
+        )
+        is True
+    )
+    assert os.listdir(tmp_path) == ["plain.txt"]
+    assert any("rien à extraire" in message for message in statuses)
+
+
+def test_unsafe_archive_is_refused_but_file_is_kept(files, tmp_path):
+    url = files.add("/evil.tar", tar_bytes({"../evil.txt": b"hors du dossier"}))
+    (tmp_path / "out").mkdir()
+    with pytest.raises(ExtractionError):
+        DownloadManager(extract=EXTRACT).download(url, str(tmp_path / "out"))
+    assert not (tmp_path / "evil.txt").exists()
+    assert (tmp_path / "out" / "evil.tar").exists()
+    assert not (tmp_path / "out" / "evil").exists()
+
+
+def test_extractor_follows_a_growing_file(tmp_path):
+    data = gzip.compress(DATA)
+    source = tmp_path / "f.gz.part"
+    source.write_bytes(b"")
+    written = [0]
+    extractor = StreamExtractor(
+        str(source), str(tmp_path / "f.gz"), DECOMPRESS, lambda: written[0]
+    ).start()
+    with open(source, "r+b") as file:
+        for offset in range(0, len(data), 10000):
+            file.write(data[offset : offset + 10000])
+            file.flush()
+            written[0] = min(offset + 10000, len(data))
+            extractor.notify()
+    extractor.finish(len(data))
+    assert extractor.commit() == str(tmp_path / "f")
+    assert (tmp_path / "f").read_bytes() == DATA
+
+
+def test_extractor_restarts_when_the_beginning_is_rewritten(tmp_path):
+    data = gzip.compress(DATA)
+    source = tmp_path / "f.gz.part"
+    # Plage corrompue, retéléchargée ensuite
+    source.write_bytes(data[:10000] + b"\0" * 10000)
+    written = [20000]
+    extractor = StreamExtractor(
+        str(source), str(tmp_path / "f.gz"), DECOMPRESS, lambda: written[0]
+    ).start()
+    wait_for(lambda: extractor.position == 20000)
+    # Plage rejetée puis réécrite: le début contigu recule
+    written[0] = 0
+    extractor.notify()
+    wait_for(lambda: extractor.position == 0)
+    source.write_bytes(data)
+    written[0] = len(data)
+    extractor.finish(len(data))
+    assert extractor.commit() == str(tmp_path / "f")
+    assert (tmp_path / "f").read_bytes() == DATA
+
+
+def test_corrupt_stream_fails(tmp_path):
+    source = tmp_path / "f.gz"
+    source.write_bytes(gzip.compress(DATA)[:1000] + b"\xff" * 1000)
+    extractor = StreamExtractor(
+        str(source), str(source), DECOMPRESS, lambda: 2000
+    ).start()
+    with pytest.raises(ExtractionError):
+        extractor.finish(2000)
+    assert not (tmp_path / "f.part").exists()
+
+
+def test_abort_removes_temporary_output(tmp_path):
+    data = gzip.compress(DATA)
+    source = tmp_path / "f.gz.part"
+    source.write_bytes(data[: len(data) // 2])
+    extractor = StreamExtractor(
+        str(source), str(tmp_path / "f.gz"), DECOMPRESS, lambda: len(data) // 2
+    ).start()
+    extractor.notify()
+    extractor.abort()
+    assert not extractor.thread.is_alive()
+    assert sorted(os.listdir(tmp_path)) == ["f.gz.part"]
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Sommes de contrôle: formats, vérification au fil du transfert, morceaux corrompus"""
+
+import hashlib
+import os
+import zlib
+
+import pytest
+import requests
+from conftest import content, sha256
+
+from download import Checksum, DownloadManager, IntegrityError, ResumeJournal
+from download.integrity import (
+    CorruptRangesError,
+    StreamingVerifier,
+    load_checksum,
+    parse_checksum_file,
+    parse_metalink,
+)
+from download.journal import part_path_for
+
+SIZE = 3 * 1024 * 1024 + 12345
+PIECE = 1024 * 1024
+
+
+def metalink(data, name, digest=None, piece_digests=None):
+    piece_digests = piece_digests or [
+        sha256(data[i : i + PIECE]) for i in range(0, len(data), PIECE)
+    ]
+    pieces = "".join(f"<hash>{piece}</hash>" for piece in piece_digests)
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+<file name="{name}"><size>{len(data)}</size>
+<hash type="sha-256">{digest or sha256(data)}</hash>
+<pieces length="{PIECE}" type="sha-256">{pieces}</pieces></file></metalink>"""
+
+
+@pytest.mark.parametrize(
+    "text, algorithm",
+    [
+        ("sha256:" + "a" * 64, "sha256"),
+        ("MD5=" + "B" * 32, "md5"),
+        ("c" * 40, "sha1"),
+        (" " + "d" * 128 + " ", "sha512"),
+        ("0" * 8, "crc32"),
+    ],
+)
+def test_parse_checksum(text, algorithm):
+    checksum = Checksum.parse(text)
+    assert checksum.algorithm == algorithm
+    assert checksum.digest == text.strip().split(":")[-1].split("=")[-1].lower()
+
+
+@pytest.mark.parametrize("text", ["", "sha256:xyz", "abc", "nope:" + "a" * 64])
+def test_parse_invalid_checksum(text):
+    with pytest.raises(ValueError):
+        Checksum.parse(text)
+
+
+def test_parse_checksum_file_formats():
+    digest = "e" * 64
+    gnu = f'# sommes\n{"f" * 64}  autre.iso\n{digest} *image.iso\n'
+    assert parse_checksum_file(gnu, "image.iso", "http://x/SHA256SUMS").digest == digest
+    bsd = f"SHA256 (image.iso) = {digest}\n"
+    checksum = parse_checksum_file(bsd, "image.iso")
+    assert (checksum.algorithm, checksum.digest) == ("sha256", digest)
+    # Une seule somme: valable quel que soit le nom; algorithme d'après l'extension
+    assert (
+        parse_checksum_file("0" * 32, "x.bin", "http://x/x.bin.md5").algorithm == "md5"
+    )
+    with pytest.raises(ValueError):
+        parse_checksum_file(gnu, "absent.iso")
+
+
+def test_parse_metalink():
+    data = content(SIZE)
+    checksum = parse_metalink(metalink(data, "f.bin"), "f.bin")
+    assert checksum.algorithm == "sha256" and checksum.digest == sha256(data)
+    assert checksum.piece_length == PIECE and len(checksum.pieces) == 4
+    with pytest.raises(ValueError):
+        parse_metalink('<metalink xmlns="urn:autre"/>', "f.bin")
+
+
+def test_load_checksum_from_url(files):
+    digest = "a" * 64
+    url = files.add("/sums/f.bin.sha256", f"{digest}  f.bin\n".encode())
+    checksum = load_checksum(url, "f.bin", requests.Session())
+    assert checksum.digest == digest
+    assert load_checksum(None, "f.bin") is None
+    assert load_checksum("md5:" + "0" * 32, "f.bin").algorithm == "md5"
+
+
+def test_streaming_verifier_checks_whole_file_and_pieces(tmp_path):
+    data = content(SIZE)
+    path = str(tmp_path / "f.bin.part")
+    with open(path, "wb") as file:
+        file.write(data)
+    checksum = parse_metalink(metalink(data, "f.bin"), "f.bin")
+    verifier = StreamingVerifier(checksum, path, SIZE)
+    # Blocs dans le désordre: le hachage global rattrape depuis le disque
+    verifier.update(PIECE, data[PIECE:])
+    verifier.update(0, data[:PIECE])
+    assert verifier.verify() == []
+
+    bad = list(checksum.pieces)
+    bad[2] = "0" * 64
+    verifier = StreamingVerifier(
+        Checksum("sha256", sha256(data), "sha256", PIECE, bad), path, SIZE
+    )
+    verifier.update(0, data)
+    assert verifier.verify() == [(2 * PIECE, 3 * PIECE - 1)]
+
+
+def test_crc32_checksum(tmp_path):
+    data = content(100000)
+    path = str(tmp_path / "f.part")
+    with open(path, "wb") as file:
+        file.write(data)
+    verifier = StreamingVerifier(
+        Checksum("crc32", "%08x" % zlib.crc32(data)), path, len(data)
+    )
+    verifier.update(0, data)
+    assert verifier.verify() == []
+
+
+def test_download_with_checksum(bench, tmp_path):
+    url = f"{bench.base_url}/sum-{SIZE}.bin"
+    statuses = []
+    manager = DownloadManager(on_status=statuses.append)
+    assert (
+        manager.download(url, str(tmp_path), checksum="sha256:" + sha256(content(SIZE)))
+        is True
+    )
+    assert "✅ Somme de contrôle vérifiée (sha256)" in statuses
+
+
+def test_wrong_checksum_removes_partial_file(bench, tmp_path):
+    url = f"{bench.base_url}/badsum-{SIZE}.bin"
+    manager = DownloadManager()
+    with pytest.raises(IntegrityError):
+        manager.download(
+            url, str(tmp_path), checksum="md5:" + hashlib.md5(b"autre").hexdigest()
+        )
+    assert os.listdir(tmp_path) == []
+
+
+def test_corrupt_pieces_are_downloaded_again(bench, files, tmp_path):
+    data = content(SIZE)
+    url = f"{bench.base_url}/pieces-{SIZE}.bin"
+    meta = files.add("/pieces.meta4", metalink(data, f"pieces-{SIZE}.bin").encode())
+    path = str(tmp_path / f"pieces-{SIZE}.bin")
+    # Fichier partiel complet d'après son journal, mais deux morceaux altérés
+    corrupt = bytearray(data)
+    corrupt[PIECE + 5] ^= 0xFF
+    corrupt[3 * PIECE] ^= 0x01
+    with open(part_path_for(path), "wb") as file:
+        file.write(corrupt)
+    manager = DownloadManager()
+    headers = manager.session.head(url).headers
+    journal = ResumeJournal.for_file(
+        path, url, SIZE, headers.get("etag"), headers.get("last-modified")
+    )
+    journal.add(0, SIZE)
+    journal.save(force=True)
+
+    statuses = []
+    manager.on_status = statuses.append
+    assert manager.download(url, str(tmp_path), checksum=meta) is True
+    assert any(
+        "nouveau téléchargement de ces plages" in message for message in statuses
+    )
+    with open(path, "rb") as file:
+        assert file.read() == data
+
+
+def test_pieces_that_stay_corrupt_fail(files, tmp_path):
+    data = content(2 * PIECE)
+    digests = [sha256(data[:PIECE]), "0" * 64]
+    url = files.add("/always-bad.bin", data)
+    meta = files.add(
+        "/always-bad.meta4",
+        metalink(data, "always-bad.bin", piece_digests=digests).encode(),
+    )
+    with pytest.raises(CorruptRangesError):
+        DownloadManager().download(url, str(tmp_path), checksum=meta)
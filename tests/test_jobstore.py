@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Base des jobs: enregistrement, états, reprise au lancement suivant"""
+
+import os
+import time
+
+from conftest import content
+
+from download import DownloadQueue, JobStore
+from download.scheduler import COMPLETED, PENDING
+
+SIZE = 2 * 1024 * 1024
+
+
+def test_job_store_round_trip(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    first = store.add("http://x/a", str(tmp_path), mirrors=["http://y/a"], priority=2)
+    second = store.add("http://x/b", str(tmp_path))
+    store.set_status(second, "completed")
+    store.set_priority(first, 7, deadline=123.0)
+    unfinished = store.unfinished()
+    assert [job.id for job in unfinished] == [first]
+    assert unfinished[0].mirrors == ["http://y/a"]
+    assert (unfinished[0].priority, unfinished[0].deadline) == (7, 123.0)
+    assert store.purge() == 1
+    assert [job.id for job in store.jobs()] == [first]
+    store.close()
+
+
+def test_interrupted_jobs_are_restored_and_resumed(bench, tmp_path):
+    url = f"{bench.base_url}/restore-{SIZE}.bin?rate=4000000"
+    store = JobStore(str(tmp_path / "jobs.db"))
+    queue = DownloadQueue(max_concurrent=1, segments=1, store=store)
+    job = queue.add(url, str(tmp_path / "out"))
+    os.mkdir(tmp_path / "out")
+    queue.start()
+    while job.manager.downloaded_size < SIZE // 4:
+        time.sleep(0.01)
+    queue.cancel(job, remove_partial=False)
+    queue.close()
+    assert queue.join(timeout=10)
+    store.close()
+
+    store = JobStore(str(tmp_path / "jobs.db"))
+    [stored] = store.unfinished()
+    assert stored.status == PENDING and 0 < stored.downloaded < SIZE
+    statuses = []
+    queue = DownloadQueue(
+        max_concurrent=1,
+        segments=1,
+        store=store,
+        on_status=lambda job, message: statuses.append(message),
+    )
+    [restored] = queue.restore()
+    assert (
+        restored.id == stored.id
+        and restored.remaining_size() == SIZE - stored.downloaded
+    )
+    queue.start()
+    queue.close()
+    assert queue.join(timeout=30)
+    assert restored.status == COMPLETED
+    assert any(message.startswith("📥 Reprise") for message in statuses)
+    assert store.get(stored.id).status == COMPLETED
+    assert (tmp_path / "out" / f"restore-{SIZE}.bin").read_bytes() == content(SIZE)
+    store.close()
+
+
+def test_writes_after_close_are_ignored(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id = store.add("http://x/a", str(tmp_path))
+    store.close()
+    # Workers encore actifs à la fermeture: leurs écritures sont sans effet
+    store.set_status(job_id, "running")
+    store.set_priority(job_id, 3)
+    store.track(job_id, object())
+    assert store.thread is None
+    store = JobStore(str(tmp_path / "jobs.db"))
+    assert store.get(job_id).status == PENDING
+    store.close()
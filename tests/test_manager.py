@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""DownloadManager sans interface: flux de taille inconnue, fichier déjà présent"""
+
+from conftest import FAST_RETRY, content
+
+from download import DownloadManager
+
+
+def download(url, folder, **options):
+    """(résultat, messages d'état) d'un téléchargement complet"""
+    statuses = []
+    manager = DownloadManager(
+        on_status=statuses.append, retry_policy=FAST_RETRY, **options
+    )
+    return manager.download(url, str(folder)), statuses
+
+
+def test_unknown_size_is_streamed(bench, tmp_path):
+    result, statuses = download(
+        f"{bench.base_url}/chunked-300000.bin?chunked=1", tmp_path
+    )
+    assert result is True
+    assert any("Taille inconnue" in message for message in statuses)
+    assert (tmp_path / "chunked-300000.bin").read_bytes() == content(300000)
+
+
+def test_existing_complete_file_is_not_downloaded_again(bench, tmp_path):
+    url = f"{bench.base_url}/twice-100000.bin"
+    download(url, tmp_path)
+    result, statuses = download(url, tmp_path)
+    assert result is True
+    assert "✅ Fichier déjà téléchargé" in statuses
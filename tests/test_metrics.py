@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Métriques: registre, format Prometheus, journal JSON lines, point de collecte"""
+
+import json
+import types
+
+import pytest
+import requests
+from conftest import FAST_RETRY
+
+from download import DownloadManager
+from download.metrics import (
+    METRICS,
+    STALL_THRESHOLD,
+    MetricsLog,
+    MetricsRegistry,
+    MetricsServer,
+    ReadTimer,
+    parse_listen_address,
+)
+
+
+def stats(nbytes=1000, wall_seconds=2.0, cpu_seconds=0.5):
+    """Statistiques minimales d'un transfert terminé"""
+    return types.SimpleNamespace(
+        bytes=nbytes,
+        wall_seconds=wall_seconds,
+        cpu_seconds=cpu_seconds,
+        to_dict=lambda: {"bytes": nbytes, "wall_seconds": wall_seconds},
+    )
+
+
+def test_counters_and_gauges():
+    registry = MetricsRegistry()
+    registry.inc("pytdm_bytes_total", 10, host="a")
+    registry.inc("pytdm_bytes_total", 5, host="a")
+    registry.set("pytdm_active_downloads", 3)
+    assert registry.get("pytdm_bytes_total", host="a") == 15
+    assert registry.get("pytdm_bytes_total", host="b") == 0
+    assert registry.get("pytdm_active_downloads") == 3
+    registry.clear()
+    assert registry.get("pytdm_bytes_total", host="a") == 0
+
+
+def test_render_prometheus():
+    registry = MetricsRegistry()
+    registry.response("a", 206, ttfb=0.02)
+    registry.response("a", 206, ttfb=3.0)
+    registry.disk_write('h"1\\', 2048, 0.5)
+    assert registry.render_prometheus() == (
+        "# HELP pytdm_bytes_total Octets écrits sur disque\n"
+        "# TYPE pytdm_bytes_total counter\n"
+        'pytdm_bytes_total{host="h\\"1\\\\"} 2048\n'
+        "# HELP pytdm_disk_write_seconds_total Temps passé à écrire sur disque\n"
+        "# TYPE pytdm_disk_write_seconds_total counter\n"
+        'pytdm_disk_write_seconds_total{host="h\\"1\\\\"} 0.5\n'
+        "# HELP pytdm_responses_total Réponses HTTP reçues, par code\n"
+        "# TYPE pytdm_responses_total counter\n"
+        'pytdm_responses_total{host="a",status="206"} 2\n'
+        "# HELP pytdm_ttfb_seconds Délai entre l'envoi d'une requête et ses en-têtes"
+        " de réponse\n"
+        "# TYPE pytdm_ttfb_seconds histogram\n"
+        'pytdm_ttfb_seconds_bucket{host="a",le="0.005"} 0\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="0.01"} 0\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="0.025"} 1\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="0.05"} 1\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="0.1"} 1\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="0.25"} 1\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="0.5"} 1\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="1"} 1\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="2.5"} 1\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="5"} 2\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="10"} 2\n'
+        'pytdm_ttfb_seconds_bucket{host="a",le="+Inf"} 2\n'
+        'pytdm_ttfb_seconds_sum{host="a"} 3.02\n'
+        'pytdm_ttfb_seconds_count{host="a"} 2\n'
+    )
+
+
+def test_transfer_events(tmp_path):
+    registry = MetricsRegistry()
+    log = registry.open_log(str(tmp_path / "metrics.jsonl"))
+    registry.transfer_started()
+    registry.retry("a", "http-503")
+    registry.transfer_finished("http://a/f", "a", stats(), "completed")
+    registry.transfer_started()
+    registry.transfer_finished(
+        "http://a/g", "a", stats(), "failed", error=ValueError("panne")
+    )
+    registry.close_log()
+    assert log.file.closed
+    assert registry.get("pytdm_active_downloads") == 0
+    assert registry.get("pytdm_downloads_total", outcome="completed") == 1
+    assert registry.get("pytdm_cpu_seconds_total", host="a") == 1.0
+    # Seuls les téléchargements réussis alimentent durée et débit
+    histogram = registry.get("pytdm_download_throughput_bytes_per_second")
+    assert (histogram.count, histogram.sum) == (1, 500.0)
+
+    events = [json.loads(line) for line in open(log.file.name, encoding="utf-8")]
+    assert [event["event"] for event in events] == ["retry", "transfer", "transfer"]
+    assert events[0]["reason"] == "http-503"
+    assert events[1]["outcome"] == "completed" and events[1]["error"] is None
+    assert events[2]["error"] == "panne" and events[2]["bytes"] == 1000
+    assert all(event["time"].endswith("+00:00") for event in events)
+
+
+def test_metrics_log_appends_and_ignores_late_events(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    for index in range(2):
+        log = MetricsLog(path)
+        log.write("retry", index=index, host="hôte")
+        log.close()
+    # Transfert terminé après la fermeture: rien n'est écrit, pas d'erreur
+    log.write("transfer")
+    lines = open(path, encoding="utf-8").read().splitlines()
+    assert [json.loads(line)["index"] for line in lines] == [0, 1]
+    assert "hôte" in lines[0]
+
+
+def test_read_timer_batches_network_waits():
+    registry = MetricsRegistry()
+    network = []
+    transfer = types.SimpleNamespace(add_network=lambda *args: network.append(args))
+    timer = ReadTimer("a", transfer, registry)
+    timer.add(0.4)
+    timer.add(0.4)
+    assert network == []
+    timer.add(STALL_THRESHOLD)
+    assert network == [(0.8 + STALL_THRESHOLD, 1, STALL_THRESHOLD)]
+    assert registry.get("pytdm_stalls_total", host="a") == 1
+    timer.flush()
+    assert len(network) == 1
+    timer.add(0.1)
+    timer.flush()
+    assert network[-1] == (0.1, 0, 0.0)
+
+
+def test_metrics_server():
+    registry = MetricsRegistry()
+    registry.inc("pytdm_retries_total", host="a", reason="délai")
+    server = MetricsServer(port=0, registry=registry).start()
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        response = requests.get(f"{base}/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'pytdm_retries_total{host="a",reason="délai"} 1' in response.text
+        assert requests.get(f"{base}/autre").status_code == 404
+    finally:
+        server.stop()
+
+
+@pytest.mark.parametrize(
+    "text, address",
+    [
+        ("9464", ("127.0.0.1", 9464)),
+        ("0.0.0.0:80", ("0.0.0.0", 80)),
+        ("[::1]:9", ("::1", 9)),
+    ],
+)
+def test_parse_listen_address(text, address):
+    assert parse_listen_address(text) == address
+
+
+def test_invalid_listen_address():
+    with pytest.raises(ValueError):
+        parse_listen_address("hôte:port")
+
+
+def test_downloads_feed_the_process_registry(bench, tmp_path):
+    host = f"127.0.0.1:{bench.server_address[1]}"
+    before = METRICS.get("pytdm_bytes_total", host=host)
+    completed = METRICS.get("pytdm_downloads_total", outcome="completed")
+    manager = DownloadManager(retry_policy=FAST_RETRY)
+    assert manager.download(f"{bench.base_url}/metrics-300000.bin", str(tmp_path))
+    assert METRICS.get("pytdm_bytes_total", host=host) - before == 300000
+    assert METRICS.get("pytdm_downloads_total", outcome="completed") == completed + 1
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Téléchargement depuis plusieurs miroirs"""
+
+import os
+
+import requests
+from conftest import FAST_RETRY, content
+
+from download import DownloadManager, Mirror
+from download.mirrors import MIN_STEAL_SIZE, probe_mirrors, select_mirrors
+from download.segmented import Piece
+
+SIZE = 6 * 1024 * 1024
+
+
+def download(url, folder, mirrors, **options):
+    statuses = []
+    manager = DownloadManager(
+        on_status=statuses.append, retry_policy=FAST_RETRY, **options
+    )
+    result = manager.download(url, str(folder), mirrors=mirrors)
+    return result, manager, statuses
+
+
+def test_piece_split_and_take_never_overlap():
+    piece = Piece(0, 4 * MIN_STEAL_SIZE - 1)
+    assert piece.take(MIN_STEAL_SIZE) == MIN_STEAL_SIZE
+    stolen = piece.split(MIN_STEAL_SIZE)
+    assert (stolen.start, stolen.end) == (
+        MIN_STEAL_SIZE + 3 * MIN_STEAL_SIZE // 2,
+        4 * MIN_STEAL_SIZE - 1,
+    )
+    assert piece.end == stolen.start - 1
+    # Le propriétaire ne reçoit plus que ce qui lui reste
+    assert piece.take(10 * MIN_STEAL_SIZE) == piece.end + 1 - MIN_STEAL_SIZE
+    assert piece.take(1) == 0 and piece.remaining == 0
+    assert piece.split(MIN_STEAL_SIZE) is None
+
+
+def test_mirror_selection(bench):
+    urls = [
+        f"{bench.base_url}/404",
+        f"{bench.base_url}/sel-1000.bin?latency=0.05",
+        f"{bench.base_url}/sel-1000.bin",
+        f"{bench.base_url}/sel-1001.bin",  # Autre taille: autre fichier
+    ]
+    probed = probe_mirrors(requests.Session(), urls, {})
+    assert probed[0].error is not None
+    selected = select_mirrors(probed)
+    # Référence (première URL joignable) en tête, puis les autres par latence
+    assert [mirror.url for mirror in selected] == urls[1:3]
+    assert all(mirror.accepts_ranges for mirror in selected)
+
+
+def test_malformed_content_length_is_an_unknown_size():
+    class Session:
+        def head(self, url, **options):
+            response = requests.Response()
+            response.status_code = 200
+            response.headers["Content-Length"] = "12, 12" if "bad" in url else "12"
+            return response
+
+    bad, good = probe_mirrors(Session(), ["http://a/bad", "http://b/good"], {})
+    assert bad.error is None and bad.total_size == 0
+    assert good.total_size == 12
+
+
+def test_mirror_agreement():
+    first, second = Mirror("http://a/f"), Mirror("http://b/f")
+    first.total_size = second.total_size = 10
+    first.etag, second.etag = '"x"', '"y"'
+    assert not first.agrees_with(second)
+    second.etag = 'W/"y"'
+    assert first.agrees_with(second)
+    assert first.if_range() == '"x"' and second.if_range() is None
+
+
+def test_download_spread_over_mirrors(bench, tmp_path):
+    url = f"{bench.base_url}/spread-{SIZE}.bin?rate=20000000"
+    mirrors = [
+        f"{bench.base_url}/spread-{SIZE}.bin",
+        f"{bench.base_url}/spread-{SIZE + 1}.bin",
+        "http://127.0.0.1:9/x",
+    ]
+    result, manager, statuses = download(url, tmp_path, mirrors, segments=4)
+    assert result is True
+    assert (
+        "🌐 2 sources utilisables (2 écartée(s): injoignable ou fichier différent)"
+        in statuses
+    )
+    assert all(mirror.rate for mirror in manager.mirrors)
+    assert (tmp_path / f"spread-{SIZE}.bin").read_bytes() == content(SIZE)
+
+
+def test_unreachable_primary_falls_back_to_a_mirror(bench, tmp_path):
+    result, _, statuses = download(
+        "http://127.0.0.1:9/fallback.bin",
+        tmp_path,
+        [f"{bench.base_url}/fallback-{SIZE}.bin"],
+    )
+    assert result is True
+    assert any(
+        message.startswith("⚠️ Source principale injoignable") for message in statuses
+    )
+    assert os.listdir(tmp_path) == [f"fallback-{SIZE}.bin"]
+
+
+def test_failing_mirror_is_dropped(bench, tmp_path):
+    url = f"{bench.base_url}/flaky-{SIZE}.bin"
+    broken = f"{url}?faults=100&fail_after=1000"
+    result, manager, statuses = download(url, tmp_path, [broken], segments=4)
+    assert result is True
+    assert f"⚠️ Miroir écarté: {broken}" in statuses
+    assert (tmp_path / f"flaky-{SIZE}.bin").read_bytes() == content(SIZE)
+
+
+def test_mirror_without_ranges_is_not_used(bench, tmp_path):
+    url = f"{bench.base_url}/ranges-{SIZE}.bin"
+    result, manager, _ = download(url, tmp_path, [f"{url}?norange=1"])
+    assert result is True
+    assert [mirror.url for mirror in manager.mirrors] == [url]
+    assert (tmp_path / f"ranges-{SIZE}.bin").read_bytes() == content(SIZE)
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Fichiers partiels: écritures positionnelles, threads, fsync, espace libre"""
+
+import asyncio
+import errno
+import threading
+
+import pytest
+
+from download import output
+from download.output import (
+    FSYNC_CLOSE,
+    FSYNC_NEVER,
+    FSYNC_PERIODIC,
+    DiskWriter,
+    InsufficientSpaceError,
+    PartFile,
+    WritePolicy,
+    WritePool,
+    check_free_space,
+)
+
+
+@pytest.fixture
+def syncs(monkeypatch):
+    """Liste des descripteurs synchronisés"""
+    calls = []
+    monkeypatch.setattr(output, "sync_file", calls.append)
+    return calls
+
+
+def test_part_file_preallocates_and_writes_at_offsets(tmp_path):
+    path = str(tmp_path / "f.bin")
+    with PartFile(path, total_size=10) as part:
+        assert part.pwrite(b"cd", 2) == 2
+        writer = part.at(4)
+        writer.write(b"ef")
+        writer.write(b"gh")
+        part.pwrite(b"ab", 0)
+    assert open(path + ".part", "rb").read() == b"abcdefgh\0\0"
+    # Reprise: le contenu existant est conservé
+    with PartFile(path, total_size=10, resume=True) as part:
+        part.pwrite(b"ij", 8)
+    assert open(path + ".part", "rb").read() == b"abcdefghij"
+    with PartFile(path) as part:
+        pass
+    assert open(path + ".part", "rb").read() == b""
+
+
+def test_close_is_idempotent(tmp_path):
+    part = PartFile(str(tmp_path / "f.bin"))
+    part.close()
+    part.close()
+    assert part.fd is None
+
+
+@pytest.mark.parametrize("threads", [0, 1, 3])
+def test_writes_through_the_disk_writer(tmp_path, threads):
+    path = str(tmp_path / "f.bin")
+    done = []
+    part = PartFile(
+        path, total_size=64 * 1000, write_policy=WritePolicy(threads, max_pending=4000)
+    )
+    assert (part.disk_writer is None) == (threads == 0)
+    for index in range(64):
+        block = bytes([index]) * 1000
+        if part.disk_writer is None:
+            part.pwrite(block, index * 1000)
+        else:
+            part.disk_writer.submit(
+                index * 1000, block, on_done=lambda offset, data: done.append(offset)
+            )
+    part.close()
+    assert open(path + ".part", "rb").read() == b"".join(
+        bytes([index]) * 1000 for index in range(64)
+    )
+    if threads:
+        assert sorted(done) == [index * 1000 for index in range(64)]
+
+
+def test_write_error_is_raised_by_drain(tmp_path):
+    part = PartFile(str(tmp_path / "f.bin"), write_policy=WritePolicy(1))
+    writer = part.disk_writer
+
+    def fail(data, offset):
+        raise OSError(errno.EIO, "panne")
+
+    part.pwrite = fail
+    writer.submit(0, b"abc")
+    with pytest.raises(OSError):
+        writer.drain()
+    with pytest.raises(OSError):
+        writer.submit(3, b"def")
+    with pytest.raises(OSError):
+        part.close()
+    assert part.fd is None
+
+
+def test_shared_pool_recycles_buffers(tmp_path):
+    pool = WritePool(threads=2, max_pending=1 << 20)
+    parts = [
+        PartFile(
+            str(tmp_path / f"{index}.bin"), write_policy=WritePolicy(), write_pool=pool
+        )
+        for index in range(2)
+    ]
+    for part in parts:
+        buffer = part.disk_writer.buffer(4)
+        buffer[:] = b"data"
+        part.disk_writer.submit(0, buffer, recycle=True)
+        part.close()
+    # Le pool partagé survit aux fichiers
+    assert all(thread.is_alive() for thread in pool.threads)
+    assert len(pool.buffer(4)) == 4
+    pool.close()
+    assert not any(thread.is_alive() for thread in pool.threads)
+    assert [open(part.path, "rb").read() for part in parts] == [b"data", b"data"]
+
+
+def test_async_room_waits_without_blocking_the_loop(tmp_path):
+    release = threading.Event()
+    pool = WritePool(threads=1, max_pending=10)
+    part = PartFile(
+        str(tmp_path / "f.bin"),
+        write_policy=WritePolicy(),
+        write_pool=pool,
+        backpressure=False,
+    )
+    writer = part.disk_writer
+    original = part.pwrite
+
+    def slow(data, offset):
+        release.wait()
+        return original(data, offset)
+
+    part.pwrite = slow
+
+    async def scenario():
+        # Sans attente, même au-delà de max_pending
+        writer.submit(0, b"0123456789abcdef")
+        assert not pool.has_room()
+        ticks = 0
+        waiting = asyncio.ensure_future(writer.room())
+        while not waiting.done():
+            ticks += 1
+            if ticks == 5:
+                release.set()
+            await asyncio.sleep(0.01)
+        return ticks
+
+    assert asyncio.run(scenario()) >= 5
+    part.close()
+    pool.close()
+    assert open(part.path, "rb").read() == b"0123456789abcdef"
+
+
+@pytest.mark.parametrize("threads", [0, 1])
+def test_fsync_policies(tmp_path, syncs, monkeypatch, threads):
+    with PartFile(
+        str(tmp_path / "never.bin"),
+        write_policy=WritePolicy(threads, fsync=FSYNC_NEVER),
+    ) as part:
+        part.pwrite(b"x", 0)
+    assert syncs == []
+
+    with PartFile(
+        str(tmp_path / "close.bin"),
+        write_policy=WritePolicy(threads, fsync=FSYNC_CLOSE),
+    ) as part:
+        part.pwrite(b"x", 0)
+        assert syncs == []
+    assert len(syncs) == 1
+
+    syncs.clear()
+    monkeypatch.setattr(output, "FSYNC_INTERVAL", 0.0)
+    with PartFile(
+        str(tmp_path / "periodic.bin"),
+        write_policy=WritePolicy(threads, fsync=FSYNC_PERIODIC),
+    ) as part:
+        part.pwrite(b"x", 0)
+        part.pwrite(b"y", 1)
+        assert len(syncs) == 2
+    assert len(syncs) == 3
+
+
+def test_unknown_fsync_policy():
+    with pytest.raises(ValueError):
+        WritePolicy(fsync="souvent")
+
+
+def test_free_space_check(tmp_path, monkeypatch):
+    path = str(tmp_path / "f.bin")
+    monkeypatch.setattr(output, "free_space", lambda folder: 1000)
+    check_free_space(path, 1000)
+    check_free_space(path, None)
+    with pytest.raises(InsufficientSpaceError) as raised:
+        check_free_space(path, 5000)
+    assert raised.value.errno == errno.ENOSPC
+    assert (raised.value.needed, raised.value.free) == (5000, 1000)
+    # L'espace déjà alloué au fichier partiel est décompté
+    with PartFile(path, total_size=8192):
+        pass
+    check_free_space(path, 8192)
+
+
+def test_disk_writer_without_part_file_pool(tmp_path):
+    part = PartFile(str(tmp_path / "f.bin"))
+    writer = DiskWriter(part)
+    writer.submit(0, b"abc")
+    writer.close()
+    part.close()
+    assert not any(thread.is_alive() for thread in writer.pool.threads)
+    assert open(part.path, "rb").read() == b"abc"
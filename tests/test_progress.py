@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""Progression échantillonnée: fenêtre de vitesse, agrégateur, échantillonneur"""
+
+import asyncio
+import types
+
+import pytest
+
+from download import DownloadQueue, progress
+from download.progress import (
+    ProgressAggregator,
+    ProgressSnapshot,
+    ProgressTicker,
+    SpeedWindow,
+    format_eta,
+)
+
+MB = 1024 * 1024
+
+
+class Source:
+    def __init__(self, total=0):
+        self.downloaded_size = 0
+        self.total_size = total
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=100.0)
+    monkeypatch.setattr(
+        progress, "time", types.SimpleNamespace(monotonic=lambda: clock.now)
+    )
+    return clock
+
+
+@pytest.mark.parametrize(
+    "seconds, text",
+    [
+        (None, "?"),
+        (0.2, "1 s"),
+        (42, "42 s"),
+        (185, "3 min 05 s"),
+        (3720, "1 h 02 min"),
+    ],
+)
+def test_format_eta(seconds, text):
+    assert format_eta(seconds) == text
+
+
+def test_speed_window_slides():
+    window = SpeedWindow(window=3.0)
+    assert window.add(0.0, 0) == 0.0
+    assert window.add(1.0, 1000) == 1000.0
+    assert window.add(2.0, 2000) == 1000.0
+    # Les échantillons de plus de 3 s sont oubliés: seule la fin compte
+    window.add(3.0, 2000)
+    window.add(4.0, 2000)
+    assert window.add(5.0, 8000) == pytest.approx(6000 / 3)
+    assert len(window.samples) <= 4
+
+
+def test_speed_window_restarts_when_the_counter_goes_back():
+    window = SpeedWindow()
+    window.add(0.0, 0)
+    window.add(1.0, 5000)
+    assert window.add(2.0, 100) == 0.0
+    assert window.add(3.0, 1100) == 1000.0
+
+
+def test_aggregator_computes_speed_and_eta(clock):
+    aggregator = ProgressAggregator()
+    known, unknown = Source(total=10 * MB), Source()
+    aggregator.track("a", known)
+    aggregator.track("b", unknown)
+    aggregator.sample()
+    clock.now += 1
+    known.downloaded_size = unknown.downloaded_size = 2 * MB
+    snapshots = dict(aggregator.sample())
+    assert snapshots["a"] == ProgressSnapshot(2 * MB, 10 * MB, 2.0, 4.0)
+    # Taille inconnue: pas de temps restant
+    assert snapshots["b"] == ProgressSnapshot(2 * MB, 0, 2.0, None)
+    aggregator.untrack("b")
+    aggregator.untrack("absent")
+    assert [key for key, _ in aggregator.sample()] == ["a"]
+
+
+def test_ticker_reports_only_changes(clock):
+    aggregator = ProgressAggregator()
+    source = Source(total=100)
+    aggregator.track("a", source)
+    calls = []
+    ticker = ProgressTicker(aggregator, lambda key, snapshot: calls.append(key))
+    ticker.tick()
+    ticker.tick()
+    assert calls == ["a"]
+    source.downloaded_size = 50
+    ticker.tick()
+    assert calls == ["a", "a"]
+
+
+def test_ticker_thread_takes_a_last_sample_on_stop():
+    aggregator = ProgressAggregator()
+    source = Source(total=100)
+    aggregator.track("a", source)
+    snapshots = []
+    ticker = ProgressTicker(
+        aggregator, lambda key, snapshot: snapshots.append(snapshot), interval=60
+    )
+    assert ticker.start().start() is ticker
+    source.downloaded_size = 100
+    ticker.stop()
+    assert not ticker.thread.is_alive()
+    assert snapshots[-1].downloaded == 100
+
+
+def test_ticker_in_an_event_loop():
+    aggregator = ProgressAggregator()
+    source = Source(total=100)
+    aggregator.track("a", source)
+    seen = []
+    ticker = ProgressTicker(
+        aggregator, lambda key, snapshot: seen.append(snapshot.downloaded), 0.01
+    )
+
+    async def scenario():
+        task = asyncio.ensure_future(ticker.run_async())
+        await asyncio.sleep(0.05)
+        source.downloaded_size = 100
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert seen[0] == 0 and seen[-1] == 100
+
+
+def test_queue_progress_comes_from_one_ticker(bench, tmp_path):
+    snapshots = {}
+
+    def record(job, snapshot):
+        snapshots.setdefault(job, []).append(snapshot)
+
+    queue = DownloadQueue(
+        max_concurrent=2, segments=1, progress_interval=0.01, on_progress=record
+    )
+    jobs = queue.run(
+        [f"{bench.base_url}/tick{i}-1000000.bin?rate=4000000" for i in range(2)],
+        str(tmp_path),
+    )
+    assert set(snapshots) == set(jobs)
+    for job in jobs:
+        downloaded = [snapshot.downloaded for snapshot in snapshots[job]]
+        assert downloaded == sorted(downloaded)
+        assert snapshots[job][-1].total == 1000000
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Limitation de débit: seaux à jetons, combinaison de seaux, débit réel"""
+
+import asyncio
+import time
+
+import pytest
+from conftest import FAST_RETRY
+
+from download import DownloadManager, TokenBucket, parse_rate, ratelimit
+from download.ratelimit import BURST_SECONDS, MIN_LIMITED_READ, RateLimiter
+
+
+class Clock:
+    """Horloge monotone pilotée par le test; sleep() la fait avancer"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+@pytest.mark.parametrize(
+    "text, rate",
+    [
+        ("500K", 500 * 1024),
+        ("2M", 2 * 1024 * 1024),
+        ("1.5m", int(1.5 * 1024 * 1024)),
+        ("1000", 1000),
+        ("64kB/s", 64 * 1024),
+        ("0", None),
+        ("", None),
+    ],
+)
+def test_parse_rate(text, rate):
+    assert parse_rate(text) == rate
+
+
+@pytest.mark.parametrize("text", ["vite", "-1K", "2T", "1,5M"])
+def test_parse_invalid_rate(text):
+    with pytest.raises(ValueError):
+        parse_rate(text)
+
+
+def test_unlimited_bucket_never_waits(clock):
+    bucket = TokenBucket()
+    assert bucket.reserve(10**9) == 0.0
+    assert bucket.max_read() is None
+
+
+def test_reservations_line_up(clock):
+    bucket = TokenBucket(1000)
+    # Seau vide au départ: chaque réservation s'ajoute à la dette
+    assert bucket.reserve(1000) == pytest.approx(1.0)
+    assert bucket.reserve(1000) == pytest.approx(2.0)
+    clock.now += 2.0
+    assert bucket.reserve(500) == pytest.approx(0.5)
+
+
+def test_tokens_refill_up_to_the_burst(clock):
+    rate = 100000
+    bucket = TokenBucket(rate)
+    clock.now += 60
+    burst = rate * BURST_SECONDS
+    assert bucket.reserve(burst) == 0.0
+    assert bucket.reserve(rate) == pytest.approx(1.0)
+
+
+def test_explicit_burst_and_minimum_capacity(clock):
+    bucket = TokenBucket(1000, burst=5000)
+    clock.now += 60
+    assert bucket.reserve(5000) == 0.0
+    # Débit très bas: réserve d'au moins une lecture minimale
+    slow = TokenBucket(10)
+    clock.now += 10**6
+    assert slow.reserve(MIN_LIMITED_READ) == 0.0
+    assert slow.max_read() == MIN_LIMITED_READ
+
+
+def test_set_rate_applies_immediately(clock):
+    bucket = TokenBucket(1000)
+    assert bucket.reserve(1000000) == pytest.approx(1000.0)
+    # La dette accumulée sous l'ancien débit est plafonnée
+    bucket.set_rate(1000000)
+    assert bucket.reserve(0) == pytest.approx(BURST_SECONDS)
+    bucket.set_rate(None)
+    assert bucket.reserve(10**9) == 0.0 and bucket.max_read() is None
+    bucket.set_rate(2000)
+    assert bucket.max_read() == MIN_LIMITED_READ
+
+
+def test_limiter_uses_the_slowest_bucket(clock):
+    shared, own = TokenBucket(1000000), TokenBucket(100000)
+    limiter = RateLimiter(shared, None, own)
+    assert limiter.max_read() == own.max_read()
+    # Seaux vides au départ: le délai couvre la dette du seau le plus lent
+    assert limiter.reserve(50000) == pytest.approx(0.5)
+    own.set_rate(None)
+    assert limiter.max_read() == shared.max_read()
+    assert RateLimiter(None).max_read() is None
+
+
+def test_throttle_sleeps_for_the_debt(clock):
+    limiter = RateLimiter(TokenBucket(1000))
+    limiter.throttle(500)
+    limiter.throttle(500)
+    assert clock.sleeps == [pytest.approx(0.5), pytest.approx(0.5)]
+    RateLimiter(TokenBucket()).throttle(10**9)
+    assert len(clock.sleeps) == 2
+
+
+def test_throttle_async_waits_on_the_loop(monkeypatch):
+    waits = []
+
+    async def sleep(delay):
+        waits.append(delay)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    limiter = RateLimiter(TokenBucket(1000))
+    asyncio.run(limiter.throttle_async(250))
+    assert waits == [pytest.approx(0.25, abs=0.01)]
+
+
+def test_download_is_throttled(bench, tmp_path):
+    size = 100000
+    manager = DownloadManager(retry_policy=FAST_RETRY, rate_limit=4 * size)
+    started = time.monotonic()
+    assert manager.download(f"{bench.base_url}/slow-{size}.bin", str(tmp_path))
+    assert time.monotonic() - started >= 0.15
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Reprise par journal: plages écrites, validateurs, pause et annulation"""
+
+import os
+import time
+
+import pytest
+from conftest import FAST_RETRY, content
+
+from download import DownloadManager, ResumeJournal
+from download.journal import journal_path_for, part_path_for
+from download.segmented import MIN_SEGMENT_SIZE
+
+SIZE = 4 * MIN_SEGMENT_SIZE
+
+
+def download(url, folder, **options):
+    """(résultat, gestionnaire, messages d'état) d'un téléchargement complet"""
+    statuses = []
+    options.setdefault("retry_policy", FAST_RETRY)
+    manager = DownloadManager(on_status=statuses.append, **options)
+    result = manager.download(url, str(folder))
+    return result, manager, statuses
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "délai dépassé"
+        time.sleep(0.01)
+
+
+def test_journal_merges_ranges_and_lists_missing(tmp_path):
+    journal = ResumeJournal.for_file(
+        str(tmp_path / "f.bin"), "http://x/f.bin", 100, '"e"'
+    )
+    journal.add(10, 10)
+    journal.add(30, 10)
+    journal.add(20, 10)  # Relie les deux plages
+    assert journal.completed_bytes() == 30
+    assert journal.missing_ranges() == [(0, 9), (40, 99)]
+    assert journal.contiguous_end() == 0
+    journal.add(0, 10)
+    assert journal.contiguous_end() == 40
+    journal.discard(15, 24)
+    assert journal.missing_ranges() == [(15, 24), (40, 99)]
+    assert not journal.is_complete()
+
+
+def test_journal_round_trip_and_validators(tmp_path):
+    path = str(tmp_path / "f.bin")
+    journal = ResumeJournal.for_file(
+        path, "http://x/f.bin", 100, '"e"', "Mon, 01 Jan 2024 00:00:00 GMT"
+    )
+    journal.add(0, 60)
+    journal.save(force=True)
+    loaded = ResumeJournal.load(path)
+    assert loaded.missing_ranges() == [(60, 99)]
+    assert loaded.matches("http://x/f.bin", 100, '"e"', "Mon, 01 Jan 2024 00:00:00 GMT")
+    assert not loaded.matches("http://x/f.bin", 100, '"autre"')
+    assert not loaded.matches("http://x/f.bin", 101, '"e"')
+    assert loaded.if_range() == '"e"'
+    loaded.remove()
+    assert ResumeJournal.load(path) is None
+    assert not os.path.exists(journal_path_for(path))
+
+
+@pytest.mark.parametrize("segments", [1, 4])
+def test_unrecorded_write_is_fetched_again(bench, tmp_path, monkeypatch, segments):
+    # Écriture différée en échec: octets absents du disque et du journal
+    written = DownloadManager.written
+    dropped = []
+
+    def drop_first(manager, offset, data):
+        if not dropped:
+            dropped.append(offset)
+            with open(part_path_for(manager.file_path), "r+b") as part:
+                part.seek(offset)
+                part.write(bytes(len(data)))
+            return
+        written(manager, offset, data)
+
+    monkeypatch.setattr(DownloadManager, "written", drop_first)
+    url = f"{bench.base_url}/hole{segments}-{SIZE}.bin"
+    result, manager, _ = download(url, tmp_path, segments=segments)
+    assert result is True and dropped
+    # Fichier non renommé tant que le trou existait: la plage est refaite
+    assert (tmp_path / f"hole{segments}-{SIZE}.bin").read_bytes() == content(SIZE)
+    assert not os.path.exists(part_path_for(manager.file_path))
+
+
+@pytest.mark.parametrize("segments", [1, 4])
+def test_cancelled_download_resumes_from_journal(bench, tmp_path, segments):
+    url = f"{bench.base_url}/cut{segments}-{SIZE}.bin?rate=8000000"
+    manager = DownloadManager(segments=segments)
+    done = []
+    manager.start(url, str(tmp_path), on_complete=done.append)
+    wait_for(lambda: manager.downloaded_size > SIZE // 4)
+    manager.cancel(remove_partial=False)
+    wait_for(lambda: done)
+    assert done == [False]
+    path = str(tmp_path / f"cut{segments}-{SIZE}.bin")
+    assert os.path.exists(part_path_for(path)) and os.path.exists(
+        journal_path_for(path)
+    )
+    written = ResumeJournal.load(path).completed_bytes()
+    assert 0 < written < SIZE
+
+    # Même URL: le journal ne vaut que pour la ressource qu'il décrit
+    result, manager, statuses = download(url, tmp_path, segments=segments)
+    assert result is True
+    assert any(message.startswith("📥 Reprise") for message in statuses)
+    with open(path, "rb") as file:
+        assert file.read() == content(SIZE)
+
+
+def test_cancel_removes_partial_file(bench, tmp_path):
+    manager = DownloadManager(segments=2)
+    done = []
+    manager.start(
+        f"{bench.base_url}/gone-{SIZE}.bin?rate=4000000",
+        str(tmp_path),
+        on_complete=done.append,
+    )
+    wait_for(lambda: manager.downloaded_size > 0)
+    manager.cancel()
+    wait_for(lambda: done)
+    assert os.listdir(tmp_path) == []
+
+
+def test_pause_and_resume(bench, tmp_path):
+    manager = DownloadManager(segments=1)
+    done = []
+    manager.start(
+        f"{bench.base_url}/pause-{SIZE}.bin?rate=8000000",
+        str(tmp_path),
+        on_complete=done.append,
+    )
+    wait_for(lambda: manager.downloaded_size > 0)
+    manager.pause()
+    assert manager.is_paused
+    # Le bloc en cours de lecture se termine, puis plus rien n'avance
+    time.sleep(0.5)
+    paused_at = manager.downloaded_size
+    time.sleep(0.3)
+    assert manager.downloaded_size == paused_at < SIZE
+    manager.resume()
+    wait_for(lambda: done)
+    assert done == [True]
+    assert (tmp_path / f"pause-{SIZE}.bin").read_bytes() == content(SIZE)
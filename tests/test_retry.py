@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Nouvelles tentatives: causes, backoff, Retry-After, reprise en cours de flux"""
+
+import email.utils
+import time
+
+import pytest
+import requests
+from conftest import FAST_RETRY, content
+
+from download import DownloadManager, retry
+from download.retry import (
+    RetryMetrics,
+    RetryPolicy,
+    parse_retry_after,
+    retry_reason,
+)
+from download.streaming import IncompleteTransferError
+
+SIZE = 4 * 1024 * 1024
+
+
+def http_error(status, **headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    return requests.HTTPError(response=response)
+
+
+def download(url, folder, **options):
+    manager = DownloadManager(retry_policy=FAST_RETRY, **options)
+    return manager.download(url, str(folder)), manager
+
+
+@pytest.mark.parametrize(
+    "error, reason",
+    [
+        (http_error(503), "http-503"),
+        (IncompleteTransferError("coupé"), "incomplet"),
+        (requests.exceptions.ReadTimeout(), "délai"),
+        (requests.exceptions.ConnectionError(), "connexion"),
+    ],
+)
+def test_retry_reason(error, reason):
+    assert retry_reason(error) == reason
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(" 0 ") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("bientôt") is None
+    later = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert parse_retry_after(later) == pytest.approx(60, abs=2)
+    # Date passée: pas d'attente négative
+    assert parse_retry_after("Mon, 01 Jan 2001 00:00:00 GMT") == 0.0
+
+
+def test_retryable_errors():
+    policy = RetryPolicy()
+    assert policy.is_retryable(http_error(503))
+    assert policy.is_retryable(http_error(429))
+    assert not policy.is_retryable(http_error(404))
+    assert policy.is_retryable(requests.exceptions.ChunkedEncodingError())
+    assert policy.is_retryable(IncompleteTransferError("coupé"))
+    assert not policy.is_retryable(ValueError("bug"))
+    # Erreurs de transport httpx reconnues sans importer httpx
+    transport_error = type("TransportError", (Exception,), {"__module__": "httpx"})
+    read_error = type("ReadError", (transport_error,), {"__module__": "httpx"})
+    assert policy.is_retryable(read_error())
+
+
+def test_retry_budget():
+    policy = RetryPolicy(max_retries=2)
+    error = requests.exceptions.ConnectionError()
+    assert policy.should_retry(error, 0) and policy.should_retry(error, 1)
+    assert not policy.should_retry(error, 2)
+    assert not RetryPolicy(max_retries=0).should_retry(error, 0)
+
+
+def test_backoff_grows_with_jitter_and_is_capped(monkeypatch):
+    policy = RetryPolicy(backoff=0.5, max_backoff=4.0)
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: high)
+    assert [policy.delay(attempt) for attempt in range(5)] == [0.5, 1.0, 2.0, 4.0, 4.0]
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: low)
+    # Au moins la moitié du plafond, quelle que soit la gigue
+    assert [policy.delay(attempt) for attempt in range(5)] == [0.25, 0.5, 1.0, 2.0, 2.0]
+
+
+def test_retry_after_is_honoured_and_capped(monkeypatch):
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: 0.0)
+    policy = RetryPolicy(backoff=1.0, max_retry_after=60.0)
+    assert policy.delay(0, http_error(503, **{"Retry-After": "7"})) == 7.0
+    assert policy.delay(0, http_error(429, **{"Retry-After": "3600"})) == 60.0
+    # Ignoré hors 429/503, ou illisible: backoff
+    assert policy.delay(0, http_error(500, **{"Retry-After": "7"})) == 0.5
+    assert policy.delay(0, http_error(503, **{"Retry-After": "?"})) == 0.5
+
+
+def test_retry_metrics_by_host():
+    metrics = RetryMetrics()
+    metrics.record("a.example", "http-503")
+    metrics.record("a.example", "http-503")
+    metrics.record("b.example", "délai")
+    assert metrics.by_host() == {
+        "a.example": {"http-503": 2},
+        "b.example": {"délai": 1},
+    }
+    metrics.clear()
+    assert metrics.by_host() == {}
+
+
+@pytest.mark.parametrize("segments", [1, 4])
+def test_interrupted_connection_is_retried_where_it_stopped(bench, tmp_path, segments):
+    url = f"{bench.base_url}/fault{segments}-{SIZE}.bin?faults=2&fail_after=300000"
+    result, manager = download(url, tmp_path, segments=segments)
+    assert result is True
+    assert manager.stats.retries >= 1
+    assert (tmp_path / f"fault{segments}-{SIZE}.bin").read_bytes() == content(SIZE)
+
+
+def test_server_errors_are_retried(bench, tmp_path):
+    result, _ = download(
+        f"{bench.base_url}/busy-100000.bin?faults=2&status=503", tmp_path
+    )
+    assert result is True
+
+
+def test_errors_beyond_the_retry_budget_are_raised(bench, tmp_path):
+    with pytest.raises(requests.HTTPError):
+        download(f"{bench.base_url}/down-100000.bin?faults=10&status=503", tmp_path)
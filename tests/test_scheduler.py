@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""File d'attente: ordre des jobs, limites par hôte, préemption, annulation"""
+
+import os
+import threading
+import time
+
+import pytest
+from conftest import content
+
+from download import DownloadJob, DownloadQueue, JobStore, read_url_file, scheduler
+from download.journal import part_path_for
+from download.scheduler import CANCELLED, COMPLETED, PENDING, RUNNING, PendingJobs
+
+SIZE = 2 * 1024 * 1024
+
+
+def job(name, seq, priority=0, deadline=None, size=0):
+    job = DownloadJob(f"http://x/{name}", ".", priority=priority, deadline=deadline)
+    job.seq = seq
+    job.size = size
+    return job
+
+
+def names(jobs):
+    return [job.url.rsplit("/", 1)[-1] for job in jobs]
+
+
+def pop_all(pending):
+    popped = []
+    found = pending.pop(lambda job: True)
+    while found is not None:
+        popped.append(found)
+        found = pending.pop(lambda job: True)
+    return popped
+
+
+def test_pending_jobs_order_by_priority_deadline_then_size():
+    pending = PendingJobs()
+    jobs = [
+        job("fifo", 0),
+        job("petit", 1, size=10),
+        job("gros", 2, size=1000),
+        job("echeance", 3, deadline=time.time() + 60),
+        job("urgent", 4, priority=5),
+        job("fifo2", 5),
+    ]
+    for each in jobs:
+        pending.push(each)
+    assert len(pending) == 6
+    # Taille inconnue: après les tailles connues, dans l'ordre d'arrivée
+    assert names(pop_all(pending)) == [
+        "urgent",
+        "echeance",
+        "petit",
+        "gros",
+        "fifo",
+        "fifo2",
+    ]
+    assert len(pending) == 0
+
+
+def test_pending_jobs_update_and_eligibility():
+    pending = PendingJobs()
+    first, second = job("a", 0), job("b", 1)
+    pending.push(first)
+    pending.push(second)
+    second.priority = 3
+    pending.update(second)
+    assert pending.pop(lambda job: job is not second) is first
+    assert second in pending and first not in pending
+    pending.remove(second)
+    assert pending.pop(lambda job: True) is None
+
+
+def test_next_unprobed_follows_urgency():
+    pending = PendingJobs()
+    jobs = [job("a", 0), job("b", 1, priority=2), job("c", 2, deadline=1)]
+    for each in jobs:
+        pending.push(each)
+    probed = []
+    found = pending.next_unprobed()
+    while found is not None:
+        found.probed = True
+        probed.append(found)
+        found = pending.next_unprobed()
+    assert names(probed) == ["b", "c", "a"]
+
+
+def test_read_url_file(tmp_path):
+    path = tmp_path / "urls.txt"
+    path.write_text("# liste\nhttp://x/a\n\n  http://x/b  \n", encoding="utf-8")
+    assert read_url_file(str(path)) == ["http://x/a", "http://x/b"]
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        DownloadQueue(max_concurrent=0)
+
+
+def test_queue_respects_the_per_host_limit(bench, tmp_path):
+    queue = DownloadQueue(max_concurrent=4, max_per_host=1, segments=1)
+    busiest = []
+    stop = threading.Event()
+
+    def sample():
+        while not stop.is_set():
+            with queue.condition:
+                busiest.append(max(queue.running_per_host.values(), default=0))
+            time.sleep(0.005)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    urls = [f"{bench.base_url}/host{i}-200000.bin?rate=4000000" for i in range(4)]
+    jobs = queue.run(urls, str(tmp_path))
+    stop.set()
+    sampler.join()
+    assert [job.status for job in jobs] == [COMPLETED] * 4
+    assert max(busiest) == 1
+    assert (tmp_path / "host3-200000.bin").read_bytes() == content(200000)
+
+
+def test_queue_runs_jobs_by_priority(bench, tmp_path):
+    done = []
+    queue = DownloadQueue(
+        max_concurrent=1, segments=1, on_job_done=lambda job: done.append(job)
+    )
+    for name, priority in (("bas", 0), ("haut", 9), ("moyen", 4)):
+        queue.add(
+            f"{bench.base_url}/{name}-100000.bin", str(tmp_path), priority=priority
+        )
+    queue.start()
+    queue.close()
+    assert queue.join(timeout=30)
+    assert [job.url.rsplit("/", 1)[-1] for job in done] == [
+        "haut-100000.bin",
+        "moyen-100000.bin",
+        "bas-100000.bin",
+    ]
+    assert all(job.status == COMPLETED for job in done)
+    assert queue.get(done[0].id) is done[0]
+
+
+def test_urgent_job_preempts_large_transfer(bench, tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "PREEMPT_MIN_REMAINING", 256 * 1024)
+    done = []
+    statuses = []
+    queue = DownloadQueue(
+        max_concurrent=1,
+        max_per_host=1,
+        segments=1,
+        on_job_done=done.append,
+        on_status=lambda job, message: statuses.append((job, message)),
+    )
+    big = queue.add(f"{bench.base_url}/big-{SIZE}.bin?rate=2000000", str(tmp_path))
+    queue.start()
+    deadline = time.monotonic() + 10
+    while big.manager.downloaded_size < 256 * 1024:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    small = queue.add(f"{bench.base_url}/small-50000.bin", str(tmp_path), priority=5)
+    queue.close()
+    assert queue.join(timeout=30)
+
+    assert done == [small, big]
+    assert big.status == small.status == COMPLETED
+    assert any(job is big and message.startswith("⏸️") for job, message in statuses)
+    assert any(
+        job is big and message.startswith("📥 Reprise") for job, message in statuses
+    )
+    assert (tmp_path / f"big-{SIZE}.bin").read_bytes() == content(SIZE)
+
+
+def test_preempted_job_is_stored_outside_the_lock(bench, tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "PREEMPT_MIN_REMAINING", 256 * 1024)
+    store = JobStore(str(tmp_path / "jobs.db"))
+    queue = DownloadQueue(max_concurrent=1, max_per_host=1, segments=1, store=store)
+    writes = []
+    set_status = store.set_status
+
+    def record(job_id, status, *args, **kwargs):
+        writes.append((job_id, status, queue.condition._is_owned()))
+        set_status(job_id, status, *args, **kwargs)
+
+    monkeypatch.setattr(store, "set_status", record)
+    big = queue.add(f"{bench.base_url}/stored-{SIZE}.bin?rate=2000000", str(tmp_path))
+    queue.start()
+    while big.manager.downloaded_size < 256 * 1024:
+        time.sleep(0.01)
+    small = queue.add(f"{bench.base_url}/stored-50000.bin", str(tmp_path), priority=5)
+    queue.close()
+    assert queue.join(timeout=30)
+    store.close()
+
+    assert big.status == small.status == COMPLETED
+    big_writes = [status for job_id, status, _ in writes if job_id == big.id]
+    assert big_writes == [RUNNING, PENDING, RUNNING, COMPLETED]
+    assert not any(locked for _, _, locked in writes)
+
+
+def test_no_preemption_when_disabled(bench, tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "PREEMPT_MIN_REMAINING", 256 * 1024)
+    done = []
+    queue = DownloadQueue(
+        max_concurrent=1,
+        max_per_host=1,
+        segments=1,
+        on_job_done=done.append,
+        preempt=False,
+    )
+    big = queue.add(f"{bench.base_url}/nopre-{SIZE}.bin?rate=4000000", str(tmp_path))
+    queue.start()
+    while big.manager.downloaded_size == 0:
+        time.sleep(0.01)
+    small = queue.add(
+        f"{bench.base_url}/nopre-small-50000.bin", str(tmp_path), priority=5
+    )
+    queue.close()
+    assert queue.join(timeout=30)
+    assert done == [big, small]
+
+
+def test_cancel_pending_and_running_jobs(bench, tmp_path):
+    done = []
+    queue = DownloadQueue(max_concurrent=1, segments=1, on_job_done=done.append)
+    running = queue.add(f"{bench.base_url}/run-{SIZE}.bin?rate=2000000", str(tmp_path))
+    waiting = queue.add(f"{bench.base_url}/wait-{SIZE}.bin", str(tmp_path))
+    queue.start()
+    while running.manager.downloaded_size == 0:
+        time.sleep(0.01)
+    queue.cancel(waiting)
+    assert waiting.status == CANCELLED and waiting.done.is_set()
+    queue.cancel(running)
+    queue.close()
+    assert queue.join(timeout=10)
+    assert running.status == CANCELLED
+    assert os.listdir(tmp_path) == []
+    with pytest.raises(RuntimeError):
+        queue.add(f"{bench.base_url}/late-10.bin", str(tmp_path))
+
+
+def test_cancelled_preempted_job_removes_its_partial_file(bench, tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "PREEMPT_MIN_REMAINING", 256 * 1024)
+    queue = DownloadQueue(max_concurrent=1, max_per_host=1, segments=1)
+    big = queue.add(
+        f"{bench.base_url}/pre-cancel-{SIZE}.bin?rate=2000000", str(tmp_path)
+    )
+    queue.start()
+    while big.manager.downloaded_size < 256 * 1024:
+        time.sleep(0.01)
+    small = queue.add(
+        f"{bench.base_url}/pre-cancel-small-{SIZE}.bin?rate=2000000",
+        str(tmp_path),
+        priority=5,
+    )
+    deadline = time.monotonic() + 10
+    while not (big.status == PENDING and small.manager.downloaded_size > 0):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    path = part_path_for(os.path.join(str(tmp_path), f"pre-cancel-{SIZE}.bin"))
+    assert os.path.exists(path)
+    queue.cancel(big)
+    assert big.status == CANCELLED
+    assert not os.path.exists(path)
+    queue.cancel(small)
+    queue.close()
+    assert queue.join(timeout=10)
+
+
+def test_set_priority_reorders_and_is_stored(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    queue = DownloadQueue(max_concurrent=1, store=store)
+    first = queue.add("http://127.0.0.1:9/a", str(tmp_path))
+    second = queue.add("http://127.0.0.1:9/b", str(tmp_path))
+    queue.set_priority(second, 3, deadline=50.0)
+    assert store.get(second.id).priority == 3
+    assert queue.pending.pop(lambda job: True) is second
+    assert queue.pending.pop(lambda job: True) is first
+    store.close()
+
+
+def test_every_pending_job_is_probed(bench, tmp_path):
+    added = []
+    queue = DownloadQueue(
+        max_concurrent=1, segments=1, probe_ahead=2, on_job_added=added.append
+    )
+    blocker = queue.add(
+        f"{bench.base_url}/blocker-{SIZE}.bin?rate=2000000", str(tmp_path)
+    )
+    others = [
+        queue.add(f"{bench.base_url}/probe{i}-{1000 * (i + 1)}.bin", str(tmp_path))
+        for i in range(12)
+    ]
+    assert added == [blocker, *others]
+    queue.start()
+    deadline = time.monotonic() + 10
+    while not all(job.size for job in others):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert [job.size for job in others] == [1000 * (i + 1) for i in range(12)]
+    queue.cancel_all()
+    queue.close()
+    assert queue.join(timeout=10)
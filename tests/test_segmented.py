@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Téléchargements segmentés par requêtes Range"""
+
+import os
+
+import pytest
+from conftest import FAST_RETRY, content
+
+from download import DownloadManager
+from download.journal import journal_path_for, part_path_for
+from download.segmented import MIN_SEGMENT_SIZE, SegmentedDownloader
+
+SIZE = 4 * MIN_SEGMENT_SIZE
+
+
+def download(url, folder, **options):
+    manager = DownloadManager(retry_policy=FAST_RETRY, **options)
+    return manager.download(url, str(folder)), manager
+
+
+def test_split_ranges_cover_the_file():
+    ranges = SegmentedDownloader.split_ranges(SIZE + 123, 4)
+    assert ranges[0][0] == 0 and ranges[-1][1] == SIZE + 122
+    assert all(
+        previous[1] + 1 == following[0]
+        for previous, following in zip(ranges, ranges[1:])
+    )
+    # Pas de segment plus petit que MIN_SEGMENT_SIZE
+    assert SegmentedDownloader.split_ranges(MIN_SEGMENT_SIZE, 8) == [
+        (0, MIN_SEGMENT_SIZE - 1)
+    ]
+
+
+@pytest.mark.parametrize("segments", [1, 4])
+def test_download_matches_content(bench, tmp_path, segments):
+    url = f"{bench.base_url}/plain{segments}-{SIZE}.bin"
+    result, manager = download(url, tmp_path, segments=segments)
+    assert result is True
+    path = tmp_path / f"plain{segments}-{SIZE}.bin"
+    assert path.read_bytes() == content(SIZE)
+    assert manager.downloaded_size == manager.total_size == SIZE
+    assert not os.path.exists(part_path_for(str(path)))
+    assert not os.path.exists(journal_path_for(str(path)))
+
+
+def test_server_without_ranges(bench, tmp_path):
+    result, manager = download(
+        f"{bench.base_url}/norange-{SIZE}.bin?norange=1", tmp_path, segments=4
+    )
+    assert result is True and not manager.accepts_ranges
+    assert (tmp_path / f"norange-{SIZE}.bin").read_bytes() == content(SIZE)
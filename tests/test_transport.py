@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Transport: cache DNS à la demande, sonde GET à la place de HEAD"""
+
+import socket
+import time
+
+from conftest import FAST_RETRY, content
+
+from download import DownloadManager, transport
+from download.transport import (
+    DNSCache,
+    create_session,
+    install_dns_cache,
+    probe_get,
+    uninstall_dns_cache,
+)
+
+
+def test_dns_cache_is_opt_in():
+    import download.cli  # noqa: F401 - l'import ne doit rien installer
+
+    assert transport._dns_cache is None
+    assert socket.getaddrinfo.__module__ == "socket"
+
+
+def test_dns_cache_keeps_results_for_ttl():
+    calls = []
+    cache = DNSCache(ttl=0.2)
+    cache.resolve = lambda *args, **kwargs: calls.append(args) or [args]
+    assert (
+        cache.getaddrinfo("hote", 80) == cache.getaddrinfo("hote", 80) == [("hote", 80)]
+    )
+    cache.getaddrinfo("hote", 443)
+    assert len(calls) == 2
+    time.sleep(0.25)
+    cache.getaddrinfo("hote", 80)
+    assert len(calls) == 3
+    cache.clear()
+    cache.getaddrinfo("hote", 80)
+    assert len(calls) == 4
+
+
+def test_install_and_uninstall():
+    original = socket.getaddrinfo
+    try:
+        cache = install_dns_cache(10)
+        assert socket.getaddrinfo == cache.getaddrinfo
+        assert install_dns_cache(20) is cache and cache.ttl == 20
+        assert socket.getaddrinfo("127.0.0.1", 80)
+    finally:
+        uninstall_dns_cache()
+    assert socket.getaddrinfo is original
+
+
+def test_probe_get_reuses_the_response_body(bench):
+    session = create_session()
+    response = probe_get(session, f"{bench.base_url}/probe-5000.bin", {})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 0-4999/5000"
+    assert response.content == content(5000)
+
+
+def test_get_probe_replaces_head(files, tmp_path):
+    data = content(300000)
+    url = files.add("/nohead.bin", data)
+    manager = DownloadManager(skip_head=True, retry_policy=FAST_RETRY)
+    assert manager.download(url, str(tmp_path)) is True
+    assert (tmp_path / "nohead.bin").read_bytes() == data
+    assert [request for request in files.requests if request[1] == "/nohead.bin"] == [
+        ("GET", "/nohead.bin")
+    ]